@@ -0,0 +1,21 @@
+"""embedding cache"""
+revision = "0002_embedding_cache"
+down_revision = "0001_init"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        "embedding_cache",
+        sa.Column("model", sa.String(200), primary_key=True),
+        sa.Column("input_sha256", sa.LargeBinary(32), primary_key=True),
+        sa.Column("dim", sa.Integer, nullable=False),
+        sa.Column("vector", sa.LargeBinary, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+    )
+
+def downgrade():
+    op.drop_table("embedding_cache")
@@ -0,0 +1,32 @@
+"""vector collections"""
+revision = "0003_vector_collections"
+down_revision = "0002_embedding_cache"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        "vector_collections",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("name", sa.String(100), nullable=False, unique=True),
+        sa.Column("dim", sa.Integer, nullable=False),
+        sa.Column("metric", sa.String(16), nullable=False, server_default="cosine"),
+        sa.Column("dtype", sa.String(16), nullable=False, server_default="float32"),
+        sa.Column("version", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+    )
+    op.create_table(
+        "vector_items",
+        sa.Column("collection_id", sa.Integer, sa.ForeignKey("vector_collections.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("item_id", sa.String(200), primary_key=True),
+        sa.Column("vector", sa.LargeBinary, nullable=False),
+        sa.Column("metadata", sa.JSON, nullable=True),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+    )
+
+def downgrade():
+    op.drop_table("vector_items")
+    op.drop_table("vector_collections")
@@ -0,0 +1,30 @@
+"""ollama usage"""
+revision = "0004_ollama_usage"
+down_revision = "0003_vector_collections"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        "ollama_usage",
+        sa.Column("id", sa.BigInteger, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("model", sa.String(200), nullable=False),
+        sa.Column("kind", sa.String(32), nullable=False),
+        sa.Column("prompt_tokens", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("completion_tokens", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("total_duration_ms", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("load_duration_ms", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("eval_duration_ms", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("occurred_at", sa.DateTime, nullable=False),
+    )
+    op.create_index("ix_ollama_usage_occurred_at", "ollama_usage", ["occurred_at"])
+    op.create_index("ix_ollama_usage_user_time", "ollama_usage", ["user_id", "occurred_at"])
+
+def downgrade():
+    op.drop_index("ix_ollama_usage_user_time", table_name="ollama_usage")
+    op.drop_index("ix_ollama_usage_occurred_at", table_name="ollama_usage")
+    op.drop_table("ollama_usage")
@@ -0,0 +1,38 @@
+"""conversations"""
+revision = "0005_conversations"
+down_revision = "0004_ollama_usage"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        "conversations",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("model", sa.String(200), nullable=False),
+        sa.Column("system", sa.Text, nullable=True),
+        sa.Column("backend_url", sa.String(255), nullable=True),
+        sa.Column("context_start_id", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+    )
+    op.create_index("ix_conversations_user_id", "conversations", ["user_id"])
+    op.create_table(
+        "conversation_messages",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("conversation_id", sa.Integer, sa.ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("role", sa.String(16), nullable=False),
+        sa.Column("content", sa.Text, nullable=False),
+        sa.Column("tokens", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+    )
+    op.create_index("ix_conversation_messages_conversation_id", "conversation_messages", ["conversation_id", "id"])
+
+def downgrade():
+    op.drop_index("ix_conversation_messages_conversation_id", table_name="conversation_messages")
+    op.drop_table("conversation_messages")
+    op.drop_index("ix_conversations_user_id", table_name="conversations")
+    op.drop_table("conversations")
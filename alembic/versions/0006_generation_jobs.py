@@ -0,0 +1,32 @@
+"""generation jobs"""
+revision = "0006_generation_jobs"
+down_revision = "0005_conversations"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        "generation_jobs",
+        sa.Column("id", sa.String(32), primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("model", sa.String(200), nullable=False),
+        sa.Column("prompt", sa.Text, nullable=False),
+        sa.Column("options", sa.JSON, nullable=True),
+        sa.Column("status", sa.String(16), nullable=False, server_default="queued"),
+        sa.Column("response", sa.Text, nullable=True),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("started_at", sa.DateTime, nullable=True),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+    )
+    op.create_index("ix_generation_jobs_status_created", "generation_jobs", ["status", "created_at"])
+    op.create_index("ix_generation_jobs_user_id", "generation_jobs", ["user_id"])
+
+def downgrade():
+    op.drop_index("ix_generation_jobs_user_id", table_name="generation_jobs")
+    op.drop_index("ix_generation_jobs_status_created", table_name="generation_jobs")
+    op.drop_table("generation_jobs")
@@ -0,0 +1,34 @@
+"""ingest jobs"""
+revision = "0007_ingest_jobs"
+down_revision = "0006_generation_jobs"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        "ingest_jobs",
+        sa.Column("id", sa.String(32), primary_key=True),
+        sa.Column("collection_id", sa.Integer, sa.ForeignKey("vector_collections.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("model", sa.String(200), nullable=False),
+        sa.Column("status", sa.String(16), nullable=False, server_default="queued"),
+        sa.Column("spool_path", sa.String(500), nullable=False),
+        sa.Column("bytes_total", sa.BigInteger, nullable=False, server_default=sa.text("0")),
+        sa.Column("bytes_done", sa.BigInteger, nullable=False, server_default=sa.text("0")),
+        sa.Column("items_done", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("items_failed", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("items_deduped", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("started_at", sa.DateTime, nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime, nullable=True),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+    )
+    op.create_index("ix_ingest_jobs_status", "ingest_jobs", ["status"])
+
+def downgrade():
+    op.drop_index("ix_ingest_jobs_status", table_name="ingest_jobs")
+    op.drop_table("ingest_jobs")
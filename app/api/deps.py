@@ -1,8 +1,11 @@
 from fastapi import Header, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 import jwt
 from app.db.session import get_db
 from app.services.auth import verify_jwt
+from app.services.api_keys import authenticate_api_key
+from app.services.credential_service import API_KEY_PREFIX
+from app.services.principal_cache import Principal, principal_cache
 from app.services.rate_limit import RateLimiter
 from app.domain import models
 
@@ -13,6 +16,14 @@ def get_current_principal(authorization: str = Header(None), db: Session = Depen
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     token = authorization.split(" ", 1)[1]
+    if token.startswith(API_KEY_PREFIX):
+        principal = authenticate_api_key(db, token)
+        if principal is None:
+            raise HTTPException(status_code=401, detail="Invalid API key")
+        return principal, None
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached, None
     try:
         payload = verify_jwt(token)
     except jwt.ExpiredSignatureError:
@@ -22,10 +33,12 @@ def get_current_principal(authorization: str = Header(None), db: Session = Depen
     subject = payload.get("sub")
     if subject is None:
         raise HTTPException(status_code=401, detail="Invalid token payload")
-    user = db.get(models.User, int(subject))
+    user = db.get(models.User, int(subject), options=[selectinload(models.User.roles)])
     if user is None or not user.is_active:
         raise HTTPException(status_code=401, detail="User not active")
-    return user, None
+    principal = Principal(user.id, user.is_active, [r.name for r in user.roles])
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal, None
 
 
 def enforce_rate_limit(user_id: int):
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 import logging
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.db.session import get_db
-from app.services.auth import create_jwt, authenticate_credentials, log_auth_event, verify_jwt
+from app.services.auth import create_jwt, authenticate_credentials, email_exists, log_auth_event, verify_jwt
+from app.services.login_shedder import login_shedder
 from app.services.rate_limit import RateLimiter
 from app.domain.schemas import LoginRequest, LoginResponse, LogoutResponse
 
@@ -18,6 +20,14 @@ def login(payload: LoginRequest, request: Request, db: Session = Depends(get_db)
     user_agent = request.headers.get("user-agent")
     trace_id = request.headers.get("x-trace-id")
     logger.info("auth.login.attempt", extra={"username": payload.username, "ip": client_ip, "ua": user_agent, "trace": trace_id})
+    # Shed likely credential stuffing before any hashing or database write.
+    shed = login_shedder.check(client_ip, payload.username)
+    if shed == "unknown_email":
+        logger.info("auth.login.failed", extra={"username": payload.username, "ip": client_ip, "trace": trace_id, "shed": shed})
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    if shed is not None:
+        logger.warning("auth.login.shed", extra={"username": payload.username, "ip": client_ip, "trace": trace_id, "reason": shed})
+        raise HTTPException(status_code=429, detail="Too many login attempts, try again later", headers={"Retry-After": str(int(settings.login_shed_window))})
     key = f"login:{client_ip or payload.username}"
     allowed, _, _ = login_rate_limiter.allow(key)
     if not allowed:
@@ -27,6 +37,7 @@ def login(payload: LoginRequest, request: Request, db: Session = Depends(get_db)
         raise HTTPException(status_code=429, detail="Too many login attempts, try again later")
     user = authenticate_credentials(db, payload.username, payload.password)
     if user is None:
+        login_shedder.record_failure(client_ip, payload.username, unknown_email=not email_exists(db, payload.username))
         log_auth_event(db, None, None, "login_failed", client_ip, user_agent, "invalid credentials")
         db.commit()
         logger.info("auth.login.failed", extra={"username": payload.username, "ip": client_ip, "trace": trace_id})
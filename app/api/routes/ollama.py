@@ -1,61 +1,560 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+import asyncio
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Literal
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from prometheus_client import Counter
+from pydantic import BaseModel, Field
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.api.deps import get_current_principal, enforce_rate_limit
 from app.services.ollama_client import OllamaClient
+from app.services.embedding_batcher import embedding_batcher
+from app.services.ttl_cache import CACHE_LOOKUPS, AsyncTTLCache
+from app.services.ollama_pool import NoBackendAvailable, normalize_model
+from app.services.chat_cache import chat_cache, chat_cache_key, is_cacheable
+from app.services.semantic_cache import LOOKUPS as SEMANTIC_LOOKUPS, semantic_cache
+from app.services.scheduler import AdmissionRejected, Ticket, scheduler
+from app.services.usage import usage_writer
+from app.services.conversations import ConversationService, estimate_tokens, turn_lock
+from app.services.jobs import FINISHED, JobQueueFull, enqueue, job_runner, load_job
+from app.domain import models
+from app.db.session import SessionLocal
+from app.config import settings
 
 router = APIRouter()
 
+CANCELLED = Counter("ollama_requests_cancelled_total", "Ollama calls abandoned because the client disconnected", ["endpoint"])
+
+models_cache = AsyncTTLCache("ollama_models", settings.ollama_models_cache_ttl, settings.ollama_models_cache_stale_ttl)
+
 
 class ChatRequest(BaseModel):
     model: str
     prompt: str
+    options: dict[str, Any] | None = None
 
 
 class ChatResponse(BaseModel):
     response: str
 
 
+class UsageSummary(BaseModel):
+    user_id: int | None
+    model: str
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_duration_ms: int
+    load_duration_ms: int
+    tokens_per_second: float | None
+
+
 class EmbeddingsRequest(BaseModel):
     model: str
-    input: str
+    input: str | list[str] = Field(..., min_length=1)
+    encoding_format: Literal["float", "base64"] = "float"
+    dtype: Literal["float32", "float16"] = "float32"
+
+
+class EmbeddingResult(BaseModel):
+    index: int
+    embedding: list[float] | str | None = None
+    error: str | None = None
 
 
 class EmbeddingsResponse(BaseModel):
-    embedding: list[float]
+    embedding: list[float] | str | None = None
+    embeddings: list[EmbeddingResult] | None = None
+    dtype: str | None = None
+
+
+class ConversationCreate(BaseModel):
+    model: str
+    system: str | None = None
+
+
+class ConversationMessageIn(BaseModel):
+    content: str
+    options: dict[str, Any] | None = None
+
+
+class ConversationMessageOut(BaseModel):
+    id: int
+    role: str
+    content: str
+    tokens: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ConversationOut(BaseModel):
+    id: int
+    model: str
+    system: str | None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ConversationDetail(ConversationOut):
+    messages: list[ConversationMessageOut]
+
+
+class JobOut(BaseModel):
+    id: str
+    model: str
+    status: str
+    response: str | None = None
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+
+def require_admin(user) -> None:
+    roles = {getattr(r, "name", r) for r in getattr(user, "roles", [])}
+    if "admin" not in roles:
+        raise HTTPException(status_code=403, detail="Admin role required")
+
+
+def _upstream_error(e: Exception) -> HTTPException:
+    if isinstance(e, AdmissionRejected):
+        return HTTPException(status_code=503, detail=f"Ollama busy: {e}", headers={"Retry-After": str(e.retry_after)})
+    if isinstance(e, NoBackendAvailable):
+        return HTTPException(status_code=503, detail=f"Ollama unavailable: {e}", headers={"Retry-After": str(int(settings.ollama_breaker_open_seconds))})
+    return HTTPException(status_code=502, detail=f"Ollama error: {e}")
+
+
+SSE_MEDIA_TYPE = "text/event-stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+OCTET_STREAM_MEDIA_TYPE = "application/octet-stream"
+_LITTLE_ENDIAN = {"float32": "<f4", "float16": "<f2"}
+
+
+def _pack_embeddings(vectors: np.ndarray, dtype: str) -> bytes:
+    # One vectorised cast and copy of the whole (n, dim) block; no per-element Python work.
+    return np.ascontiguousarray(vectors, dtype=_LITTLE_ENDIAN[dtype]).tobytes()
+
+
+def _encode_embedding(vector: np.ndarray, payload: "EmbeddingsRequest") -> list[float] | str:
+    if payload.encoding_format == "base64":
+        return base64.b64encode(_pack_embeddings(vector, payload.dtype)).decode("ascii")
+    return vector.tolist()
+
+
+def _raw_embeddings_response(vectors: list[np.ndarray], dtype: str) -> Response:
+    matrix = np.stack(vectors)
+    headers = {"X-Embedding-Dtype": dtype, "X-Embedding-Count": str(matrix.shape[0]), "X-Embedding-Dim": str(matrix.shape[1])}
+    return Response(content=_pack_embeddings(matrix, dtype), media_type=OCTET_STREAM_MEDIA_TYPE, headers=headers)
+
+
+def _stream_media_type(request: Request) -> str | None:
+    accept = request.headers.get("accept", "")
+    if SSE_MEDIA_TYPE in accept:
+        return SSE_MEDIA_TYPE
+    if NDJSON_MEDIA_TYPE in accept:
+        return NDJSON_MEDIA_TYPE
+    return None
+
+
+def _encode_chunk(chunk: dict, media_type: str, event: str | None = None) -> str:
+    data = json.dumps(chunk, separators=(",", ":"))
+    if media_type == NDJSON_MEDIA_TYPE:
+        return data + "\n"
+    if event:
+        return f"event: {event}\ndata: {data}\n\n"
+    return f"data: {data}\n\n"
+
+
+async def _admitted_stream(ticket: Ticket, model: str, stream: AsyncIterator[dict]):
+    # Holds the scheduler slot for as long as the upstream stream is open.
+    try:
+        async for chunk in stream:
+            if chunk.get("done"):
+                usage_writer.record(ticket.user_id, normalize_model(model), "chat_stream", chunk)
+            yield chunk
+    finally:
+        try:
+            await stream.aclose()
+        finally:
+            # Closing can itself be cancelled when the client went away; the slot must still be freed.
+            scheduler.release(ticket)
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(settings.ollama_disconnect_poll_interval)
+
+
+async def _unless_disconnected(request: Request, endpoint: str, call: Awaitable):
+    """Await an upstream call, cancelling it if the client disconnects first.
+
+    Cancelling the task closes the httpx connection to Ollama, which stops the generation.
+    """
+    task = asyncio.ensure_future(call)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            CANCELLED.labels(endpoint).inc()
+            # Let the call unwind (releasing its admission slot and backend lease) before returning.
+            await asyncio.wait({task})
+    if task.cancelled():
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return task.result()
+
+
+async def _admitted_call(user_id: int, model: str, call):
+    async with scheduler.admit(user_id, model):
+        return await call()
+
+
+async def _generate(user_id: int, payload: "ChatRequest") -> str:
+    data = await _admitted_call(user_id, payload.model, lambda: OllamaClient().generate(payload.model, payload.prompt, payload.options))
+    usage_writer.record(user_id, normalize_model(payload.model), "chat", data)
+    return data.get("response", "")
+
+
+async def _relay_chat_stream(stream: AsyncIterator[dict], first: dict | None, media_type: str):
+    try:
+        chunk = first
+        while chunk is not None:
+            yield _encode_chunk(chunk, media_type, "done" if chunk.get("done") else None)
+            chunk = await stream.__anext__()
+    except StopAsyncIteration:
+        pass
+    except Exception as e:
+        # Headers are already sent, so upstream failures are reported in-band.
+        yield _encode_chunk({"error": f"Ollama error: {e}", "done": True}, media_type, "error")
+    except (asyncio.CancelledError, GeneratorExit):
+        # The client disconnected mid-stream; closing the upstream stream below stops Ollama.
+        CANCELLED.labels("chat_stream").inc()
+        raise
+    finally:
+        await stream.aclose()
 
 
 @router.get("/models", response_model=list[str])
-def list_models(db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+async def list_models(db: Session = Depends(get_db), principal=Depends(get_current_principal)):
     user, _ = principal
     remaining, reset = enforce_rate_limit(user.id)
     try:
-        client = OllamaClient()
-        return client.list_models()
+        return await models_cache.get_or_load("models", lambda: OllamaClient().list_models())
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Ollama error: {e}")
+        raise _upstream_error(e)
+
+
+@router.delete("/models/cache", status_code=204)
+async def invalidate_models_cache(principal=Depends(get_current_principal)):
+    user, _ = principal
+    require_admin(user)
+    models_cache.invalidate()
+    return Response(status_code=204)
+
+
+@router.get("/usage", response_model=list[UsageSummary])
+def usage_summary(
+    since: datetime | None = Query(None),
+    until: datetime | None = Query(None),
+    db: Session = Depends(get_db),
+    principal=Depends(get_current_principal),
+):
+    user, _ = principal
+    require_admin(user)
+    u = models.OllamaUsage
+    query = db.query(
+        u.user_id,
+        u.model,
+        func.count(u.id),
+        func.coalesce(func.sum(u.prompt_tokens), 0),
+        func.coalesce(func.sum(u.completion_tokens), 0),
+        func.coalesce(func.sum(u.total_duration_ms), 0),
+        func.coalesce(func.sum(u.load_duration_ms), 0),
+        func.coalesce(func.sum(u.eval_duration_ms), 0),
+    )
+    if since is not None:
+        query = query.filter(u.occurred_at >= since)
+    if until is not None:
+        query = query.filter(u.occurred_at < until)
+    rows = query.group_by(u.user_id, u.model).order_by(u.user_id, u.model).all()
+    return [
+        {
+            "user_id": user_id,
+            "model": model,
+            "requests": requests,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_duration_ms": total_ms,
+            "load_duration_ms": load_ms,
+            "tokens_per_second": (completion_tokens / (eval_ms / 1000.0)) if eval_ms else None,
+        }
+        for user_id, model, requests, prompt_tokens, completion_tokens, total_ms, load_ms, eval_ms in rows
+    ]
+
+
+async def _prompt_embedding(payload: "ChatRequest", request: Request) -> np.ndarray | None:
+    # None means the semantic cache is off, bypassed for this request, or the embedding failed.
+    if not settings.semantic_cache_enabled:
+        return None
+    model = normalize_model(payload.model)
+    if request.headers.get("x-semantic-cache", "").lower() == "bypass":
+        SEMANTIC_LOOKUPS.labels(model, "bypass").inc()
+        return None
+    try:
+        return await _unless_disconnected(
+            request,
+            "chat",
+            embedding_batcher.embed_array(settings.semantic_cache_model, payload.prompt),
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        SEMANTIC_LOOKUPS.labels(model, "error").inc()
+        return None
 
 
 @router.post("/chat", response_model=ChatResponse)
-def chat(payload: ChatRequest, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+async def chat(
+    payload: ChatRequest, request: Request, response: Response, db: Session = Depends(get_db), principal=Depends(get_current_principal)
+):
     user, _ = principal
     remaining, reset = enforce_rate_limit(user.id)
+    media_type = _stream_media_type(request)
+    if media_type is not None:
+        try:
+            ticket = await _unless_disconnected(request, "chat_stream", scheduler.acquire(user.id, payload.model))
+        except AdmissionRejected as e:
+            raise _upstream_error(e)
+        stream = _admitted_stream(ticket, payload.model, OllamaClient().chat_stream(payload.model, payload.prompt, payload.options))
+        try:
+            # Wait for the first chunk so connection and model errors still map to 502.
+            first = await _unless_disconnected(request, "chat_stream", stream.__anext__())
+        except StopAsyncIteration:
+            first = None
+        except HTTPException:
+            await stream.aclose()
+            raise
+        except Exception as e:
+            await stream.aclose()
+            raise _upstream_error(e)
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        return StreamingResponse(_relay_chat_stream(stream, first, media_type), media_type=media_type, headers=headers)
+    key = chat_cache_key(payload.model, payload.prompt, payload.options)
+    store = is_cacheable(payload.options)
+    # An exact hit costs nothing, so it is checked before embedding the prompt.
+    cached = chat_cache.peek(key) if store else None
+    if cached is not None:
+        CACHE_LOOKUPS.labels(chat_cache.name, "hit").inc()
+        return {"response": cached}
+    namespace = semantic_cache.namespace(user.id, payload.model, payload.options)
+    prompt_vector = await _prompt_embedding(payload, request)
+    if prompt_vector is not None:
+        cached = semantic_cache.lookup(namespace, prompt_vector)
+        if cached is not None:
+            response.headers["X-Semantic-Cache"] = "hit"
+            return {"response": cached}
     try:
-        client = OllamaClient()
-        text = client.chat(payload.model, payload.prompt)
+        # Admission happens inside the loader, so coalesced duplicates take no extra slot.
+        text = await _unless_disconnected(request, "chat", chat_cache.get_or_load(key, lambda: _generate(user.id, payload), store=store))
+        if prompt_vector is not None:
+            semantic_cache.store(namespace, prompt_vector, text)
         return {"response": text}
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Ollama error: {e}")
+        raise _upstream_error(e)
 
 
-@router.post("/embeddings", response_model=EmbeddingsResponse)
-def embeddings(payload: EmbeddingsRequest, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+@router.post("/embeddings", response_model=EmbeddingsResponse, response_model_exclude_none=True)
+async def embeddings(payload: EmbeddingsRequest, request: Request, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
     user, _ = principal
     remaining, reset = enforce_rate_limit(user.id)
+    client = OllamaClient()
+    raw = OCTET_STREAM_MEDIA_TYPE in request.headers.get("accept", "")
+    if isinstance(payload.input, list):
+        try:
+            results = await _unless_disconnected(
+                request, "embeddings", _admitted_call(user.id, payload.model, lambda: client.embed_batched(payload.model, payload.input))
+            )
+            if raw:
+                failed = next((result for result in results if isinstance(result, Exception)), None)
+                if failed is not None:
+                    # A packed matrix has no room for per-item errors.
+                    raise _upstream_error(failed)
+                return _raw_embeddings_response(results, payload.dtype)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise _upstream_error(e)
+        items = []
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                items.append({"index": index, "error": f"Ollama error: {result}"})
+            else:
+                items.append({"index": index, "embedding": _encode_embedding(result, payload)})
+        return {"embeddings": items, "dtype": payload.dtype if payload.encoding_format == "base64" else None}
     try:
-        client = OllamaClient()
-        vec = client.embeddings(payload.model, payload.input)
-        return {"embedding": vec}
+        # The batcher admits each upstream batch itself, so cache hits never wait for a slot.
+        vec = await _unless_disconnected(request, "embeddings", embedding_batcher.embed_array(payload.model, payload.input))
+        if raw:
+            return _raw_embeddings_response([vec], payload.dtype)
+        return {"embedding": _encode_embedding(vec, payload), "dtype": payload.dtype if payload.encoding_format == "base64" else None}
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Ollama error: {e}")
+        raise _upstream_error(e)
+
+
+def _owned_conversation(db: Session, user_id: int, conversation_id: int) -> models.Conversation:
+    conversation = ConversationService(db).get(user_id, conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return conversation
+
+
+@router.post("/conversations", response_model=ConversationOut, status_code=201)
+def create_conversation(payload: ConversationCreate, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    user, _ = principal
+    enforce_rate_limit(user.id)
+    conversation = ConversationService(db).create(user.id, payload.model, payload.system)
+    db.commit()
+    db.refresh(conversation)
+    return conversation
+
+
+@router.get("/conversations", response_model=list[ConversationOut])
+def list_conversations(
+    limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0), db: Session = Depends(get_db), principal=Depends(get_current_principal)
+):
+    user, _ = principal
+    return ConversationService(db).list_for_user(user.id, limit, offset)
+
+
+@router.get("/conversations/{conversation_id}", response_model=ConversationDetail)
+def get_conversation(conversation_id: int, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    user, _ = principal
+    return _owned_conversation(db, user.id, conversation_id)
+
+
+@router.delete("/conversations/{conversation_id}", status_code=204)
+def delete_conversation(conversation_id: int, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    user, _ = principal
+    db.delete(_owned_conversation(db, user.id, conversation_id))
+    db.commit()
+    return Response(status_code=204)
+
+
+@router.post("/conversations/{conversation_id}/messages", response_model=ConversationMessageOut)
+async def send_conversation_message(conversation_id: int, payload: ConversationMessageIn, request: Request, principal=Depends(get_current_principal)):
+    user, _ = principal
+    enforce_rate_limit(user.id)
+
+    def prepare():
+        db = SessionLocal()
+        try:
+            conversation = _owned_conversation(db, user.id, conversation_id)
+            messages, start_id, user_tokens = ConversationService(db).prepare_turn(conversation, payload.content)
+            return conversation.model, conversation.backend_url, messages, start_id, user_tokens
+        finally:
+            db.close()
+
+    # The turn reads the history, calls the model and appends to it; a concurrent
+    # turn in between would be trimmed against a history it never saw.
+    async with turn_lock(conversation_id):
+        model, backend_url, messages, start_id, user_tokens = await asyncio.to_thread(prepare)
+        # Stay on the backend that served the previous turn so its KV cache for the kept prefix is reused.
+        client = OllamaClient(prefer=backend_url)
+        try:
+            data = await _unless_disconnected(
+                request, "conversation", _admitted_call(user.id, model, lambda: client.chat_messages(model, messages, payload.options))
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise _upstream_error(e)
+        usage_writer.record(user.id, normalize_model(model), "conversation", data)
+        reply = (data.get("message") or {}).get("content", "")
+        reply_tokens = int(data.get("eval_count") or 0) or estimate_tokens(reply)
+
+        def record():
+            db = SessionLocal()
+            try:
+                # The row lock keeps the append atomic against a turn running on another worker.
+                svc = ConversationService(db)
+                conversation = svc.get(user.id, conversation_id, for_update=True)
+                if conversation is None:
+                    raise HTTPException(status_code=404, detail="Not found")
+                message = svc.record_turn(conversation, payload.content, user_tokens, reply, reply_tokens, start_id, client.last_backend)
+                db.commit()
+                db.refresh(message)
+                db.expunge(message)
+                return message
+            finally:
+                db.close()
+
+        return await asyncio.to_thread(record)
+
+
+@router.post("/jobs", response_model=JobOut, status_code=202)
+async def create_job(payload: ChatRequest, principal=Depends(get_current_principal)):
+    user, _ = principal
+    enforce_rate_limit(user.id)
+
+    def create():
+        db = SessionLocal()
+        try:
+            job = enqueue(db, user.id, payload.model, payload.prompt, payload.options)
+            db.commit()
+            db.refresh(job)
+            return job
+        finally:
+            db.close()
+
+    try:
+        job = await asyncio.to_thread(create)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    job_runner.notify()
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=JobOut)
+async def get_job(job_id: str, wait: float = Query(0, ge=0), principal=Depends(get_current_principal)):
+    # With ?wait=N the request is held until the job finishes or N seconds pass (long-polling).
+    user, _ = principal
+    deadline = asyncio.get_running_loop().time() + min(wait, settings.jobs_long_poll_max)
+    while True:
+        job = await asyncio.to_thread(load_job, user.id, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        remaining = deadline - asyncio.get_running_loop().time()
+        if job.status in FINISHED or remaining <= 0:
+            return job
+        await asyncio.sleep(min(settings.jobs_poll_interval, remaining))
+
+
+@router.delete("/jobs/{job_id}", status_code=204)
+def delete_job(job_id: str, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    # A running job still completes upstream, but its result is discarded.
+    user, _ = principal
+    job = db.get(models.GenerationJob, job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Not found")
+    db.delete(job)
+    db.commit()
+    return Response(status_code=204)
@@ -0,0 +1,269 @@
+import asyncio
+import contextlib
+import os
+import uuid
+from datetime import datetime
+from typing import Literal
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+from app.db.session import get_db
+from app.api.deps import get_current_principal, enforce_rate_limit
+from app.services.vector_index import vector_store
+from app.services.ingest import ingest_runner
+from app.db.session import SessionLocal
+from app.domain import models
+from app.config import settings
+
+router = APIRouter()
+
+
+class CollectionCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+    dim: int = Field(gt=0, le=16384)
+    metric: Literal["cosine", "dot"] = "cosine"
+    dtype: Literal["float32", "float16", "int8"] = "float32"
+
+
+class CollectionOut(BaseModel):
+    name: str
+    dim: int
+    metric: str
+    dtype: str
+    count: int
+
+
+class VectorItemIn(BaseModel):
+    id: str = Field(min_length=1, max_length=200)
+    vector: list[float]
+    metadata: dict | None = None
+
+
+class UpsertRequest(BaseModel):
+    items: list[VectorItemIn] = Field(min_length=1)
+
+
+class DeleteItemsRequest(BaseModel):
+    ids: list[str] = Field(min_length=1)
+
+
+class QueryRequest(BaseModel):
+    vectors: list[list[float]] = Field(min_length=1)
+    k: int = Field(10, ge=1, le=1000)
+    metric: Literal["cosine", "dot"] | None = None
+    include_metadata: bool = True
+
+
+class QueryMatch(BaseModel):
+    id: str
+    score: float
+    metadata: dict | None = None
+
+
+class QueryResponse(BaseModel):
+    results: list[list[QueryMatch]]
+
+
+class IngestJobOut(BaseModel):
+    id: str
+    collection: str
+    model: str
+    status: str
+    bytes_total: int
+    bytes_done: int
+    progress: float
+    items_done: int
+    items_failed: int
+    items_deduped: int
+    items_per_second: float | None
+    error: str | None
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+
+
+def require_admin(user) -> None:
+    roles = {getattr(r, "name", r) for r in getattr(user, "roles", [])}
+    if "admin" not in roles:
+        raise HTTPException(status_code=403, detail="Admin role required")
+
+
+def _get_collection(db: Session, name: str) -> models.VectorCollection:
+    collection = db.query(models.VectorCollection).filter(models.VectorCollection.name == name).one_or_none()
+    if collection is None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    return collection
+
+
+def _as_matrix(vectors: list[list[float]], dim: int) -> np.ndarray:
+    if any(len(v) != dim for v in vectors):
+        raise HTTPException(status_code=422, detail=f"Vectors must have dimension {dim}")
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def _collection_out(db: Session, collection: models.VectorCollection) -> dict:
+    index = vector_store.index_for(db, collection)
+    return {"name": collection.name, "dim": collection.dim, "metric": collection.metric, "dtype": collection.dtype, "count": len(index)}
+
+
+@router.get("/collections", response_model=list[CollectionOut])
+def list_collections(db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    collections = db.query(models.VectorCollection).order_by(models.VectorCollection.name).all()
+    return [_collection_out(db, c) for c in collections]
+
+
+@router.post("/collections", response_model=CollectionOut, status_code=201)
+def create_collection(payload: CollectionCreate, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    require_admin(principal[0])
+    enforce_rate_limit(principal[0].id)
+    if db.query(models.VectorCollection).filter(models.VectorCollection.name == payload.name).one_or_none():
+        raise HTTPException(status_code=400, detail="Collection exists")
+    collection = models.VectorCollection(name=payload.name, dim=payload.dim, metric=payload.metric, dtype=payload.dtype, version=0)
+    db.add(collection)
+    db.commit()
+    db.refresh(collection)
+    return _collection_out(db, collection)
+
+
+@router.delete("/collections/{name}", status_code=204)
+def delete_collection(name: str, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    require_admin(principal[0])
+    collection = _get_collection(db, name)
+    db.delete(collection)
+    db.commit()
+    vector_store.forget(name)
+    return Response(status_code=204)
+
+
+@router.put("/collections/{name}/items")
+def upsert_items(name: str, payload: UpsertRequest, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    require_admin(principal[0])
+    enforce_rate_limit(principal[0].id)
+    collection = _get_collection(db, name)
+    # Last occurrence wins when an id repeats within one request.
+    items = list({item.id: item for item in payload.items}.values())
+    vectors = _as_matrix([item.vector for item in items], collection.dim)
+    vector_store.upsert(db, collection, [item.id for item in items], vectors, [item.metadata for item in items])
+    return {"upserted": len(items)}
+
+
+@router.post("/collections/{name}/items/delete")
+def delete_items(name: str, payload: DeleteItemsRequest, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    require_admin(principal[0])
+    enforce_rate_limit(principal[0].id)
+    collection = _get_collection(db, name)
+    removed = vector_store.delete(db, collection, list(dict.fromkeys(payload.ids)))
+    return {"deleted": removed}
+
+
+@router.post("/collections/{name}/query", response_model=QueryResponse)
+def query_collection(name: str, payload: QueryRequest, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    enforce_rate_limit(principal[0].id)
+    collection = _get_collection(db, name)
+    queries = _as_matrix(payload.vectors, collection.dim)
+    index = vector_store.index_for(db, collection)
+    matches = index.search(queries, payload.k, payload.metric)
+    return {
+        "results": [
+            [{"id": item_id, "score": score, "metadata": meta if payload.include_metadata else None} for item_id, score, meta in row]
+            for row in matches
+        ]
+    }
+
+
+def _ingest_job_out(job: models.IngestJob, collection_name: str) -> dict:
+    end = job.finished_at or job.heartbeat_at
+    elapsed = (end - job.started_at).total_seconds() if end and job.started_at else 0
+    return {
+        "id": job.id,
+        "collection": collection_name,
+        "model": job.model,
+        "status": job.status,
+        "bytes_total": job.bytes_total,
+        "bytes_done": job.bytes_done,
+        "progress": job.bytes_done / job.bytes_total if job.bytes_total else 1.0,
+        "items_done": job.items_done,
+        "items_failed": job.items_failed,
+        "items_deduped": job.items_deduped,
+        "items_per_second": job.items_done / elapsed if elapsed > 0 else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+@router.post("/collections/{name}/ingest", response_model=IngestJobOut, status_code=202)
+async def ingest_collection(name: str, request: Request, model: str = Query(..., min_length=1), principal=Depends(get_current_principal)):
+    # The JSONL body is streamed to a spool file (constant memory) and embedded in the background.
+    user, _ = principal
+    require_admin(user)
+
+    def lookup() -> models.VectorCollection:
+        db = SessionLocal()
+        try:
+            return _get_collection(db, name)
+        finally:
+            db.close()
+
+    collection = await asyncio.to_thread(lookup)
+    job_id = uuid.uuid4().hex
+    os.makedirs(settings.ingest_spool_dir, exist_ok=True)
+    path = os.path.join(settings.ingest_spool_dir, f"{job_id}.jsonl")
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > settings.ingest_max_upload_bytes:
+                    raise HTTPException(status_code=413, detail="Upload too large")
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        raise
+
+    def create() -> models.IngestJob:
+        db = SessionLocal()
+        try:
+            job = models.IngestJob(
+                id=job_id, collection_id=collection.id, created_by=user.id, model=model, status="queued", spool_path=path, bytes_total=size
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            return job
+        finally:
+            db.close()
+
+    job = await asyncio.to_thread(create)
+    ingest_runner.notify()
+    return _ingest_job_out(job, collection.name)
+
+
+@router.get("/ingest", response_model=list[IngestJobOut])
+def list_ingest_jobs(limit: int = Query(50, ge=1, le=200), db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    require_admin(principal[0])
+    rows = (
+        db.query(models.IngestJob, models.VectorCollection.name)
+        .join(models.VectorCollection, models.VectorCollection.id == models.IngestJob.collection_id)
+        .order_by(models.IngestJob.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+    return [_ingest_job_out(job, collection_name) for job, collection_name in rows]
+
+
+@router.get("/ingest/{job_id}", response_model=IngestJobOut)
+def get_ingest_job(job_id: str, db: Session = Depends(get_db), principal=Depends(get_current_principal)):
+    require_admin(principal[0])
+    row = (
+        db.query(models.IngestJob, models.VectorCollection.name)
+        .join(models.VectorCollection, models.VectorCollection.id == models.IngestJob.collection_id)
+        .filter(models.IngestJob.id == job_id)
+        .one_or_none()
+    )
+    if row is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return _ingest_job_out(*row)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pydantic import BaseModel
 
 class Settings(BaseModel):
@@ -12,6 +13,93 @@ class Settings(BaseModel):
     jwt_alg: str = os.getenv("JWT_ALG", "HS256")
     rate_limit_per_minute: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
     ollama_base_url: str = os.getenv("OLLAMA_BASE_URL", "")
+    ollama_base_urls: str = os.getenv("OLLAMA_BASE_URLS", "")
+    ollama_health_interval: float = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+    ollama_residency_interval: float = float(os.getenv("OLLAMA_RESIDENCY_INTERVAL", "5"))
+    ollama_affinity_max_outstanding: int = int(os.getenv("OLLAMA_AFFINITY_MAX_OUTSTANDING", "0"))
+    ollama_breaker_failure_threshold: int = int(os.getenv("OLLAMA_BREAKER_FAILURE_THRESHOLD", "5"))
+    ollama_breaker_open_seconds: float = float(os.getenv("OLLAMA_BREAKER_OPEN_SECONDS", "30"))
+    ollama_breaker_half_open_requests: int = int(os.getenv("OLLAMA_BREAKER_HALF_OPEN_REQUESTS", "3"))
+    ollama_timeout: float = float(os.getenv("OLLAMA_TIMEOUT", "15.0"))
+    ollama_timeout_min: float = float(os.getenv("OLLAMA_TIMEOUT_MIN", "2.0"))
+    ollama_timeout_percentile: float = float(os.getenv("OLLAMA_TIMEOUT_PERCENTILE", "99"))
+    ollama_timeout_multiplier: float = float(os.getenv("OLLAMA_TIMEOUT_MULTIPLIER", "2.0"))
+    ollama_retry_max_attempts: int = int(os.getenv("OLLAMA_RETRY_MAX_ATTEMPTS", "2"))
+    ollama_retry_budget_ratio: float = float(os.getenv("OLLAMA_RETRY_BUDGET_RATIO", "0.1"))
+    ollama_retry_budget_burst: float = float(os.getenv("OLLAMA_RETRY_BUDGET_BURST", "10"))
+    ollama_hedge_enabled: bool = os.getenv("OLLAMA_HEDGE_ENABLED", "").lower() in ("1", "true", "yes")
+    ollama_hedge_percentile: float = float(os.getenv("OLLAMA_HEDGE_PERCENTILE", "95"))
+    ollama_stream_read_timeout: float = float(os.getenv("OLLAMA_STREAM_READ_TIMEOUT", "120.0"))
+    ollama_disconnect_poll_interval: float = float(os.getenv("OLLAMA_DISCONNECT_POLL_INTERVAL", "0.25"))
+    ollama_embed_batch_size: int = int(os.getenv("OLLAMA_EMBED_BATCH_SIZE", "64"))
+    ollama_embed_concurrency: int = int(os.getenv("OLLAMA_EMBED_CONCURRENCY", "4"))
+    ollama_embed_coalesce_window_ms: float = float(os.getenv("OLLAMA_EMBED_COALESCE_WINDOW_MS", "2"))
+    ollama_embed_coalesce_max_items: int = int(os.getenv("OLLAMA_EMBED_COALESCE_MAX_ITEMS", "32"))
+    embedding_cache_max_bytes: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    embedding_cache_persistent: bool = os.getenv("EMBEDDING_CACHE_PERSISTENT", "").lower() in ("1", "true", "yes")
+    ollama_models_cache_ttl: float = float(os.getenv("OLLAMA_MODELS_CACHE_TTL", "30"))
+    ollama_models_cache_stale_ttl: float = float(os.getenv("OLLAMA_MODELS_CACHE_STALE_TTL", "300"))
+    ollama_chat_cache_enabled: bool = os.getenv("OLLAMA_CHAT_CACHE_ENABLED", "").lower() in ("1", "true", "yes")
+    ollama_chat_cache_ttl: float = float(os.getenv("OLLAMA_CHAT_CACHE_TTL", "300"))
+    ollama_chat_cache_max_entries: int = int(os.getenv("OLLAMA_CHAT_CACHE_MAX_ENTRIES", "1000"))
+    ollama_warm_models: str = os.getenv("OLLAMA_WARM_MODELS", "")
+    ollama_warm_interval: float = float(os.getenv("OLLAMA_WARM_INTERVAL", "240"))
+    ollama_warm_gates_readiness: bool = os.getenv("OLLAMA_WARM_GATES_READINESS", "true").lower() in ("1", "true", "yes")
+    ollama_keep_alive: str = os.getenv("OLLAMA_KEEP_ALIVE", "")
+    ollama_model_keep_alive: str = os.getenv("OLLAMA_MODEL_KEEP_ALIVE", "")
+    semantic_cache_enabled: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "").lower() in ("1", "true", "yes")
+    semantic_cache_model: str = os.getenv("SEMANTIC_CACHE_MODEL", "nomic-embed-text")
+    semantic_cache_threshold: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    semantic_cache_ttl: float = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+    semantic_cache_max_entries: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+    semantic_cache_max_partitions: int = int(os.getenv("SEMANTIC_CACHE_MAX_PARTITIONS", "256"))
+    semantic_cache_max_total_entries: int = int(os.getenv("SEMANTIC_CACHE_MAX_TOTAL_ENTRIES", "20000"))
+    ollama_num_parallel: int = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+    ollama_model_concurrency: str = os.getenv("OLLAMA_MODEL_CONCURRENCY", "")
+    ollama_user_max_inflight: int = int(os.getenv("OLLAMA_USER_MAX_INFLIGHT", "2"))
+    ollama_user_weights: str = os.getenv("OLLAMA_USER_WEIGHTS", "")
+    ollama_queue_timeout: float = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "30"))
+    ollama_queue_max_depth: int = int(os.getenv("OLLAMA_QUEUE_MAX_DEPTH", "256"))
+    jobs_workers: int = int(os.getenv("JOBS_WORKERS", "2"))
+    jobs_user_max_pending: int = int(os.getenv("JOBS_USER_MAX_PENDING", "20"))
+    jobs_poll_interval: float = float(os.getenv("JOBS_POLL_INTERVAL", "1.0"))
+    jobs_generation_timeout: float = float(os.getenv("JOBS_GENERATION_TIMEOUT", "600"))
+    jobs_max_attempts: int = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+    jobs_result_ttl: float = float(os.getenv("JOBS_RESULT_TTL", "3600"))
+    jobs_long_poll_max: float = float(os.getenv("JOBS_LONG_POLL_MAX", "30"))
+    ingest_spool_dir: str = os.getenv("INGEST_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "ks-ollama-ingest"))
+    ingest_max_upload_bytes: int = int(os.getenv("INGEST_MAX_UPLOAD_BYTES", str(2 * 1024 * 1024 * 1024)))
+    ingest_concurrency: int = int(os.getenv("INGEST_CONCURRENCY", "4"))
+    ingest_stale_seconds: float = float(os.getenv("INGEST_STALE_SECONDS", "300"))
+    ingest_retry_max_delay: float = float(os.getenv("INGEST_RETRY_MAX_DELAY", "60"))
+    principal_cache_ttl: float = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+    principal_cache_max_entries: int = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+    login_shed_window: float = float(os.getenv("LOGIN_SHED_WINDOW", "300"))
+    login_shed_ip_failures: int = int(os.getenv("LOGIN_SHED_IP_FAILURES", "20"))
+    login_shed_user_failures: int = int(os.getenv("LOGIN_SHED_USER_FAILURES", "10"))
+    login_shed_subnet_failures: int = int(os.getenv("LOGIN_SHED_SUBNET_FAILURES", "100"))
+    login_shed_sketch_width: int = int(os.getenv("LOGIN_SHED_SKETCH_WIDTH", "65536"))
+    login_shed_sketch_depth: int = int(os.getenv("LOGIN_SHED_SKETCH_DEPTH", "4"))
+    login_negative_cache_slots: int = int(os.getenv("LOGIN_NEGATIVE_CACHE_SLOTS", "65536"))
+    login_negative_cache_ttl: float = float(os.getenv("LOGIN_NEGATIVE_CACHE_TTL", "600"))
+    argon2_time_cost: int = int(os.getenv("ARGON2_TIME_COST", "3"))
+    argon2_memory_cost: int = int(os.getenv("ARGON2_MEMORY_COST", "65536"))
+    argon2_parallelism: int = int(os.getenv("ARGON2_PARALLELISM", "4"))
+    argon2_workers: int = int(os.getenv("ARGON2_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+    argon2_max_queue: int = int(os.getenv("ARGON2_MAX_QUEUE", "4"))
+    argon2_queue_timeout: float = float(os.getenv("ARGON2_QUEUE_TIMEOUT", "5"))
+    api_key_cache_ttl: float = float(os.getenv("API_KEY_CACHE_TTL", "300"))
+    api_key_cache_max_entries: int = int(os.getenv("API_KEY_CACHE_MAX_ENTRIES", "10000"))
+    cache_invalidation_channel: str = os.getenv("CACHE_INVALIDATION_CHANNEL", "ks_cache_invalidation")
+    cache_invalidation_reconnect_interval: float = float(os.getenv("CACHE_INVALIDATION_RECONNECT_INTERVAL", "5"))
+    usage_flush_interval: float = float(os.getenv("USAGE_FLUSH_INTERVAL", "5"))
+    usage_flush_max_rows: int = int(os.getenv("USAGE_FLUSH_MAX_ROWS", "500"))
+    usage_buffer_max_rows: int = int(os.getenv("USAGE_BUFFER_MAX_ROWS", "20000"))
+    conversation_context_tokens: int = int(os.getenv("CONVERSATION_CONTEXT_TOKENS", "4096"))
+    conversation_reply_reserve_tokens: int = int(os.getenv("CONVERSATION_REPLY_RESERVE_TOKENS", "512"))
+    ollama_max_connections: int = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "100"))
+    ollama_max_keepalive_connections: int = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    ollama_keepalive_expiry: float = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "30.0"))
 
     def database_url(self) -> str:
         return f"postgresql+psycopg2://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
@@ -23,4 +111,8 @@ class Settings(BaseModel):
             return "http://ollama.default.svc.cluster.local:11434"
         return "http://localhost:11434"
 
+    def resolved_ollama_base_urls(self) -> list[str]:
+        urls = [u.strip() for u in self.ollama_base_urls.split(",") if u.strip()]
+        return urls or [self.resolved_ollama_base_url()]
+
 settings = Settings()
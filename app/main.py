@@ -1,15 +1,56 @@
+from contextlib import asynccontextmanager
 import structlog
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
+from starlette.datastructures import MutableHeaders
 from prometheus_fastapi_instrumentator import Instrumentator
 from app.api.routes import users, credentials, auth
 from app.api.routes import audit as audit_routes
 from app.api.routes import ollama as ollama_routes
+from app.api.routes import vectors as vector_routes
+from app.services import ollama_client
+from app.services.ollama_client import OllamaClient
+from app.services.ollama_pool import ollama_pool
+from app.services.vector_index import vector_store
+from app.services.usage import usage_writer
+from app.services.model_keeper import model_keeper
+from app.services.jobs import job_runner
+from app.services.ingest import ingest_runner
+from app.services.invalidation import invalidation_bus
+from app.services.hashing import HashingBusy
+from app.config import settings
 
 logger = structlog.get_logger()
 
-app = FastAPI(title="User Management API", version="1.0.0", openapi_version="3.0.2")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ollama_client.get_http_client()
+    invalidation_bus.start()
+    usage_writer.start()
+    ollama_pool.start(
+        lambda url: OllamaClient(url).health(),
+        lambda url: OllamaClient(url).running_models(),
+        lambda: OllamaClient().list_models(),
+    )
+    # Collections load in the background; a request that needs one first waits for just that collection.
+    vector_store.warm()
+    model_keeper.start()
+    job_runner.start()
+    ingest_runner.start()
+    yield
+    await ingest_runner.stop()
+    await job_runner.stop()
+    await model_keeper.stop()
+    await ollama_pool.stop()
+    await usage_writer.stop()
+    await ollama_client.close_http_client()
+    await invalidation_bus.stop()
+
+
+app = FastAPI(title="User Management API", version="1.0.0", openapi_version="3.0.2", lifespan=lifespan)
 Instrumentator().instrument(app).expose(app)
 
 app.add_middleware(
@@ -22,26 +63,53 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def add_headers(request: Request, call_next):
-    response: Response = await call_next(request)
-    path = request.url.path
-    response.headers.setdefault("X-Content-Type-Options", "nosniff")
-    response.headers.setdefault("X-Frame-Options", "DENY")
-    response.headers.setdefault("Referrer-Policy", "no-referrer")
-    if path.startswith("/docs") or path.startswith("/redoc") or path.startswith("/openapi.json"):
-        csp = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://cdn.jsdelivr.net; "
-            "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
-            "img-src 'self' data:; "
-            "connect-src 'self'; "
-            "frame-ancestors 'none'"
-        )
-        response.headers["Content-Security-Policy"] = csp
-    else:
-        response.headers["Content-Security-Policy"] = "default-src 'none'; frame-ancestors 'none'"
-    return response
+_DOCS_CSP = (
+    "default-src 'self'; "
+    "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://cdn.jsdelivr.net; "
+    "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
+    "img-src 'self' data:; "
+    "connect-src 'self'; "
+    "frame-ancestors 'none'"
+)
+_API_CSP = "default-src 'none'; frame-ancestors 'none'"
+
+
+class SecurityHeadersMiddleware:
+    """Adds security headers to every HTTP response.
+
+    Written as plain ASGI rather than @app.middleware("http"): BaseHTTPMiddleware
+    hides client disconnects from request.is_disconnected(), which the Ollama
+    routes rely on to cancel upstream work.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        docs = path.startswith("/docs") or path.startswith("/redoc") or path.startswith("/openapi.json")
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.setdefault("X-Content-Type-Options", "nosniff")
+                headers.setdefault("X-Frame-Options", "DENY")
+                headers.setdefault("Referrer-Policy", "no-referrer")
+                headers["Content-Security-Policy"] = _DOCS_CSP if docs else _API_CSP
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+app.add_middleware(SecurityHeadersMiddleware)
+
+
+@app.exception_handler(HashingBusy)
+async def hashing_busy(request: Request, exc: HashingBusy):
+    return JSONResponse(status_code=503, content={"detail": f"Authentication busy: {exc}"}, headers={"Retry-After": str(exc.retry_after)})
 
 
 @app.get("/healthz")
@@ -50,7 +118,10 @@ def healthz():
 
 
 @app.get("/readyz")
-def readyz():
+def readyz(response: Response):
+    if settings.ollama_warm_gates_readiness and not model_keeper.ready:
+        response.status_code = 503
+        return {"status": "warming"}
     return {"status": "ready"}
 
 
@@ -59,6 +130,7 @@ app.include_router(credentials.router, prefix="/credentials", tags=["credentials
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(audit_routes.router, prefix="/audit", tags=["audit"])
 app.include_router(ollama_routes.router, prefix="/ollama", tags=["ollama"])
+app.include_router(vector_routes.router, prefix="/vectors", tags=["vectors"])
 
 
 def custom_openapi():
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.domain import models
+from app.services.invalidation import invalidation_bus
 
 class UserRepository:
     def __init__(self, db: Session):
@@ -16,6 +17,7 @@ class UserRepository:
         user = models.User(email=email, display_name=display_name)
         self.db.add(user)
         self.db.flush()
+        invalidation_bus.publish(self.db, "email", email)
         return user
 
     def set_roles(self, user: models.User, roles: list[str]):
@@ -30,6 +32,7 @@ class UserRepository:
             assigned.append(role)
         user.roles = assigned
         self.db.flush()
+        invalidation_bus.publish(self.db, "user", user.id)
 
     def update(self, user: models.User, display_name: str | None = None, is_active: bool | None = None):
         if display_name is not None:
@@ -37,6 +40,8 @@ class UserRepository:
         if is_active is not None:
             user.is_active = is_active
         self.db.flush()
+        invalidation_bus.publish(self.db, "user", user.id)
 
     def delete(self, user: models.User):
+        invalidation_bus.publish(self.db, "user", user.id)
         self.db.delete(user)
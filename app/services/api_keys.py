@@ -0,0 +1,133 @@
+import hashlib
+import hmac
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from time import monotonic
+from prometheus_client import Counter, Gauge
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload
+from app.config import settings
+from app.domain import models
+from app.services.credential_service import parse_api_key
+from app.services.hashing import hashing_pool
+from app.services.invalidation import invalidation_bus
+from app.services.principal_cache import Principal
+
+AUTH = Counter("api_key_auth_total", "API key authentications by outcome (cache_hit, verified, rejected)", ["result"])
+ENTRIES = Gauge("api_key_cache_entries", "Verified API keys cached in this process")
+
+
+class ApiKeyCache:
+    """Bounded LRU of verified API keys by credential id.
+
+    Each entry holds an HMAC-SHA256 of the secret under a per-process random key,
+    so a repeat request is checked with one HMAC instead of argon2 and no
+    plaintext is kept in memory. Entries live for at most `ttl` seconds (less if
+    the credential expires sooner) and are evicted when the credential is revoked
+    or its user changes.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.key = secrets.token_bytes(32)
+        self.entries: OrderedDict[int, tuple[bytes, Principal, float]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def digest(self, secret: str) -> bytes:
+        return hmac.new(self.key, secret.encode("utf-8"), hashlib.sha256).digest()
+
+    def get(self, credential_id: int) -> tuple[bytes, Principal] | None:
+        with self.lock:
+            entry = self.entries.get(credential_id)
+            if entry is None:
+                return None
+            digest, principal, expires_at = entry
+            if monotonic() >= expires_at:
+                del self.entries[credential_id]
+                ENTRIES.set(len(self.entries))
+                return None
+            self.entries.move_to_end(credential_id)
+            return digest, principal
+
+    def put(self, credential_id: int, digest: bytes, principal: Principal, lifetime: float) -> None:
+        lifetime = min(self.ttl, lifetime)
+        if lifetime <= 0:
+            return
+        with self.lock:
+            self.entries[credential_id] = (digest, principal, monotonic() + lifetime)
+            self.entries.move_to_end(credential_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            ENTRIES.set(len(self.entries))
+
+    def invalidate_credential(self, credential_id: int) -> None:
+        with self.lock:
+            self.entries.pop(credential_id, None)
+            ENTRIES.set(len(self.entries))
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self.lock:
+            for credential_id in [c for c, (_, p, _) in self.entries.items() if p.id == user_id]:
+                del self.entries[credential_id]
+            ENTRIES.set(len(self.entries))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            ENTRIES.set(0)
+
+
+api_key_cache = ApiKeyCache(settings.api_key_cache_ttl, settings.api_key_cache_max_entries)
+invalidation_bus.subscribe("credential", lambda key: api_key_cache.invalidate_credential(int(key)), api_key_cache.clear)
+invalidation_bus.subscribe("user", lambda key: api_key_cache.invalidate_user(int(key)))
+
+
+def _load_credential(db: Session, credential_id: int) -> models.Credential | None:
+    # Credential, user and roles in one round trip; password credentials never work as API keys.
+    return (
+        db.query(models.Credential)
+        .options(joinedload(models.Credential.user).joinedload(models.User.roles))
+        .filter(
+            models.Credential.id == credential_id,
+            models.Credential.revoked.is_(False),
+            or_(models.Credential.label.is_(None), models.Credential.label != "password"),
+        )
+        .one_or_none()
+    )
+
+
+def authenticate_api_key(db: Session, key: str) -> Principal | None:
+    parsed = parse_api_key(key)
+    if parsed is None:
+        AUTH.labels("rejected").inc()
+        return None
+    credential_id, secret = parsed
+    digest = api_key_cache.digest(secret)
+    cached = api_key_cache.get(credential_id)
+    if cached is not None:
+        # A credential's secret never changes, so a mismatch is a wrong key; no argon2 needed.
+        if hmac.compare_digest(cached[0], digest):
+            AUTH.labels("cache_hit").inc()
+            return cached[1]
+        AUTH.labels("rejected").inc()
+        return None
+    cred = _load_credential(db, credential_id)
+    if cred is None or cred.user is None or not cred.user.is_active:
+        AUTH.labels("rejected").inc()
+        return None
+    lifetime = settings.api_key_cache_ttl
+    if cred.expires_at is not None:
+        lifetime = (cred.expires_at - datetime.utcnow()).total_seconds()
+        if lifetime <= 0:
+            AUTH.labels("rejected").inc()
+            return None
+    if not hashing_pool.verify(cred.hash, secret):
+        AUTH.labels("rejected").inc()
+        return None
+    principal = Principal(cred.user.id, cred.user.is_active, [r.name for r in cred.user.roles])
+    api_key_cache.put(credential_id, digest, principal, lifetime)
+    AUTH.labels("verified").inc()
+    return principal
@@ -1,12 +1,10 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 import jwt
-from argon2 import PasswordHasher, exceptions as argon_exc
 from sqlalchemy.orm import Session
 from app.config import settings
 from app.domain import models
-
-ph = PasswordHasher()
+from app.services.hashing import REHASHES, HashingBusy, hashing_pool
 
 
 def create_jwt(subject: str, roles: list[str], expires_minutes: int = 60) -> str:
@@ -20,23 +18,34 @@ def verify_jwt(token: str) -> dict:
 
 
 def _verify_user_password(db: Session, email: str, password: str) -> Optional[models.User]:
-    user = db.query(models.User).filter(models.User.email == email, models.User.is_active).one_or_none()
-    if user is None:
-        return None
-    creds = (
-        db.query(models.Credential)
-        .filter(models.Credential.user_id == user.id, models.Credential.revoked.is_(False), models.Credential.label == "password")
+    rows = (
+        db.query(models.User, models.Credential)
+        .join(models.Credential, models.Credential.user_id == models.User.id)
+        .filter(
+            models.User.email == email,
+            models.User.is_active,
+            models.Credential.revoked.is_(False),
+            models.Credential.label == "password",
+        )
         .all()
     )
-    for cred in creds:
-        try:
-            if ph.verify(cred.hash, password):
-                return user
-        except argon_exc.VerifyMismatchError:
-            continue
+    for user, cred in rows:
+        if hashing_pool.verify(cred.hash, password):
+            if hashing_pool.needs_rehash(cred.hash):
+                # Upgrade to the configured argon2 parameters; committed with the login audit entry.
+                try:
+                    cred.hash = hashing_pool.hash(password)
+                    REHASHES.inc()
+                except HashingBusy:
+                    pass
+            return user
     return None
 
 
+def email_exists(db: Session, email: str) -> bool:
+    return db.query(db.query(models.User.id).filter(models.User.email == email).exists()).scalar()
+
+
 def authenticate_credentials(db: Session, username: str, password: str) -> Optional[models.User]:
     return _verify_user_password(db, username, password)
 
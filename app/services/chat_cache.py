@@ -0,0 +1,25 @@
+import hashlib
+import json
+from typing import Any
+from app.config import settings
+from app.services.ollama_pool import normalize_model
+from app.services.ttl_cache import AsyncTTLCache
+
+# Identical in-flight chat requests always share one generation; finished responses
+# are only kept when the cache is enabled and the request is deterministic.
+chat_cache = AsyncTTLCache("ollama_chat", settings.ollama_chat_cache_ttl, max_entries=settings.ollama_chat_cache_max_entries)
+
+
+def chat_cache_key(model: str, prompt: str, options: dict[str, Any] | None = None) -> str:
+    normalized = {"model": normalize_model(model), "prompt": prompt, "options": options or {}}
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def is_deterministic(options: dict[str, Any] | None) -> bool:
+    if not options:
+        return False
+    return options.get("temperature") == 0 or options.get("seed") is not None
+
+
+def is_cacheable(options: dict[str, Any] | None) -> bool:
+    return settings.ollama_chat_cache_enabled and is_deterministic(options)
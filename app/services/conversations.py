@@ -0,0 +1,110 @@
+import asyncio
+import weakref
+from datetime import datetime
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.domain import models
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for the Llama-family tokenizers.
+    return max(1, len(text) // 4)
+
+
+def plan_context(tokens: list[int], budget: int, low_watermark: float = 0.75) -> int:
+    """Return the index of the first message to send given per-message token counts.
+
+    Everything is kept while it fits the budget. On overflow the oldest messages
+    are dropped down to `low_watermark` of the budget, so the kept prefix stays
+    identical for the next few turns and Ollama can keep reusing its KV cache.
+    The last message is always kept.
+    """
+    if sum(tokens) <= budget:
+        return 0
+    target = budget * low_watermark
+    total = sum(tokens)
+    start = 0
+    while start < len(tokens) - 1 and total > target:
+        total -= tokens[start]
+        start += 1
+    return start
+
+
+_turn_locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+
+
+def turn_lock(conversation_id: int) -> asyncio.Lock:
+    """Lock held for a whole turn, so two messages to one conversation run one after another.
+
+    Locks are dropped once no turn holds or waits for them.
+    """
+    lock = _turn_locks.get(conversation_id)
+    if lock is None:
+        lock = _turn_locks[conversation_id] = asyncio.Lock()
+    return lock
+
+
+class ConversationService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(self, user_id: int, model: str, system: str | None = None) -> models.Conversation:
+        conversation = models.Conversation(user_id=user_id, model=model, system=system, context_start_id=0)
+        self.db.add(conversation)
+        self.db.flush()
+        return conversation
+
+    def get(self, user_id: int, conversation_id: int, for_update: bool = False) -> models.Conversation | None:
+        conversation = self.db.get(models.Conversation, conversation_id, with_for_update=for_update)
+        if conversation is None or conversation.user_id != user_id:
+            return None
+        return conversation
+
+    def list_for_user(self, user_id: int, limit: int = 50, offset: int = 0) -> list[models.Conversation]:
+        return (
+            self.db.query(models.Conversation)
+            .filter(models.Conversation.user_id == user_id)
+            .order_by(models.Conversation.updated_at.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+
+    def prepare_turn(self, conversation: models.Conversation, content: str) -> tuple[list[dict], int, int]:
+        """Build the /api/chat messages for a new user turn.
+
+        Returns the messages, the new context start id and the user message's token estimate.
+        """
+        window = (
+            self.db.query(models.ConversationMessage)
+            .filter(
+                models.ConversationMessage.conversation_id == conversation.id,
+                models.ConversationMessage.id >= conversation.context_start_id,
+            )
+            .order_by(models.ConversationMessage.id)
+            .all()
+        )
+        user_tokens = estimate_tokens(content)
+        system_tokens = estimate_tokens(conversation.system) if conversation.system else 0
+        budget = max(1, settings.conversation_context_tokens - settings.conversation_reply_reserve_tokens - system_tokens)
+        start = plan_context([m.tokens for m in window] + [user_tokens], budget)
+        kept = window[start:]
+        # Messages after the cut keep their ids; a cut past the window means only the new turn remains.
+        start_id = kept[0].id if kept else (window[-1].id + 1 if window else conversation.context_start_id)
+        messages = [{"role": "system", "content": conversation.system}] if conversation.system else []
+        messages += [{"role": m.role, "content": m.content} for m in kept]
+        messages.append({"role": "user", "content": content})
+        return messages, start_id, user_tokens
+
+    def record_turn(
+        self, conversation: models.Conversation, content: str, user_tokens: int, reply: str, reply_tokens: int, start_id: int, backend_url: str | None
+    ) -> models.ConversationMessage:
+        self.db.add(models.ConversationMessage(conversation_id=conversation.id, role="user", content=content, tokens=user_tokens))
+        assistant = models.ConversationMessage(conversation_id=conversation.id, role="assistant", content=reply, tokens=reply_tokens)
+        self.db.add(assistant)
+        conversation.context_start_id = start_id
+        if backend_url:
+            conversation.backend_url = backend_url
+        conversation.updated_at = datetime.utcnow()
+        self.db.flush()
+        return assistant
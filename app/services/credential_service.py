@@ -1,10 +1,25 @@
 import secrets
 from typing import Optional
 from sqlalchemy.orm import Session
-from argon2 import PasswordHasher
 from app.domain import models
+from app.services.hashing import hashing_pool
+from app.services.invalidation import invalidation_bus
 
-ph = PasswordHasher()
+API_KEY_PREFIX = "ks_"
+
+
+def format_api_key(credential_id: int, secret: str) -> str:
+    return f"{API_KEY_PREFIX}{credential_id}_{secret}"
+
+
+def parse_api_key(key: str) -> tuple[int, str] | None:
+    """Split `ks_<credential id>_<secret>` into its parts; None if the key is malformed."""
+    if not key.startswith(API_KEY_PREFIX):
+        return None
+    credential_id, _, secret = key[len(API_KEY_PREFIX):].partition("_")
+    if not credential_id.isdigit() or not secret:
+        return None
+    return int(credential_id), secret
 
 
 class CredentialService:
@@ -15,7 +30,7 @@ class CredentialService:
         return secrets.token_urlsafe(48)
 
     def hash_secret(self, secret: str) -> str:
-        return ph.hash(secret)
+        return hashing_pool.hash(secret)
 
     def create(self, user_id: int, label: Optional[str] = None) -> tuple[int, str]:
         secret = self.generate_secret()
@@ -23,7 +38,8 @@ class CredentialService:
         cred = models.Credential(user_id=user_id, hash=hashed, alg="argon2id", label=label)
         self.db.add(cred)
         self.db.flush()
-        return cred.id, secret
+        # The credential id is embedded in the key so authentication can look it up directly.
+        return cred.id, format_api_key(cred.id, secret)
 
     def revoke(self, credential_id: int):
         cred = (
@@ -34,6 +50,7 @@ class CredentialService:
         if not cred:
             return False
         cred.revoked = True
+        invalidation_bus.publish(self.db, "credential", cred.id)
         return True
 
     def set_password(self, user_id: int, password: str):
@@ -44,6 +61,7 @@ class CredentialService:
         )
         for cred in existing:
             cred.revoked = True
+            invalidation_bus.publish(self.db, "credential", cred.id)
         hashed = self.hash_secret(password)
         cred = models.Credential(user_id=user_id, hash=hashed, alg="argon2id", label="password")
         self.db.add(cred)
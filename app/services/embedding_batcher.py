@@ -0,0 +1,103 @@
+import asyncio
+from time import perf_counter
+from typing import Callable
+import numpy as np
+from prometheus_client import Histogram
+from app.config import settings
+from app.services.ollama_client import OllamaClient
+from app.services.embedding_cache import embedding_cache
+from app.services.ollama_pool import model_catalog
+from app.services.scheduler import scheduler
+
+BATCH_SIZE = Histogram(
+    "ollama_embed_coalesced_batch_size",
+    "Number of single-input embedding requests sent in one /api/embed call",
+    ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+BATCH_WAIT = Histogram(
+    "ollama_embed_coalesce_wait_seconds",
+    "Time a request waited in the coalescing window before its batch was sent",
+    ["model"],
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+
+class _PendingBatch:
+    def __init__(self):
+        self.texts: list[str] = []
+        self.futures: list[asyncio.Future] = []
+        self.enqueued_at: list[float] = []
+        self.timer: asyncio.TimerHandle | None = None
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-input embedding calls for the same model into one /api/embed request.
+
+    Memory-cache hits return immediately; each upstream batch takes one
+    scheduler slot on behalf of all of its callers.
+    """
+
+    def __init__(self, window_ms: float | None = None, max_items: int | None = None, client_factory: Callable[[], OllamaClient] = OllamaClient):
+        self.window = (settings.ollama_embed_coalesce_window_ms if window_ms is None else window_ms) / 1000.0
+        self.max_items = max(1, max_items or settings.ollama_embed_coalesce_max_items)
+        self.client_factory = client_factory
+        self.pending: dict[str, _PendingBatch] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def embed(self, model: str, text: str) -> list[float]:
+        return (await self.embed_array(model, text)).tolist()
+
+    async def embed_array(self, model: str, text: str) -> np.ndarray:
+        cached = embedding_cache.get_memory(model, text)
+        if cached is not None:
+            return cached
+        if self.window <= 0:
+            return (await self._embed_admitted(model, [text]))[0]
+        loop = asyncio.get_running_loop()
+        batch = self.pending.get(model)
+        if batch is None:
+            batch = _PendingBatch()
+            batch.timer = loop.call_later(self.window, self._flush, model)
+            self.pending[model] = batch
+        future = loop.create_future()
+        batch.texts.append(text)
+        batch.futures.append(future)
+        batch.enqueued_at.append(perf_counter())
+        if len(batch.texts) >= self.max_items:
+            self._flush(model)
+        return await future
+
+    def _flush(self, model: str) -> None:
+        batch = self.pending.pop(model, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        now = perf_counter()
+        label = model_catalog.label(model)
+        for enqueued in batch.enqueued_at:
+            BATCH_WAIT.labels(label).observe(now - enqueued)
+        BATCH_SIZE.labels(label).observe(len(batch.texts))
+        task = asyncio.ensure_future(self._send(model, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _embed_admitted(self, model: str, texts: list[str]) -> list[np.ndarray]:
+        async with scheduler.admit(None, model):
+            return await self.client_factory().embed_arrays(model, texts)
+
+    async def _send(self, model: str, batch: _PendingBatch) -> None:
+        try:
+            vectors = await self._embed_admitted(model, batch.texts)
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, vector in zip(batch.futures, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+
+embedding_batcher = EmbeddingBatcher()
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from prometheus_client import Counter, Gauge
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from app.config import settings
+from app.db.session import SessionLocal
+from app.domain import models
+
+CACHE_HITS = Counter("embedding_cache_hits_total", "Embedding cache hits", ["tier"])
+CACHE_MISSES = Counter("embedding_cache_misses_total", "Embedding cache misses")
+CACHE_EVICTIONS = Counter("embedding_cache_evictions_total", "Embeddings evicted from the in-memory tier")
+CACHE_BYTES = Gauge("embedding_cache_memory_bytes", "Bytes held by the in-memory embedding tier")
+
+# Rough per-entry cost of the key tuple, digest and OrderedDict slot on top of the array data.
+_ENTRY_OVERHEAD = 200
+
+CacheKey = tuple[str, bytes]
+
+
+class EmbeddingCache:
+    """Content-addressed cache of embeddings keyed by (model, sha256(input)).
+
+    Vectors are kept as float32 arrays in a byte-bounded LRU; when persistence is
+    enabled, misses fall through to the embedding_cache table before going upstream.
+    """
+
+    def __init__(self, max_bytes: int | None = None, persistent: bool | None = None):
+        self.max_bytes = settings.embedding_cache_max_bytes if max_bytes is None else max_bytes
+        self.persistent = settings.embedding_cache_persistent if persistent is None else persistent
+        self.entries: OrderedDict[CacheKey, np.ndarray] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    @staticmethod
+    def key(model: str, text: str) -> CacheKey:
+        return model, hashlib.sha256(text.encode("utf-8")).digest()
+
+    def get_memory(self, model: str, text: str) -> np.ndarray | None:
+        key = self.key(model, text)
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is not None:
+                self.entries.move_to_end(key)
+        if vector is not None:
+            CACHE_HITS.labels("memory").inc()
+        return vector
+
+    def put_memory(self, key: CacheKey, vector: np.ndarray) -> None:
+        cost = vector.nbytes + _ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.nbytes + _ENTRY_OVERHEAD
+            self.entries[key] = vector
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.nbytes + _ENTRY_OVERHEAD
+                CACHE_EVICTIONS.inc()
+            CACHE_BYTES.set(self.size)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            CACHE_BYTES.set(0)
+
+    async def get_many(self, model: str, texts: list[str]) -> list[np.ndarray | None]:
+        keys = [self.key(model, text) for text in texts]
+        found: list[np.ndarray | None] = []
+        with self.lock:
+            for key in keys:
+                vector = self.entries.get(key)
+                if vector is not None:
+                    self.entries.move_to_end(key)
+                found.append(vector)
+        hits = sum(1 for vector in found if vector is not None)
+        if hits:
+            CACHE_HITS.labels("memory").inc(hits)
+        missing = [key for key, vector in zip(keys, found) if vector is None]
+        if missing and self.persistent:
+            stored = await asyncio.to_thread(self._load, list(dict.fromkeys(missing)))
+            if stored:
+                for i, key in enumerate(keys):
+                    if found[i] is None and key in stored:
+                        found[i] = stored[key]
+                        self.put_memory(key, stored[key])
+                CACHE_HITS.labels("postgres").inc(sum(1 for key in missing if key in stored))
+        CACHE_MISSES.inc(sum(1 for vector in found if vector is None))
+        return found
+
+    def put_many(self, model: str, texts: list[str], vectors: list[np.ndarray]) -> None:
+        items = {self.key(model, text): vector for text, vector in zip(texts, vectors)}
+        for key, vector in items.items():
+            self.put_memory(key, vector)
+        if self.persistent and items:
+            # Persisting is off the request path; a failed write only costs a future miss.
+            task = asyncio.ensure_future(asyncio.to_thread(self._store, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _load(self, keys: list[CacheKey]) -> dict[CacheKey, np.ndarray]:
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(models.EmbeddingCacheEntry.model, models.EmbeddingCacheEntry.input_sha256, models.EmbeddingCacheEntry.vector).where(
+                    tuple_(models.EmbeddingCacheEntry.model, models.EmbeddingCacheEntry.input_sha256).in_(keys)
+                )
+            ).all()
+            return {(row.model, bytes(row.input_sha256)): np.frombuffer(row.vector, dtype="<f4") for row in rows}
+        finally:
+            db.close()
+
+    def _store(self, items: dict[CacheKey, np.ndarray]) -> None:
+        db = SessionLocal()
+        try:
+            rows = [
+                {"model": model, "input_sha256": digest, "dim": int(vector.shape[0]), "vector": vector.astype("<f4").tobytes()}
+                for (model, digest), vector in items.items()
+            ]
+            db.execute(insert(models.EmbeddingCacheEntry).values(rows).on_conflict_do_nothing())
+            db.commit()
+        finally:
+            db.close()
+
+
+embedding_cache = EmbeddingCache()
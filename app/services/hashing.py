@@ -0,0 +1,97 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from time import perf_counter
+from typing import Any, Callable
+from argon2 import PasswordHasher, exceptions as argon_exc
+from prometheus_client import Counter, Gauge, Histogram
+from app.config import settings
+
+OPERATIONS = Counter("argon2_operations_total", "Argon2 operations by type and outcome (ok, rejected, timeout)", ["operation", "outcome"])
+INFLIGHT = Gauge("argon2_pool_inflight", "Argon2 operations running or queued in the hashing pool")
+WAIT = Histogram("argon2_queue_wait_seconds", "Time an argon2 operation waited for a pool worker", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+DURATION = Histogram("argon2_operation_seconds", "Argon2 operation run time", ["operation"], buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+REHASHES = Counter("argon2_rehashes_total", "Password hashes upgraded to the configured argon2 parameters at login")
+
+# Sync routes and dependencies (login, API key checks) run on AnyIO's request
+# threadpool, 40 threads by default, and block their thread while argon2 runs.
+REQUEST_THREADS = 40
+
+ph = PasswordHasher(time_cost=settings.argon2_time_cost, memory_cost=settings.argon2_memory_cost, parallelism=settings.argon2_parallelism)
+
+
+class HashingBusy(RuntimeError):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class HashingPool:
+    """Runs argon2 hashing and verification on a fixed set of worker threads.
+
+    argon2 releases the GIL, so `workers` threads give real parallelism while
+    capping CPU and memory (each hash needs `argon2_memory_cost` KiB). At most
+    `max_queue` operations wait for a worker; beyond that, or when one waits
+    longer than `timeout` seconds, callers get HashingBusy. Each caller still
+    blocks its request thread while it waits, so running plus queued operations
+    are capped at half of REQUEST_THREADS to leave the rest for other requests.
+    """
+
+    def __init__(self, workers: int, max_queue: int, timeout: float):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max(1, min(self.workers + max(0, max_queue), REQUEST_THREADS // 2)))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+
+    def run(self, operation: str, fn: Callable[..., Any], *args) -> Any:
+        if not self.slots.acquire(blocking=False):
+            OPERATIONS.labels(operation, "rejected").inc()
+            raise HashingBusy("too many password checks in progress", retry_after=1)
+        INFLIGHT.inc()
+        queued_at = perf_counter()
+
+        def task():
+            started = perf_counter()
+            WAIT.observe(started - queued_at)
+            try:
+                return fn(*args)
+            finally:
+                DURATION.labels(operation).observe(perf_counter() - started)
+
+        try:
+            future = self.executor.submit(task)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # The operation still finishes in the background and frees its slot then.
+            OPERATIONS.labels(operation, "timeout").inc()
+            raise HashingBusy("password check timed out", retry_after=max(1, int(self.timeout)))
+        OPERATIONS.labels(operation, "ok").inc()
+        return result
+
+    def _release(self, future: Future | None) -> None:
+        INFLIGHT.dec()
+        self.slots.release()
+
+    def hash(self, secret: str) -> str:
+        return self.run("hash", ph.hash, secret)
+
+    def verify(self, hashed: str, secret: str) -> bool:
+        try:
+            return self.run("verify", ph.verify, hashed, secret)
+        except (argon_exc.VerificationError, argon_exc.InvalidHashError):
+            return False
+
+    @staticmethod
+    def needs_rehash(hashed: str) -> bool:
+        # Only parses the hash's parameters, so it runs inline.
+        try:
+            return ph.check_needs_rehash(hashed)
+        except argon_exc.InvalidHashError:
+            return False
+
+
+hashing_pool = HashingPool(settings.argon2_workers, settings.argon2_max_queue, settings.argon2_queue_timeout)
@@ -0,0 +1,323 @@
+import asyncio
+import json
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Iterator
+import httpx
+import numpy as np
+import structlog
+from prometheus_client import Counter, Gauge
+from sqlalchemy import or_, update
+from app.config import settings
+from app.db.session import SessionLocal
+from app.domain import models
+from app.services.ollama_client import OllamaClient
+from app.services.ollama_pool import NoBackendAvailable, is_backend_failure
+from app.services.resilience import AdaptiveTimeout
+from app.services.scheduler import AdmissionRejected, scheduler
+from app.services.vector_index import vector_store
+
+logger = structlog.get_logger()
+
+INGEST_ITEMS = Counter("ingest_items_total", "Bulk ingest items by outcome", ["outcome"])
+INGEST_BYTES = Counter("ingest_bytes_total", "Bulk ingest input bytes processed")
+INGEST_RUNNING = Gauge("ingest_jobs_running", "Bulk ingest jobs running in this process")
+
+
+def _transient(exc: BaseException) -> bool:
+    """True when an embed call failed for reasons unrelated to the batch itself.
+
+    Unreachable or overloaded backends, timeouts and 5xx/429 answers pass with
+    time; other 4xx answers and in-band embedding errors would fail again.
+    """
+    if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429:
+        return True
+    return isinstance(exc, (NoBackendAvailable, AdaptiveTimeout)) or is_backend_failure(exc)
+
+
+class Batch:
+    def __init__(self, offset: int):
+        self.start_offset = offset
+        self.end_offset = offset
+        self.ids: list[str] = []
+        self.texts: list[str] = []
+        self.metadata: list[dict | None] = []
+        self.invalid = 0
+        self.deduped = 0
+
+
+def read_batches(path: str, offset: int, batch_size: int) -> Iterator[Batch]:
+    """Parse a JSONL spool file from `offset` into batches of at most `batch_size` items.
+
+    Each line is {"id", "text", "metadata"}; a missing id defaults to the line's
+    byte offset so ids stay stable when a job resumes. Ids repeated within a
+    batch keep their last occurrence.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        batch = Batch(offset)
+        index: dict[str, int] = {}
+        while True:
+            line_offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            batch.end_offset = f.tell()
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                text = record["text"]
+                if not isinstance(text, str) or not text:
+                    raise ValueError("text must be a non-empty string")
+                item_id = str(record.get("id") or f"offset-{line_offset}")
+                meta = record.get("metadata")
+            except (ValueError, KeyError, TypeError, AttributeError):
+                batch.invalid += 1
+                continue
+            if item_id in index:
+                position = index[item_id]
+                batch.texts[position] = text
+                batch.metadata[position] = meta
+                batch.deduped += 1
+                continue
+            index[item_id] = len(batch.ids)
+            batch.ids.append(item_id)
+            batch.texts.append(text)
+            batch.metadata.append(meta)
+            if len(batch.ids) >= batch_size:
+                yield batch
+                batch = Batch(batch.end_offset)
+                index = {}
+        if batch.end_offset > batch.start_offset:
+            yield batch
+
+
+class IngestRunner:
+    """Runs bulk embedding jobs from spooled JSONL uploads, one job at a time per process.
+
+    Batches are embedded with up to `ingest_concurrency` in flight (through the
+    embedding cache, so repeated texts are embedded once) and persisted in input
+    order. Each persisted batch advances the job's byte checkpoint in the same
+    transaction, so a job interrupted by a crash resumes from the last batch.
+    Memory is bounded by the in-flight window, whatever the input size.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _claim(self) -> models.IngestJob | None:
+        # Jobs whose heartbeat went stale were cut off by a dead process; the spool
+        # file must be reachable from here to pick them up.
+        stale = datetime.utcnow() - timedelta(seconds=settings.ingest_stale_seconds)
+        db = SessionLocal()
+        try:
+            candidates = (
+                db.query(models.IngestJob)
+                .filter(or_(models.IngestJob.status == "queued", (models.IngestJob.status == "running") & (models.IngestJob.heartbeat_at < stale)))
+                .order_by(models.IngestJob.created_at)
+                .with_for_update(skip_locked=True)
+                .limit(10)
+                .all()
+            )
+            for job in candidates:
+                if os.path.exists(job.spool_path):
+                    now = datetime.utcnow()
+                    job.status = "running"
+                    job.started_at = job.started_at or now
+                    job.heartbeat_at = now
+                    db.commit()
+                    db.refresh(job)
+                    db.expunge(job)
+                    return job
+            db.rollback()
+            return None
+        finally:
+            db.close()
+
+    def _finish(self, job_id: str, status: str, error: str | None = None) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(models.IngestJob).where(models.IngestJob.id == job_id).values(status=status, error=error, finished_at=datetime.utcnow())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _requeue(self, job_id: str) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(update(models.IngestJob).where(models.IngestJob.id == job_id, models.IngestJob.status == "running").values(status="queued"))
+            db.commit()
+        finally:
+            db.close()
+
+    def _heartbeat(self, job_id: str) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(models.IngestJob)
+                .where(models.IngestJob.id == job_id, models.IngestJob.status == "running")
+                .values(heartbeat_at=datetime.utcnow())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _keep_alive(self, job_id: str) -> None:
+        # Batches can wait a long time for admission or a slow model; keep the claim
+        # fresh so another process does not take the job over meanwhile.
+        while True:
+            await asyncio.sleep(settings.ingest_stale_seconds / 3)
+            try:
+                await asyncio.to_thread(self._heartbeat, job_id)
+            except Exception as e:
+                logger.warning("ingest.heartbeat_failed", job_id=job_id, error=str(e))
+
+    def _persist(self, job: models.IngestJob, batch: Batch, vectors: np.ndarray | None) -> None:
+        db = SessionLocal()
+        try:
+            failed = 0 if vectors is not None else len(batch.ids)
+            db.execute(
+                update(models.IngestJob)
+                .where(models.IngestJob.id == job.id)
+                .values(
+                    bytes_done=batch.end_offset,
+                    items_done=models.IngestJob.items_done + (len(batch.ids) - failed),
+                    items_failed=models.IngestJob.items_failed + failed + batch.invalid,
+                    items_deduped=models.IngestJob.items_deduped + batch.deduped,
+                    heartbeat_at=datetime.utcnow(),
+                )
+            )
+            if vectors is not None and batch.ids:
+                collection = db.get(models.VectorCollection, job.collection_id)
+                # The checkpoint update above commits together with the items.
+                vector_store.upsert(db, collection, batch.ids, vectors, batch.metadata)
+            else:
+                db.commit()
+        finally:
+            db.close()
+
+    async def _embed(self, job: models.IngestJob, dim: int, batch: Batch) -> np.ndarray | None:
+        if not batch.ids:
+            return None
+        delay = min(1.0, settings.ingest_retry_max_delay)
+        while True:
+            try:
+                async with scheduler.admit(job.created_by or 0, job.model):
+                    vectors = await OllamaClient().embed_arrays(job.model, batch.texts)
+                break
+            except AdmissionRejected as e:
+                # Ollama is saturated; wait for capacity instead of failing the items.
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                if _transient(e):
+                    # Failing the items would move the checkpoint past them for good;
+                    # hold this batch (and the ones behind it) until Ollama recovers.
+                    logger.warning("ingest.batch_retry", job_id=job.id, items=len(batch.ids), delay=delay, error=str(e))
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, settings.ingest_retry_max_delay)
+                    continue
+                logger.warning("ingest.batch_failed", job_id=job.id, items=len(batch.ids), error=str(e))
+                return None
+        matrix = np.stack(vectors)
+        if matrix.shape != (len(batch.ids), dim):
+            raise ValueError(f"model {job.model} returned {matrix.shape[-1]}-dimensional embeddings, collection expects {dim}")
+        return matrix
+
+    async def _commit(self, job: models.IngestJob, batch: Batch, pending: asyncio.Task) -> None:
+        vectors = await pending
+        await asyncio.to_thread(self._persist, job, batch, vectors)
+        INGEST_BYTES.inc(batch.end_offset - batch.start_offset)
+        INGEST_ITEMS.labels("embedded" if vectors is not None else "failed").inc(len(batch.ids))
+        INGEST_ITEMS.labels("invalid").inc(batch.invalid)
+        INGEST_ITEMS.labels("deduped").inc(batch.deduped)
+
+    async def run(self, job: models.IngestJob) -> None:
+        dim = await asyncio.to_thread(self._collection_dim, job.collection_id)
+        batches = read_batches(job.spool_path, job.bytes_done, settings.ollama_embed_batch_size)
+        window: deque[tuple[Batch, asyncio.Task]] = deque()
+        try:
+            while True:
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    break
+                window.append((batch, asyncio.create_task(self._embed(job, dim, batch))))
+                if len(window) >= max(1, settings.ingest_concurrency):
+                    await self._commit(job, *window.popleft())
+            while window:
+                await self._commit(job, *window.popleft())
+        finally:
+            for _, task in window:
+                task.cancel()
+            batches.close()
+
+    def _collection_dim(self, collection_id: int) -> int:
+        db = SessionLocal()
+        try:
+            return db.get(models.VectorCollection, collection_id).dim
+        finally:
+            db.close()
+
+    async def _execute(self, job: models.IngestJob) -> None:
+        INGEST_RUNNING.inc()
+        keep_alive = asyncio.create_task(self._keep_alive(job.id))
+        try:
+            await self.run(job)
+        except asyncio.CancelledError:
+            # Shutdown: requeue the job so any process with the spool file resumes it from its checkpoint.
+            await asyncio.to_thread(self._requeue, job.id)
+            raise
+        except Exception as e:
+            logger.warning("ingest.job_failed", job_id=job.id, error=str(e))
+            await asyncio.to_thread(self._finish, job.id, "failed", str(e))
+        else:
+            await asyncio.to_thread(self._finish, job.id, "succeeded")
+            try:
+                os.remove(job.spool_path)
+            except OSError:
+                pass
+        finally:
+            keep_alive.cancel()
+            INGEST_RUNNING.dec()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                logger.warning("ingest.claim_failed", error=str(e))
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.jobs_poll_interval * 5)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._execute(job)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+
+
+ingest_runner = IngestRunner()
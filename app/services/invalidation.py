@@ -0,0 +1,120 @@
+import asyncio
+from typing import Callable
+import structlog
+from prometheus_client import Counter, Gauge
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db.session import engine
+
+logger = structlog.get_logger()
+
+PUBLISHED = Counter("cache_invalidations_published_total", "Cache invalidation messages published", ["kind"])
+RECEIVED = Counter("cache_invalidations_received_total", "Cache invalidation messages received from Postgres", ["kind"])
+LISTENING = Gauge("cache_invalidation_listener_connected", "1 while this process is listening for cache invalidations")
+
+
+class InvalidationBus:
+    """Evicts per-process cache entries in every worker when users or credentials change.
+
+    Writers call `publish(db, kind, key)` inside their transaction. The change is
+    evicted locally right away and again after commit, and a `kind:key` NOTIFY is
+    queued on the same transaction, so Postgres delivers it to the other workers
+    only if the write commits. Each worker's listener dispatches those messages to
+    the handlers registered with `subscribe`. Whenever the listener (re)connects,
+    every cache is flushed, since messages sent while it was away were missed.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.handlers: dict[str, list[Callable[[str], None]]] = {}
+        self.flushers: list[Callable[[], None]] = []
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, kind: str, evict: Callable[[str], None], flush: Callable[[], None] | None = None) -> None:
+        self.handlers.setdefault(kind, []).append(evict)
+        if flush is not None:
+            self.flushers.append(flush)
+
+    def dispatch(self, kind: str, key: str) -> None:
+        for handler in self.handlers.get(kind, []):
+            try:
+                handler(key)
+            except Exception as e:
+                logger.warning("invalidation.handler_failed", kind=kind, key=key, error=str(e))
+
+    def flush(self) -> None:
+        for flush in self.flushers:
+            flush()
+
+    def publish(self, db: Session, kind: str, key) -> None:
+        key = str(key)
+        self.dispatch(kind, key)
+        # A concurrent request may re-cache the old row before this transaction commits.
+        event.listen(db, "after_commit", lambda session: self.dispatch(kind, key), once=True)
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": f"{kind}:{key}"})
+        PUBLISHED.labels(kind).inc()
+
+    def _connect(self):
+        # A dedicated connection, taken out of the pool so it can stay in LISTEN mode.
+        fairy = engine.raw_connection()
+        fairy.detach()
+        fairy.dbapi_connection.autocommit = True
+        with fairy.dbapi_connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return fairy
+
+    def _drain(self, conn, lost: asyncio.Event) -> None:
+        try:
+            conn.poll()
+        except Exception as e:
+            logger.warning("invalidation.listener_lost", error=str(e))
+            lost.set()
+            return
+        while conn.notifies:
+            kind, _, key = conn.notifies.pop(0).payload.partition(":")
+            RECEIVED.labels(kind).inc()
+            self.dispatch(kind, key)
+
+    async def _listen(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            fairy = None
+            fd = None
+            try:
+                fairy = await asyncio.to_thread(self._connect)
+                conn = fairy.dbapi_connection
+                lost = asyncio.Event()
+                fd = conn.fileno()
+                loop.add_reader(fd, self._drain, conn, lost)
+                self.flush()
+                LISTENING.set(1)
+                await lost.wait()
+            except Exception as e:
+                logger.warning("invalidation.listen_failed", error=str(e))
+            finally:
+                LISTENING.set(0)
+                if fd is not None:
+                    loop.remove_reader(fd)
+                if fairy is not None:
+                    try:
+                        fairy.close()
+                    except Exception:
+                        pass
+            await asyncio.sleep(settings.cache_invalidation_reconnect_interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+invalidation_bus = InvalidationBus(settings.cache_invalidation_channel)
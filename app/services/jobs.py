@@ -0,0 +1,231 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+import httpx
+import structlog
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import delete, func, update
+from app.config import settings
+from app.db.session import SessionLocal
+from app.domain import models
+from app.services.ollama_client import OllamaClient
+from app.services.ollama_pool import normalize_model
+from app.services.scheduler import AdmissionRejected, scheduler
+from app.services.usage import usage_writer
+
+logger = structlog.get_logger()
+
+JOBS = Counter("generation_jobs_total", "Generation jobs by outcome", ["outcome"])
+JOBS_RUNNING = Gauge("generation_jobs_running", "Generation jobs running in this process")
+JOB_QUEUE_WAIT = Histogram(
+    "generation_job_queue_wait_seconds",
+    "Time from enqueue to a worker claiming the job",
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900),
+)
+
+PENDING = ("queued", "running")
+FINISHED = ("succeeded", "failed")
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+def enqueue(db, user_id: int, model: str, prompt: str, options: dict | None) -> models.GenerationJob:
+    # Lock the user's row until the caller commits, so concurrent enqueues for one
+    # user are counted one after another and cannot overshoot the cap together.
+    db.query(models.User.id).filter(models.User.id == user_id).with_for_update().one_or_none()
+    pending = (
+        db.query(func.count(models.GenerationJob.id))
+        .filter(models.GenerationJob.user_id == user_id, models.GenerationJob.status.in_(PENDING))
+        .scalar()
+    )
+    if pending >= settings.jobs_user_max_pending:
+        raise JobQueueFull(f"at most {settings.jobs_user_max_pending} pending jobs per user")
+    job = models.GenerationJob(id=uuid.uuid4().hex, user_id=user_id, model=model, prompt=prompt, options=options, status="queued")
+    db.add(job)
+    db.flush()
+    return job
+
+
+def load_job(user_id: int, job_id: str) -> models.GenerationJob | None:
+    # Own short session so repeated long-poll reads see other workers' commits.
+    db = SessionLocal()
+    try:
+        job = db.get(models.GenerationJob, job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        db.expunge(job)
+        return job
+    finally:
+        db.close()
+
+
+class JobRunner:
+    """Runs queued generation jobs with a fixed number of workers per process.
+
+    Jobs are claimed from Postgres with FOR UPDATE SKIP LOCKED, so every gunicorn
+    worker can run and serve them. Jobs left running by a dead process are
+    requeued after `jobs_generation_timeout`; finished jobs are deleted after
+    `jobs_result_ttl` seconds.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(0, workers)
+        self.running: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: asyncio.Event | None = None
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _claim(self) -> models.GenerationJob | None:
+        db = SessionLocal()
+        try:
+            job = (
+                db.query(models.GenerationJob)
+                .filter(models.GenerationJob.status == "queued")
+                .order_by(models.GenerationJob.created_at)
+                .with_for_update(skip_locked=True)
+                .limit(1)
+                .first()
+            )
+            if job is None:
+                return None
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            job.attempts += 1
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    def _finish(self, job_id: str, status: str, response: str | None = None, error: str | None = None) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(models.GenerationJob)
+                .where(models.GenerationJob.id == job_id, models.GenerationJob.status == "running")
+                .values(status=status, response=response, error=error, finished_at=datetime.utcnow())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _requeue(self, job_ids: list[str], refund: bool = False) -> None:
+        # A refunded claim never reached Ollama, so it does not count towards jobs_max_attempts.
+        values = {"status": "queued", "started_at": None}
+        if refund:
+            values["attempts"] = models.GenerationJob.attempts - 1
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(models.GenerationJob)
+                .where(models.GenerationJob.id.in_(job_ids), models.GenerationJob.status == "running")
+                .values(**values)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _cleanup(self) -> None:
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=settings.jobs_generation_timeout + settings.ollama_queue_timeout + 60)
+        db = SessionLocal()
+        try:
+            job = models.GenerationJob
+            abandoned = (job.status == "running") & (job.started_at < stale)
+            db.execute(
+                update(job)
+                .where(abandoned, job.attempts >= settings.jobs_max_attempts)
+                .values(status="failed", error="worker lost", finished_at=now)
+            )
+            db.execute(update(job).where(abandoned).values(status="queued", started_at=None))
+            db.execute(delete(job).where(job.status.in_(FINISHED), job.finished_at < now - timedelta(seconds=settings.jobs_result_ttl)))
+            db.commit()
+        finally:
+            db.close()
+
+    async def _run(self, job: models.GenerationJob) -> None:
+        JOB_QUEUE_WAIT.observe((job.started_at - job.created_at).total_seconds())
+        timeout = httpx.Timeout(settings.ollama_timeout, read=settings.jobs_generation_timeout)
+        try:
+            async with scheduler.admit(job.user_id, job.model):
+                data = await OllamaClient().generate(job.model, job.prompt, job.options, timeout=timeout)
+        except AdmissionRejected:
+            # Ollama is saturated; put the job back rather than failing it.
+            JOBS.labels("requeued").inc()
+            await asyncio.to_thread(self._requeue, [job.id], True)
+            await asyncio.sleep(settings.jobs_poll_interval)
+            return
+        except Exception as e:
+            JOBS.labels("failed").inc()
+            await asyncio.to_thread(self._finish, job.id, "failed", None, f"Ollama error: {e}")
+            return
+        usage_writer.record(job.user_id, normalize_model(job.model), "job", data)
+        JOBS.labels("succeeded").inc()
+        await asyncio.to_thread(self._finish, job.id, "succeeded", data.get("response", ""), None)
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                logger.warning("jobs.claim_failed", error=str(e))
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.jobs_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            self.running.add(job.id)
+            JOBS_RUNNING.set(len(self.running))
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.warning("jobs.run_failed", job_id=job.id, error=str(e))
+            finally:
+                self.running.discard(job.id)
+                JOBS_RUNNING.set(len(self.running))
+
+    async def _janitor(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self._cleanup)
+            except Exception as e:
+                logger.warning("jobs.cleanup_failed", error=str(e))
+            await asyncio.sleep(min(60.0, settings.jobs_result_ttl))
+
+    def start(self) -> None:
+        self._tasks = [t for t in self._tasks if not t.done()]
+        if self._tasks or not self.workers:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+
+    async def stop(self) -> None:
+        interrupted = list(self.running)
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._wakeup = None
+        if interrupted:
+            # Hand jobs cut off by shutdown back to the queue for another process.
+            try:
+                await asyncio.to_thread(self._requeue, interrupted)
+            except Exception as e:
+                logger.warning("jobs.requeue_failed", jobs=len(interrupted), error=str(e))
+
+
+job_runner = JobRunner(settings.jobs_workers)
@@ -0,0 +1,181 @@
+import hashlib
+import ipaddress
+import secrets
+import threading
+from time import monotonic
+import numpy as np
+from prometheus_client import Counter
+from app.config import settings
+from app.services.invalidation import invalidation_bus
+
+SHED = Counter("login_shed_total", "Login attempts rejected before authentication, by reason", ["reason"])
+FAILURES = Counter("login_failures_recorded_total", "Failed logins counted by the credential-stuffing shedder")
+
+
+class CountMinSketch:
+    """Fixed-size approximate counters over a sliding window.
+
+    Counts live in a `depth` × `width` table, so memory does not grow with the
+    number of distinct keys; estimates can only overcount. Rows are indexed by a
+    keyed hash with a per-process secret so attackers cannot aim collisions.
+    The previous window's counts fade out linearly over the current window.
+    """
+
+    def __init__(self, width: int, depth: int, window: float):
+        self.width = width
+        self.depth = depth
+        self.window = window
+        self.salt = secrets.token_bytes(16)
+        self.rows = np.arange(depth)
+        self.current = np.zeros((depth, width), dtype=np.uint32)
+        self.previous = np.zeros((depth, width), dtype=np.uint32)
+        self.started = monotonic()
+
+    def _columns(self, key: str) -> np.ndarray:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8 * self.depth, key=self.salt).digest()
+        return np.frombuffer(digest, dtype=np.uint64) % np.uint64(self.width)
+
+    def _rotate(self, now: float) -> None:
+        elapsed = now - self.started
+        if elapsed < self.window:
+            return
+        self.previous, self.current = self.current, self.previous
+        self.current.fill(0)
+        if elapsed >= 2 * self.window:
+            self.previous.fill(0)
+        self.started = now - elapsed % self.window
+
+    def add(self, key: str) -> None:
+        self._rotate(monotonic())
+        columns = self._columns(key)
+        values = self.current[self.rows, columns]
+        # Conservative update: only raise the counters that hold the minimum.
+        self.current[self.rows, columns] = np.maximum(values, values.min() + 1)
+
+    def estimate(self, key: str) -> float:
+        now = monotonic()
+        self._rotate(now)
+        columns = self._columns(key)
+        fade = max(0.0, 1.0 - (now - self.started) / self.window)
+        return float(self.current[self.rows, columns].min()) + fade * float(self.previous[self.rows, columns].min())
+
+    def clear(self) -> None:
+        self.current.fill(0)
+        self.previous.fill(0)
+
+
+class NegativeCache:
+    """Direct-mapped set of recently seen unknown emails with a fixed number of slots.
+
+    Each slot keeps a 64-bit keyed fingerprint and an expiry; a new email simply
+    overwrites whatever shared its slot, so memory is constant and a collision can
+    only cause a miss, never a false hit on a different email.
+    """
+
+    def __init__(self, slots: int, ttl: float):
+        self.ttl = ttl
+        self.salt = secrets.token_bytes(16)
+        self.fingerprints = np.zeros(max(1, slots), dtype=np.uint64)
+        self.expires = np.zeros(max(1, slots), dtype=np.float64)
+
+    def _slot(self, email: str) -> tuple[int, np.uint64]:
+        digest = hashlib.blake2b(email.encode("utf-8"), digest_size=16, key=self.salt).digest()
+        slot, fingerprint = np.frombuffer(digest, dtype=np.uint64)
+        return int(slot % np.uint64(len(self.fingerprints))), fingerprint | np.uint64(1)
+
+    def add(self, email: str) -> None:
+        slot, fingerprint = self._slot(email)
+        self.fingerprints[slot] = fingerprint
+        self.expires[slot] = monotonic() + self.ttl
+
+    def __contains__(self, email: str) -> bool:
+        slot, fingerprint = self._slot(email)
+        return bool(self.fingerprints[slot] == fingerprint and self.expires[slot] > monotonic())
+
+    def discard(self, email: str) -> None:
+        slot, fingerprint = self._slot(email)
+        if self.fingerprints[slot] == fingerprint:
+            self.fingerprints[slot] = 0
+
+    def clear(self) -> None:
+        self.fingerprints.fill(0)
+
+
+def _subnet(ip: str | None) -> str | None:
+    # IPv4 attackers rotate within a /24, IPv6 ones within a /64.
+    try:
+        address = ipaddress.ip_address(ip or "")
+    except ValueError:
+        return None
+    prefix = 24 if address.version == 4 else 64
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+class LoginShedder:
+    """Rejects likely credential-stuffing logins before any hashing or database work.
+
+    Failed logins are counted per client IP, per username and per IP subnet in a
+    shared count-min sketch. Once the IP or subnet count reaches its limit
+    within `login_shed_window` seconds, further attempts are shed. A username
+    over its limit only sheds attempts from an IP or subnet with failures of
+    its own, so failures sprayed from elsewhere cannot lock the owner out from
+    a clean address. Emails that do not
+    exist are remembered in a fixed-size negative cache and answered without
+    touching the database. Memory is fixed by the sketch and cache sizes,
+    however many distinct IPs or usernames an attacker uses.
+    """
+
+    def __init__(self):
+        self.sketch = CountMinSketch(settings.login_shed_sketch_width, settings.login_shed_sketch_depth, settings.login_shed_window)
+        self.unknown = NegativeCache(settings.login_negative_cache_slots, settings.login_negative_cache_ttl)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _keys(ip: str | None, username: str) -> list[tuple[str, str, int]]:
+        keys = [("user", f"user:{username.strip().lower()}", settings.login_shed_user_failures)]
+        if ip:
+            keys.append(("ip", f"ip:{ip}", settings.login_shed_ip_failures))
+        subnet = _subnet(ip)
+        if subnet:
+            keys.append(("subnet", f"net:{subnet}", settings.login_shed_subnet_failures))
+        return keys
+
+    def check(self, ip: str | None, username: str) -> str | None:
+        """Return the reason to shed this attempt, or None to let it through."""
+        with self.lock:
+            keys = self._keys(ip, username)
+            counts = {reason: self.sketch.estimate(key) for reason, key, _ in keys}
+            # Without any client address to go on, the username count is all there is.
+            suspect = len(keys) == 1 or any(count > 0 for reason, count in counts.items() if reason != "user")
+            for reason, _, limit in keys:
+                if limit > 0 and counts[reason] >= limit and (reason != "user" or suspect):
+                    SHED.labels(reason).inc()
+                    return reason
+            if username in self.unknown:
+                SHED.labels("unknown_email").inc()
+                self._record(ip, username)
+                return "unknown_email"
+        return None
+
+    def record_failure(self, ip: str | None, username: str, unknown_email: bool = False) -> None:
+        with self.lock:
+            self._record(ip, username)
+            if unknown_email:
+                self.unknown.add(username)
+
+    def _record(self, ip: str | None, username: str) -> None:
+        FAILURES.inc()
+        for _, key, _ in self._keys(ip, username):
+            self.sketch.add(key)
+
+    def forget_email(self, email: str) -> None:
+        with self.lock:
+            self.unknown.discard(email)
+
+    def forget_unknown_emails(self) -> None:
+        with self.lock:
+            self.unknown.clear()
+
+
+login_shedder = LoginShedder()
+invalidation_bus.subscribe("email", login_shedder.forget_email, login_shedder.forget_unknown_emails)
@@ -0,0 +1,78 @@
+import asyncio
+from time import perf_counter
+from typing import Awaitable, Callable
+import structlog
+from prometheus_client import Counter, Gauge, Histogram
+from app.config import settings
+from app.services.ollama_client import OllamaClient
+from app.services.ollama_pool import ollama_pool
+
+logger = structlog.get_logger()
+
+WARMUPS = Counter("ollama_model_warmups_total", "Model warm-up requests by outcome", ["backend", "model", "outcome"])
+WARMUP_SECONDS = Histogram(
+    "ollama_model_warmup_seconds",
+    "Time taken by a model warm-up request",
+    ["model"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+WARMED = Gauge("ollama_models_warmed", "1 once the initial model warm-up has finished")
+
+
+class ModelKeeper:
+    """Preloads the configured models on every backend and keeps them loaded.
+
+    The first round runs at startup; later rounds every `ollama_warm_interval`
+    seconds re-send the load request, which resets Ollama's keep_alive timer
+    (or reloads a model that was evicted in the meantime).
+    """
+
+    def __init__(self, models: list[str], interval: float, load: Callable[[str, str], Awaitable[None]] | None = None):
+        self.models = models
+        self.interval = interval
+        self.load = load or (lambda url, model: OllamaClient(url).load(model))
+        self._task: asyncio.Task | None = None
+        self.ready = not models
+        if self.ready:
+            WARMED.set(1)
+
+    async def warm(self) -> None:
+        jobs = [(backend.url, model) for backend in ollama_pool.backends if backend.available() for model in self.models]
+        await asyncio.gather(*(self._warm_one(url, model) for url, model in jobs))
+
+    async def _warm_one(self, url: str, model: str) -> None:
+        started = perf_counter()
+        try:
+            await self.load(url, model)
+        except Exception as e:
+            WARMUPS.labels(url, model, "failure").inc()
+            logger.warning("ollama.warmup_failed", backend=url, model=model, error=str(e))
+            return
+        WARMUPS.labels(url, model, "success").inc()
+        WARMUP_SECONDS.labels(model).observe(perf_counter() - started)
+
+    async def _run(self) -> None:
+        while True:
+            await self.warm()
+            if not self.ready:
+                self.ready = True
+                WARMED.set(1)
+                logger.info("ollama.warmup_finished", models=self.models)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if not self.models or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+model_keeper = ModelKeeper([m.strip() for m in settings.ollama_warm_models.split(",") if m.strip()], settings.ollama_warm_interval)
@@ -1,23 +1,227 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import Any, AsyncIterator, Awaitable, Callable
 import httpx
+import numpy as np
 from app.config import settings
+from app.services.embedding_cache import embedding_cache
+from app.services.ollama_pool import is_backend_failure, model_catalog, normalize_model, ollama_pool
+from app.services.resilience import HEDGES, RETRIES, AdaptiveTimeout, latency_tracker, retry_budget
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.ollama_max_connections,
+        max_keepalive_connections=settings.ollama_max_keepalive_connections,
+        keepalive_expiry=settings.ollama_keepalive_expiry,
+    )
+    return httpx.AsyncClient(timeout=settings.ollama_timeout, limits=limits)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    # One pooled client per process; the app lifespan opens and closes it, but
+    # it is created lazily so callers outside the lifespan (scripts, tests) work.
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _keep_alive_value(raw: str) -> str | int:
+    # Ollama takes durations ("10m") as strings but plain seconds (and -1 = forever) only as numbers.
+    try:
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+_MODEL_KEEP_ALIVE = {
+    normalize_model(k.strip()): _keep_alive_value(v.strip())
+    for k, v in (part.split("=", 1) for part in settings.ollama_model_keep_alive.split(",") if "=" in part)
+}
+
+
+def keep_alive_for(model: str) -> str | int | None:
+    """Return the configured keep_alive for a model, or None to leave Ollama's default."""
+    value = _MODEL_KEEP_ALIVE.get(normalize_model(model))
+    if value is None and settings.ollama_keep_alive:
+        value = _keep_alive_value(settings.ollama_keep_alive)
+    return value
+
+
+def _with_keep_alive(payload: dict) -> dict:
+    # Every request resets the model's unload timer, so the policy goes on all of them.
+    keep_alive = keep_alive_for(payload["model"])
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+
+def embed_operation(count: int) -> str:
+    """Latency-tracking operation name for an /api/embed call with `count` inputs.
+
+    Embedding cost grows with the number of inputs, so calls are grouped by the
+    next power of two of their size (capped at 256). A 64-input batch then gets
+    a timeout learned from similar batches, not from single inputs.
+    """
+    bucket = 1
+    while bucket < min(count, 256):
+        bucket *= 2
+    return f"embed_{bucket}"
+
+
+def _retryable(exc: BaseException, adaptive: bool) -> bool:
+    if adaptive:
+        return is_backend_failure(exc) or isinstance(exc, AdaptiveTimeout)
+    # The request never reached the backend, so no generation work is repeated.
+    return isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout))
 
 
 class OllamaClient:
-    def __init__(self, base_url: str | None = None):
-        self.base_url = base_url or settings.resolved_ollama_base_url()
-        self.client = httpx.Client(base_url=self.base_url, timeout=15.0)
+    """Calls Ollama through the shared HTTP client.
+
+    With no base_url each call is routed to a backend leased from the pool;
+    an explicit base_url pins every call to that node (used by health probes).
+    """
+
+    def __init__(self, base_url: str | None = None, client: httpx.AsyncClient | None = None, prefer: str | None = None):
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.client = client or get_http_client()
+        self.prefer = prefer
+        self.last_backend: str | None = None
+
+    @asynccontextmanager
+    async def _backend(self, model: str | None = None) -> AsyncIterator[str]:
+        if self.base_url is not None:
+            self.last_backend = self.base_url
+            yield self.base_url
+            return
+        async with ollama_pool.lease(model=model, prefer=self.prefer) as backend:
+            self.last_backend = backend.url
+            yield backend.url
+
+    async def _call(
+        self, operation: str, model: str | None, send: Callable[[str], Awaitable[Any]], hedge: bool = False, adaptive: bool = True
+    ) -> Any:
+        """Run `send(base_url)` on a pooled backend with budgeted retries.
+
+        `adaptive` is for calls of predictable cost (tags, ps, and embed grouped
+        by batch size): they get a timeout derived from observed latency and are retried on another backend after a
+        backend failure or timeout while the retry budget allows. Generation
+        cost scales with output length, so those calls keep the static timeout
+        and are only retried when the request never reached a backend. With
+        `hedge` (idempotent calls only), a second copy is sent to another backend
+        once the call outlives the observed p95 latency.
+        """
+        if self.base_url is not None:
+            self.last_backend = self.base_url
+            return await send(self.base_url)
+        label = model_catalog.label(model) if model else "-"
+        tried: list[str] = []
+        attempt = 1
+        while True:
+            limit = latency_tracker.timeout(operation, label) if adaptive else None
+            try:
+                if hedge and settings.ollama_hedge_enabled:
+                    result = await self._hedged(operation, label, model, send, limit, tried)
+                else:
+                    result = await self._attempt(operation, label, model, send, limit, tried)
+            except Exception as e:
+                if not _retryable(e, adaptive) or attempt >= settings.ollama_retry_max_attempts:
+                    raise
+                if not retry_budget.withdraw():
+                    RETRIES.labels(operation, "budget_exhausted").inc()
+                    raise
+                RETRIES.labels(operation, "retried").inc()
+                attempt += 1
+                continue
+            retry_budget.deposit()
+            return result
 
-    def health(self) -> bool:
+    async def _attempt(
+        self, operation: str, label: str, model: str | None, send: Callable[[str], Awaitable[Any]], limit: float | None, tried: list[str]
+    ) -> Any:
+        # Prefer backends not tried yet; with every backend tried, any of them may be reused.
+        exclude = tuple(tried) if len(set(tried)) < len(ollama_pool.backends) else ()
+
+        async def leased() -> Any:
+            async with ollama_pool.lease(exclude=exclude, model=model, prefer=self.prefer) as backend:
+                tried.append(backend.url)
+                self.last_backend = backend.url
+                return await send(backend.url)
+
+        started = perf_counter()
+        try:
+            # The limit cancels the leased call, so the pool counts it as cancelled, not as a breaker failure.
+            result = await asyncio.wait_for(leased(), limit)
+        except asyncio.TimeoutError:
+            if limit is None:
+                raise
+            # Record the expiry as a sample so the limit can grow when calls get slower.
+            latency_tracker.observe(operation, label, perf_counter() - started)
+            raise AdaptiveTimeout(f"{operation} exceeded adaptive timeout of {limit:.1f}s")
+        latency_tracker.observe(operation, label, perf_counter() - started)
+        return result
+
+    async def _hedged(
+        self, operation: str, label: str, model: str | None, send: Callable[[str], Awaitable[Any]], limit: float | None, tried: list[str]
+    ) -> Any:
+        tasks = [asyncio.ensure_future(self._attempt(operation, label, model, send, limit, tried))]
+        try:
+            delay = latency_tracker.hedge_delay(operation, label)
+            if delay is None or len(ollama_pool.backends) < 2:
+                return await tasks[0]
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+            if not retry_budget.withdraw():
+                HEDGES.labels(operation, "budget_exhausted").inc()
+                return await tasks[0]
+            HEDGES.labels(operation, "sent").inc()
+            tasks.append(asyncio.ensure_future(self._attempt(operation, label, model, send, limit, tried)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            HEDGES.labels(operation, "won").inc()
+                        return task.result()
+            # Both copies failed; report the original call's error.
+            raise tasks[0].exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark a losing copy's failure as retrieved
+
+    async def health(self) -> bool:
         try:
-            r = self.client.get("/")
+            async with self._backend() as base_url:
+                r = await self.client.get(f"{base_url}/")
             return r.status_code < 500
         except Exception:
             return False
 
-    def list_models(self) -> list[str]:
-        r = self.client.get("/api/tags")
-        r.raise_for_status()
-        data = r.json()
+    async def list_models(self) -> list[str]:
+        async def send(base_url: str) -> dict:
+            r = await self.client.get(f"{base_url}/api/tags")
+            r.raise_for_status()
+            return r.json()
+
+        data = await self._call("list_models", None, send, hedge=True)
         raw = data.get("models") or data.get("tags") or []
         names: list[str] = []
         for item in raw:
@@ -28,20 +232,124 @@ class OllamaClient:
                 name = str(item)
             if name:
                 names.append(name)
+        model_catalog.remember(names)
         return names
 
-    def chat(self, model: str, prompt: str) -> str:
-        r = self.client.post("/api/generate", json={"model": model, "prompt": prompt, "stream": False})
-        r.raise_for_status()
-        data = r.json()
+    async def running_models(self) -> list[str]:
+        async def send(base_url: str) -> dict:
+            r = await self.client.get(f"{base_url}/api/ps")
+            r.raise_for_status()
+            return r.json()
+
+        data = await self._call("running_models", None, send, hedge=True)
+        return [item.get("name") or item.get("model") for item in data.get("models") or [] if item.get("name") or item.get("model")]
+
+    async def load(self, model: str) -> None:
+        # An empty generate request loads the model without generating; embedding-only
+        # models reject /api/generate, so they are loaded through an empty /api/embed.
+        timeout = httpx.Timeout(settings.ollama_timeout, read=settings.ollama_stream_read_timeout)
+        async with self._backend(model) as base_url:
+            r = await self.client.post(f"{base_url}/api/generate", json=_with_keep_alive({"model": model}), timeout=timeout)
+            if r.status_code == 400:
+                r = await self.client.post(f"{base_url}/api/embed", json=_with_keep_alive({"model": model, "input": []}), timeout=timeout)
+            r.raise_for_status()
+
+    async def generate(self, model: str, prompt: str, options: dict | None = None, timeout: httpx.Timeout | None = None) -> dict:
+        # Full /api/generate body: "response" plus token counts and durations.
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        if options:
+            payload["options"] = options
+
+        async def send(base_url: str) -> dict:
+            r = await self.client.post(f"{base_url}/api/generate", json=_with_keep_alive(payload), timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+            r.raise_for_status()
+            return r.json()
+
+        return await self._call("generate", model, send, adaptive=False)
+
+    async def chat(self, model: str, prompt: str, options: dict | None = None) -> str:
+        data = await self.generate(model, prompt, options)
         # Ollama returns {"response": "..."} for /api/generate
         return data.get("response", "")
 
-    def embeddings(self, model: str, input_text: str) -> list[float]:
-        r = self.client.post("/api/embeddings", json={"model": model, "prompt": input_text})
-        r.raise_for_status()
-        data = r.json()
-        return data.get("embedding", [])
+    async def chat_messages(self, model: str, messages: list[dict], options: dict | None = None) -> dict:
+        # Multi-turn /api/chat; the reply is in data["message"]["content"].
+        payload = {"model": model, "messages": messages, "stream": False}
+        if options:
+            payload["options"] = options
+
+        async def send(base_url: str) -> dict:
+            r = await self.client.post(f"{base_url}/api/chat", json=_with_keep_alive(payload))
+            r.raise_for_status()
+            return r.json()
+
+        return await self._call("chat", model, send, adaptive=False)
+
+    async def chat_stream(self, model: str, prompt: str, options: dict | None = None) -> AsyncIterator[dict]:
+        # Yields Ollama's NDJSON chunks as they arrive; the last one has "done": true
+        # and carries the generation stats. The read timeout bounds the gap between
+        # chunks rather than the whole generation.
+        timeout = httpx.Timeout(settings.ollama_timeout, read=settings.ollama_stream_read_timeout)
+        payload = {"model": model, "prompt": prompt, "stream": True}
+        if options:
+            payload["options"] = options
+        async with self._backend(model) as base_url:
+            async with self.client.stream("POST", f"{base_url}/api/generate", json=_with_keep_alive(payload), timeout=timeout) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise RuntimeError(chunk["error"])
+                    yield chunk
+
+    async def _embed_upstream(self, model: str, inputs: list[str]) -> list[list[float]]:
+        async def send(base_url: str) -> dict:
+            r = await self.client.post(f"{base_url}/api/embed", json=_with_keep_alive({"model": model, "input": inputs}))
+            r.raise_for_status()
+            return r.json()
+
+        data = await self._call(embed_operation(len(inputs)), model, send, hedge=True)
+        vectors = data.get("embeddings") or []
+        if len(vectors) != len(inputs):
+            raise RuntimeError(f"expected {len(inputs)} embeddings, got {len(vectors)}")
+        return vectors
+
+    async def embed_arrays(self, model: str, inputs: list[str]) -> list[np.ndarray]:
+        # Only inputs missing from the embedding cache are sent upstream.
+        found = await embedding_cache.get_many(model, inputs)
+        missing = list(dict.fromkeys(text for text, vector in zip(inputs, found) if vector is None))
+        if missing:
+            fetched = [np.asarray(v, dtype=np.float32) for v in await self._embed_upstream(model, missing)]
+            embedding_cache.put_many(model, missing, fetched)
+            by_text = dict(zip(missing, fetched))
+            found = [by_text[text] if vector is None else vector for text, vector in zip(inputs, found)]
+        return found
+
+    async def embed(self, model: str, inputs: list[str]) -> list[list[float]]:
+        return [vector.tolist() for vector in await self.embed_arrays(model, inputs)]
+
+    async def embed_batched(self, model: str, inputs: list[str], batch_size: int | None = None) -> list[np.ndarray | Exception]:
+        # Splits inputs into /api/embed calls of at most batch_size items. Results keep
+        # input order as float32 arrays; a failed chunk yields its exception for each of its items.
+        size = max(1, batch_size or settings.ollama_embed_batch_size)
+        semaphore = asyncio.Semaphore(max(1, settings.ollama_embed_concurrency))
+
+        async def run(chunk: list[str]) -> list[np.ndarray]:
+            async with semaphore:
+                return await self.embed_arrays(model, chunk)
+
+        chunks = [inputs[i : i + size] for i in range(0, len(inputs), size)]
+        outcomes = await asyncio.gather(*(run(chunk) for chunk in chunks), return_exceptions=True)
+        results: list[np.ndarray | Exception] = []
+        for chunk, outcome in zip(chunks, outcomes):
+            if isinstance(outcome, BaseException):
+                results.extend([outcome] * len(chunk))
+            else:
+                results.extend(outcome)
+        return results
 
-    def close(self):
-        self.client.close()
+    async def embeddings(self, model: str, input_text: str) -> list[float]:
+        vectors = await self.embed(model, [input_text])
+        return vectors[0]
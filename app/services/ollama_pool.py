@@ -0,0 +1,281 @@
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Awaitable, Callable
+import httpx
+import structlog
+from prometheus_client import Counter, Gauge
+from app.config import settings
+
+logger = structlog.get_logger()
+
+BACKEND_OUTSTANDING = Gauge("ollama_backend_outstanding_requests", "In-flight requests per Ollama backend", ["backend"])
+BACKEND_HEALTHY = Gauge("ollama_backend_healthy", "1 if the last health probe of the backend succeeded", ["backend"])
+BACKEND_CIRCUIT = Gauge("ollama_backend_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["backend"])
+BACKEND_REQUESTS = Counter("ollama_backend_requests_total", "Requests routed to each Ollama backend by outcome", ["backend", "outcome"])
+MODEL_RESIDENT = Gauge("ollama_backend_model_resident", "1 if /api/ps reports the model loaded on the backend", ["backend", "model"])
+MODEL_PLACEMENTS = Counter("ollama_model_placements_total", "Model-specific routing decisions (warm: model already loaded, cold: load required)", ["model", "placement"])
+
+
+class NoBackendAvailable(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a cooldown and a gradual half-open phase.
+
+    After `failure_threshold` failures in a row the breaker opens for `open_seconds`.
+    It then admits at most `half_open_requests` concurrent trial requests and closes
+    again once that many trials succeed in a row; any failed trial reopens it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failure_threshold: int, open_seconds: float, half_open_requests: int):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.half_open_requests = max(1, half_open_requests)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.successes = 0
+        self.trials = 0
+        self.opened_at = 0.0
+
+    def can_admit(self) -> bool:
+        if self.state == self.OPEN and monotonic() - self.opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+            self.successes = 0
+            self.trials = 0
+        if self.state == self.OPEN:
+            return False
+        if self.state == self.HALF_OPEN:
+            return self.trials < self.half_open_requests
+        return True
+
+    def on_admit(self) -> bool:
+        if self.state == self.HALF_OPEN:
+            self.trials += 1
+            return True
+        return False
+
+    def on_release(self) -> None:
+        if self.trials > 0:
+            self.trials -= 1
+
+    def record_success(self) -> None:
+        self.failures = 0
+        if self.state == self.HALF_OPEN:
+            self.successes += 1
+            if self.successes >= self.half_open_requests:
+                self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = monotonic()
+            self.successes = 0
+
+
+def normalize_model(name: str) -> str:
+    # /api/ps always reports a tag, while requests may omit the implicit ":latest".
+    return name if ":" in name else f"{name}:latest"
+
+
+def _configured_models() -> set[str]:
+    names = settings.ollama_warm_models.split(",") + [settings.semantic_cache_model]
+    for raw in (settings.ollama_model_concurrency, settings.ollama_model_keep_alive):
+        names += [part.split("=", 1)[0] for part in raw.split(",") if "=" in part]
+    return {normalize_model(name.strip()) for name in names if name.strip()}
+
+
+class ModelCatalog:
+    """Models known to exist, used to bound per-model metric labels and state.
+
+    Model names arrive from clients, so anything keyed by them (Prometheus
+    labels, scheduler lanes, latency windows) only uses names that are
+    configured or were reported by a backend's /api/tags or /api/ps; every other
+    name is grouped under "other".
+    """
+
+    OTHER = "other"
+
+    def __init__(self, configured: set[str]):
+        self.known = set(configured)
+
+    def remember(self, names: list[str]) -> None:
+        self.known.update(normalize_model(name) for name in names)
+
+    def label(self, name: str) -> str:
+        name = normalize_model(name)
+        return name if name in self.known else self.OTHER
+
+
+model_catalog = ModelCatalog(_configured_models())
+
+
+class Backend:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True
+        self.resident: set[str] = set()
+        self.breaker = CircuitBreaker(
+            settings.ollama_breaker_failure_threshold,
+            settings.ollama_breaker_open_seconds,
+            settings.ollama_breaker_half_open_requests,
+        )
+
+    def available(self) -> bool:
+        return self.healthy and self.breaker.can_admit()
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    # 4xx answers (unknown model, bad request) mean the node is up and responding.
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class OllamaPool:
+    """Routes calls across Ollama backends by least outstanding requests.
+
+    Model-specific calls prefer backends that already hold the model in memory
+    (per the last /api/ps poll) and fall back to the least loaded backend.
+    """
+
+    def __init__(self, urls: list[str]):
+        self.backends = [Backend(url) for url in urls]
+        self._tasks: list[asyncio.Task] = []
+        for backend in self.backends:
+            BACKEND_HEALTHY.labels(backend.url).set(1)
+            BACKEND_CIRCUIT.labels(backend.url).set(CircuitBreaker.CLOSED)
+
+    def pick(self, exclude: tuple[str, ...] = (), model: str | None = None, prefer: str | None = None) -> Backend:
+        candidates = [b for b in self.backends if b.url not in exclude and b.available()]
+        if not candidates:
+            raise NoBackendAvailable("no healthy Ollama backend available")
+        if prefer is not None:
+            # Sticky callers (conversations) return to the node holding their KV cache while it is usable.
+            for backend in candidates:
+                if backend.url == prefer.rstrip("/"):
+                    return backend
+        if model is not None:
+            name = normalize_model(model)
+            warm = [b for b in candidates if name in b.resident]
+            limit = settings.ollama_affinity_max_outstanding
+            if limit > 0:
+                warm = [b for b in warm if b.outstanding < limit]
+            MODEL_PLACEMENTS.labels(model_catalog.label(name), "warm" if warm else "cold").inc()
+            if warm:
+                candidates = warm
+        least = min(b.outstanding for b in candidates)
+        backend = random.choice([b for b in candidates if b.outstanding == least])
+        if model is not None:
+            # The node loads the model now; keep routing there until the next /api/ps poll.
+            backend.resident.add(normalize_model(model))
+        return backend
+
+    @asynccontextmanager
+    async def lease(self, exclude: tuple[str, ...] = (), model: str | None = None, prefer: str | None = None) -> AsyncIterator[Backend]:
+        backend = self.pick(exclude, model, prefer)
+        async with self.use(backend):
+            yield backend
+
+    @asynccontextmanager
+    async def use(self, backend: Backend) -> AsyncIterator[Backend]:
+        trial = backend.breaker.on_admit()
+        backend.outstanding += 1
+        BACKEND_OUTSTANDING.labels(backend.url).set(backend.outstanding)
+        try:
+            yield backend
+        except Exception as e:
+            if is_backend_failure(e):
+                backend.breaker.record_failure()
+                BACKEND_REQUESTS.labels(backend.url, "failure").inc()
+            else:
+                backend.breaker.record_success()
+                BACKEND_REQUESTS.labels(backend.url, "client_error").inc()
+            raise
+        except BaseException:
+            # Cancelled or abandoned by the caller: says nothing about the backend.
+            BACKEND_REQUESTS.labels(backend.url, "cancelled").inc()
+            raise
+        else:
+            backend.breaker.record_success()
+            BACKEND_REQUESTS.labels(backend.url, "success").inc()
+        finally:
+            backend.outstanding -= 1
+            if trial:
+                backend.breaker.on_release()
+            BACKEND_OUTSTANDING.labels(backend.url).set(backend.outstanding)
+            BACKEND_CIRCUIT.labels(backend.url).set(backend.breaker.state)
+
+    async def probe(self, check: Callable[[str], Awaitable[bool]]) -> None:
+        results = await asyncio.gather(*(check(b.url) for b in self.backends), return_exceptions=True)
+        for backend, ok in zip(self.backends, results):
+            healthy = ok is True
+            if healthy != backend.healthy:
+                logger.warning("ollama.backend.health_changed", backend=backend.url, healthy=healthy)
+            backend.healthy = healthy
+            BACKEND_HEALTHY.labels(backend.url).set(1 if healthy else 0)
+            BACKEND_CIRCUIT.labels(backend.url).set(backend.breaker.state)
+
+    async def refresh_residency(self, fetch_running: Callable[[str], Awaitable[list[str]]]) -> None:
+        results = await asyncio.gather(*(fetch_running(b.url) for b in self.backends), return_exceptions=True)
+        for backend, running in zip(self.backends, results):
+            if isinstance(running, BaseException):
+                continue
+            resident = {normalize_model(name) for name in running}
+            model_catalog.remember(list(resident))
+            for name in backend.resident - resident:
+                MODEL_RESIDENT.labels(backend.url, name).set(0)
+            for name in resident:
+                MODEL_RESIDENT.labels(backend.url, name).set(1)
+            backend.resident = resident
+
+    async def _every(self, interval: float, step: Callable[[], Awaitable[None]], event: str) -> None:
+        while True:
+            try:
+                await step()
+            except Exception as e:
+                logger.warning(event, error=str(e))
+            await asyncio.sleep(interval)
+
+    async def refresh_catalog(self, fetch_models: Callable[[], Awaitable[list[str]]]) -> None:
+        model_catalog.remember(await fetch_models())
+
+    def start(
+        self,
+        check: Callable[[str], Awaitable[bool]],
+        fetch_running: Callable[[str], Awaitable[list[str]]] | None = None,
+        fetch_models: Callable[[], Awaitable[list[str]]] | None = None,
+    ) -> None:
+        self._tasks = [t for t in self._tasks if not t.done()]
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._every(settings.ollama_health_interval, lambda: self.probe(check), "ollama.backend.probe_failed")))
+        if fetch_running is not None:
+            self._tasks.append(
+                asyncio.create_task(
+                    self._every(settings.ollama_residency_interval, lambda: self.refresh_residency(fetch_running), "ollama.backend.residency_failed")
+                )
+            )
+        if fetch_models is not None:
+            self._tasks.append(
+                asyncio.create_task(self._every(settings.ollama_models_cache_ttl, lambda: self.refresh_catalog(fetch_models), "ollama.backend.catalog_failed"))
+            )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+
+ollama_pool = OllamaPool(settings.resolved_ollama_base_urls())
@@ -0,0 +1,105 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from time import monotonic
+from prometheus_client import Counter, Gauge
+from app.config import settings
+from app.services.invalidation import invalidation_bus
+
+LOOKUPS = Counter("principal_cache_lookups_total", "Verified principal cache lookups by outcome", ["result"])
+ENTRIES = Gauge("principal_cache_entries", "Verified principals cached in this process")
+INVALIDATIONS = Counter("principal_cache_invalidations_total", "Principal cache evictions caused by user changes")
+
+
+class Principal:
+    """Identity resolved from a verified token: what the routes need without a User row."""
+
+    __slots__ = ("id", "is_active", "roles")
+
+    def __init__(self, id: int, is_active: bool, roles: list[str]):
+        self.id = id
+        self.is_active = is_active
+        self.roles = roles
+
+
+class PrincipalCache:
+    """Bounded LRU of verified bearer tokens to their principal.
+
+    Entries are keyed by a SHA-256 digest of the token (the token itself is never
+    kept) and expire at the token's `exp` or after `ttl` seconds, whichever is
+    sooner. Changing a user's status or roles evicts all of that user's tokens.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.entries: OrderedDict[bytes, tuple[Principal, float]] = OrderedDict()
+        self.by_user: dict[int, set[bytes]] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Principal | None:
+        key = self.digest(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                LOOKUPS.labels("miss").inc()
+                return None
+            principal, expires_at = entry
+            if monotonic() >= expires_at:
+                self._remove(key, principal.id)
+                LOOKUPS.labels("expired").inc()
+                return None
+            self.entries.move_to_end(key)
+            LOOKUPS.labels("hit").inc()
+            return principal
+
+    def put(self, token: str, principal: Principal, exp: float | None) -> None:
+        lifetime = self.ttl if exp is None else min(self.ttl, exp - time.time())
+        if lifetime <= 0:
+            return
+        key = self.digest(token)
+        with self.lock:
+            self.entries[key] = (principal, monotonic() + lifetime)
+            self.entries.move_to_end(key)
+            self.by_user.setdefault(principal.id, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                old_key, (old, _) = self.entries.popitem(last=False)
+                self._forget(old_key, old.id)
+            ENTRIES.set(len(self.entries))
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self.lock:
+            keys = self.by_user.pop(user_id, set())
+            for key in keys:
+                self.entries.pop(key, None)
+            if keys:
+                INVALIDATIONS.inc(len(keys))
+            ENTRIES.set(len(self.entries))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.by_user.clear()
+            ENTRIES.set(0)
+
+    def _remove(self, key: bytes, user_id: int) -> None:
+        self.entries.pop(key, None)
+        self._forget(key, user_id)
+        ENTRIES.set(len(self.entries))
+
+    def _forget(self, key: bytes, user_id: int) -> None:
+        keys = self.by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_user[user_id]
+
+
+principal_cache = PrincipalCache(settings.principal_cache_ttl, settings.principal_cache_max_entries)
+
+invalidation_bus.subscribe("user", lambda key: principal_cache.invalidate_user(int(key)), principal_cache.clear)
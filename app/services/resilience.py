@@ -0,0 +1,89 @@
+from collections import deque
+import numpy as np
+from prometheus_client import Counter, Gauge
+from app.config import settings
+
+RETRIES = Counter("ollama_retries_total", "Ollama call retries by outcome (retried, budget_exhausted)", ["operation", "outcome"])
+HEDGES = Counter("ollama_hedges_total", "Hedged Ollama calls by outcome (sent, won, budget_exhausted)", ["operation", "outcome"])
+RETRY_TOKENS = Gauge("ollama_retry_budget_tokens", "Tokens left in the retry budget")
+ADAPTIVE_TIMEOUT = Gauge("ollama_adaptive_timeout_seconds", "Current adaptive timeout per operation and model", ["operation", "model"])
+
+
+class AdaptiveTimeout(Exception):
+    """A fixed-cost call outlived its adaptive limit; retryable, but no sign the backend is down."""
+
+
+class LatencyTracker:
+    """Keeps a sliding window of successful call latencies per (operation, model).
+
+    Percentiles are recomputed lazily after new observations. Until `min_samples`
+    latencies are known, callers get the configured fallback values.
+    """
+
+    def __init__(self, window: int = 256, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self.samples: dict[tuple[str, str], deque[float]] = {}
+        self._percentiles: dict[tuple[str, str, float], float] = {}
+
+    def observe(self, operation: str, model: str, seconds: float) -> None:
+        key = (operation, model)
+        samples = self.samples.get(key)
+        if samples is None:
+            samples = self.samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+        for cached in [k for k in self._percentiles if k[:2] == key]:
+            del self._percentiles[cached]
+
+    def percentile(self, operation: str, model: str, q: float) -> float | None:
+        samples = self.samples.get((operation, model))
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        key = (operation, model, q)
+        value = self._percentiles.get(key)
+        if value is None:
+            value = self._percentiles[key] = float(np.percentile(np.fromiter(samples, dtype=np.float64), q))
+        return value
+
+    def timeout(self, operation: str, model: str) -> float:
+        # A multiple of the high percentile, clamped so a slow tail cannot stretch it past the static limit.
+        observed = self.percentile(operation, model, settings.ollama_timeout_percentile)
+        if observed is None:
+            value = settings.ollama_timeout
+        else:
+            value = min(settings.ollama_timeout, max(settings.ollama_timeout_min, observed * settings.ollama_timeout_multiplier))
+        ADAPTIVE_TIMEOUT.labels(operation, model).set(value)
+        return value
+
+    def hedge_delay(self, operation: str, model: str) -> float | None:
+        return self.percentile(operation, model, settings.ollama_hedge_percentile)
+
+
+class RetryBudget:
+    """Token bucket that caps retries and hedges at a fraction of successful calls.
+
+    Every successful call deposits `ratio` tokens (up to `burst`); each retry or
+    hedge withdraws one. During an outage the bucket drains and extra attempts
+    stop, so retries never multiply load on failing backends.
+    """
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        RETRY_TOKENS.set(self.tokens)
+
+    def deposit(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+        RETRY_TOKENS.set(self.tokens)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        RETRY_TOKENS.set(self.tokens)
+        return True
+
+
+latency_tracker = LatencyTracker()
+retry_budget = RetryBudget(settings.ollama_retry_budget_ratio, settings.ollama_retry_budget_burst)
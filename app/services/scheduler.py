@@ -0,0 +1,181 @@
+import asyncio
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import AsyncIterator
+from prometheus_client import Counter, Gauge, Histogram
+from app.config import settings
+from app.services.ollama_pool import model_catalog, normalize_model
+
+QUEUE_DEPTH = Gauge("ollama_scheduler_queue_depth", "Requests waiting for admission per model", ["model"])
+INFLIGHT = Gauge("ollama_scheduler_inflight", "Admitted Ollama requests per model", ["model"])
+QUEUE_WAIT = Histogram(
+    "ollama_scheduler_wait_seconds",
+    "Time spent waiting for admission per model",
+    ["model"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+REJECTIONS = Counter("ollama_scheduler_rejections_total", "Requests refused admission", ["model", "reason"])
+
+
+class AdmissionRejected(RuntimeError):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _parse_map(raw: str, cast) -> dict:
+    parsed = {}
+    for part in raw.split(","):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            parsed[key.strip()] = cast(value.strip())
+    return parsed
+
+
+class Ticket:
+    def __init__(self, user_id: int | None, model: str, start: float, finish: float):
+        self.user_id = user_id
+        self.model = model
+        self.start = start
+        self.finish = finish
+        self.future: asyncio.Future | None = None
+        self.granted = False
+        self.released = False
+
+
+class _Lane:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.inflight = 0
+        self.waiting: list[Ticket] = []
+        self.last_finish: dict[int | None, float] = {}
+        self.virtual_time = 0.0
+
+    def idle(self) -> bool:
+        return self.inflight == 0 and not self.waiting
+
+    def prune(self) -> None:
+        # A finish tag at or behind virtual time is equivalent to no tag at all.
+        if len(self.last_finish) > 2 * (self.inflight + len(self.waiting)) + 16:
+            self.last_finish = {user: finish for user, finish in self.last_finish.items() if finish > self.virtual_time}
+
+
+class AdmissionScheduler:
+    """Admission control in front of Ollama with per-model and per-user concurrency caps.
+
+    Each model has a lane limited to the backends' parallelism. Waiting requests
+    get weighted fair queuing finish tags (a user's tags advance by 1/weight per
+    request) and the lowest eligible tag is admitted whenever a slot frees up.
+    Requests wait at most `queue_timeout` seconds before being rejected.
+    Shared work done on behalf of many users (coalesced embedding batches) is
+    admitted with `user_id=None`, which counts against the model's lane but not
+    against any user's cap. Lanes are dropped once idle, and models the catalog
+    does not know share the "other" lane.
+    """
+
+    def __init__(self):
+        self.default_limit = max(1, settings.ollama_num_parallel * len(settings.resolved_ollama_base_urls()))
+        self.model_limits = {normalize_model(k): v for k, v in _parse_map(settings.ollama_model_concurrency, int).items()}
+        model_catalog.remember(list(self.model_limits))
+        self.user_limit = max(1, settings.ollama_user_max_inflight)
+        self.user_weights = {int(k): v for k, v in _parse_map(settings.ollama_user_weights, float).items()}
+        self.queue_timeout = settings.ollama_queue_timeout
+        self.max_depth = settings.ollama_queue_max_depth
+        self.lanes: dict[str, _Lane] = {}
+        self.user_inflight: dict[int, int] = {}
+
+    def _lane(self, model: str) -> _Lane:
+        lane = self.lanes.get(model)
+        if lane is None:
+            lane = self.lanes[model] = _Lane(self.model_limits.get(model, self.default_limit))
+        return lane
+
+    async def acquire(self, user_id: int | None, model: str) -> Ticket:
+        model = model_catalog.label(model)
+        lane = self._lane(model)
+        if len(lane.waiting) >= self.max_depth:
+            REJECTIONS.labels(model, "queue_full").inc()
+            raise AdmissionRejected(f"queue for {model} is full", max(1, int(self.queue_timeout)))
+        weight = self.user_weights.get(user_id, 1.0)
+        start = max(lane.virtual_time, lane.last_finish.get(user_id, 0.0))
+        ticket = Ticket(user_id, model, start, start + 1.0 / max(weight, 1e-6))
+        lane.last_finish[user_id] = ticket.finish
+        ticket.future = asyncio.get_running_loop().create_future()
+        lane.waiting.append(ticket)
+        QUEUE_DEPTH.labels(model).set(len(lane.waiting))
+        enqueued = perf_counter()
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(ticket)
+            REJECTIONS.labels(model, "timeout").inc()
+            raise AdmissionRejected(f"timed out waiting for {model} capacity", max(1, int(self.queue_timeout)))
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        finally:
+            QUEUE_WAIT.labels(model).observe(perf_counter() - enqueued)
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        if not ticket.granted or ticket.released:
+            return
+        ticket.released = True
+        lane = self._lane(ticket.model)
+        lane.inflight -= 1
+        if ticket.user_id is not None:
+            self.user_inflight[ticket.user_id] -= 1
+            if self.user_inflight[ticket.user_id] <= 0:
+                del self.user_inflight[ticket.user_id]
+        INFLIGHT.labels(ticket.model).set(lane.inflight)
+        self._dispatch()
+        self._prune(ticket.model)
+
+    @asynccontextmanager
+    async def admit(self, user_id: int | None, model: str) -> AsyncIterator[Ticket]:
+        ticket = await self.acquire(user_id, model)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _abandon(self, ticket: Ticket) -> None:
+        lane = self._lane(ticket.model)
+        if ticket in lane.waiting:
+            lane.waiting.remove(ticket)
+            QUEUE_DEPTH.labels(ticket.model).set(len(lane.waiting))
+            self._prune(ticket.model)
+        else:
+            self.release(ticket)
+
+    def _prune(self, model: str) -> None:
+        lane = self.lanes.get(model)
+        if lane is None:
+            return
+        if lane.idle():
+            del self.lanes[model]
+        else:
+            lane.prune()
+
+    def _dispatch(self) -> None:
+        # A freed per-user slot can unblock waiters on any model, so every lane is scanned.
+        for model, lane in self.lanes.items():
+            while lane.inflight < lane.limit and lane.waiting:
+                eligible = [t for t in lane.waiting if t.user_id is None or self.user_inflight.get(t.user_id, 0) < self.user_limit]
+                if not eligible:
+                    break
+                ticket = min(eligible, key=lambda t: t.finish)
+                lane.waiting.remove(ticket)
+                lane.virtual_time = max(lane.virtual_time, ticket.start)
+                lane.inflight += 1
+                if ticket.user_id is not None:
+                    self.user_inflight[ticket.user_id] = self.user_inflight.get(ticket.user_id, 0) + 1
+                ticket.granted = True
+                if not ticket.future.done():
+                    ticket.future.set_result(None)
+                QUEUE_DEPTH.labels(model).set(len(lane.waiting))
+                INFLIGHT.labels(model).set(lane.inflight)
+
+
+scheduler = AdmissionScheduler()
@@ -0,0 +1,146 @@
+import hashlib
+import json
+from collections import OrderedDict
+from time import monotonic
+from typing import Any
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+from app.config import settings
+from app.services.ollama_pool import normalize_model
+
+LOOKUPS = Counter("semantic_cache_lookups_total", "Semantic chat cache lookups by outcome", ["model", "result"])
+ENTRIES = Gauge("semantic_cache_entries", "Live entries in the semantic chat cache", ["model"])
+SIMILARITY = Histogram(
+    "semantic_cache_best_similarity",
+    "Cosine similarity of the closest cached prompt at lookup time",
+    ["model"],
+    buckets=(0.5, 0.7, 0.8, 0.85, 0.9, 0.925, 0.95, 0.97, 0.98, 0.99, 1.0),
+)
+
+
+class _Shard:
+    """Ring of unit-normalised prompt embeddings for one user, model and options set.
+
+    Storage starts small and doubles up to `capacity`, so idle partitions stay cheap.
+    """
+
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = capacity
+        size = min(capacity, 16)
+        self.vectors = np.zeros((size, dim), dtype=np.float32)
+        self.expires = np.zeros(size, dtype=np.float64)
+        self.responses: list[str | None] = [None] * size
+        self.next = 0
+
+    def best(self, query: np.ndarray, now: float) -> tuple[int, float]:
+        scores = self.vectors @ query
+        scores[self.expires <= now] = -np.inf
+        row = int(np.argmax(scores))
+        return row, float(scores[row])
+
+    def _grow(self) -> None:
+        size = min(self.capacity, 2 * len(self.responses))
+        extra = size - len(self.responses)
+        self.vectors = np.vstack([self.vectors, np.zeros((extra, self.vectors.shape[1]), dtype=np.float32)])
+        self.expires = np.concatenate([self.expires, np.zeros(extra, dtype=np.float64)])
+        self.responses.extend([None] * extra)
+
+    def add(self, vector: np.ndarray, response: str, expires_at: float) -> None:
+        # Overwrites the oldest slot once full, so memory stays at most capacity × dim floats.
+        if self.next == 0 and self.responses[-1] is not None and len(self.responses) < self.capacity:
+            self.next = len(self.responses)
+            self._grow()
+        row = self.next
+        self.vectors[row] = vector
+        self.expires[row] = expires_at
+        self.responses[row] = response
+        self.next = (row + 1) % len(self.responses)
+
+    def live(self, now: float) -> int:
+        return int(np.count_nonzero(self.expires > now))
+
+
+class SemanticCache:
+    """Serves chat responses for prompts whose embedding is close to an earlier prompt's.
+
+    Entries are partitioned by user, chat model and generation options, so a hit
+    only returns text produced for the same user by the same model with the same
+    settings; one user's completions are never served to another. Each
+    partition holds at most `max_entries` prompts. Least recently used
+    partitions are dropped once there are more than `max_partitions`, or once
+    the rows allocated across all partitions exceed `max_total_entries`; that
+    total, not the per-partition limit, bounds memory. Within a partition the
+    oldest entries are overwritten first, and entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int, max_partitions: int = 32, max_total_entries: int = 20000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_total_entries = max(1, max_total_entries)
+        self.max_entries = min(max(1, max_entries), self.max_total_entries)
+        self.max_partitions = max(1, max_partitions)
+        self.shards: OrderedDict[tuple[str, str, int], _Shard] = OrderedDict()
+        self.rows = 0
+
+    @staticmethod
+    def namespace(user_id: int, model: str, options: dict[str, Any] | None) -> tuple[str, str, int]:
+        options_digest = hashlib.sha256(json.dumps(options or {}, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+        return normalize_model(model), options_digest, user_id
+
+    @staticmethod
+    def _normalise(vector: np.ndarray) -> np.ndarray | None:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def lookup(self, namespace: tuple[str, str, int], vector: np.ndarray) -> str | None:
+        model = namespace[0]
+        shard = self.shards.get(namespace)
+        query = self._normalise(vector)
+        if shard is None or query is None or query.shape[0] != shard.vectors.shape[1]:
+            LOOKUPS.labels(model, "miss").inc()
+            return None
+        self.shards.move_to_end(namespace)
+        row, score = shard.best(query, monotonic())
+        if np.isfinite(score):
+            SIMILARITY.labels(model).observe(score)
+        if score < self.threshold:
+            LOOKUPS.labels(model, "miss").inc()
+            return None
+        LOOKUPS.labels(model, "hit").inc()
+        return shard.responses[row]
+
+    def store(self, namespace: tuple[str, str, int], vector: np.ndarray, response: str) -> None:
+        unit = self._normalise(vector)
+        if unit is None:
+            return
+        shard = self.shards.get(namespace)
+        if shard is None or shard.vectors.shape[1] != unit.shape[0]:
+            if shard is not None:
+                self.rows -= len(shard.responses)
+            shard = self.shards[namespace] = _Shard(self.max_entries, unit.shape[0])
+            self.rows += len(shard.responses)
+        self.shards.move_to_end(namespace)
+        now = monotonic()
+        allocated = len(shard.responses)
+        shard.add(unit, response, now + self.ttl)
+        self.rows += len(shard.responses) - allocated
+        while len(self.shards) > 1 and (len(self.shards) > self.max_partitions or self.rows > self.max_total_entries):
+            _, evicted = self.shards.popitem(last=False)
+            self.rows -= len(evicted.responses)
+        ENTRIES.labels(namespace[0]).set(sum(s.live(now) for key, s in self.shards.items() if key[0] == namespace[0]))
+
+    def clear(self) -> None:
+        for model, _, _ in self.shards:
+            ENTRIES.labels(model).set(0)
+        self.shards.clear()
+        self.rows = 0
+
+
+semantic_cache = SemanticCache(
+    settings.semantic_cache_threshold,
+    settings.semantic_cache_ttl,
+    settings.semantic_cache_max_entries,
+    settings.semantic_cache_max_partitions,
+    settings.semantic_cache_max_total_entries,
+)
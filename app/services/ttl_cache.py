@@ -0,0 +1,92 @@
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Awaitable, Callable, Hashable
+from prometheus_client import Counter
+
+CACHE_LOOKUPS = Counter("ttl_cache_lookups_total", "TTL cache lookups by outcome", ["cache", "result"])
+
+
+class AsyncTTLCache:
+    """Process-local async cache with TTL, single-flight loading and stale-while-revalidate.
+
+    Concurrent misses for a key share one loader call, which is cancelled if all
+    of its callers are. Within `stale_ttl` after expiry the old value is served
+    while a single background refresh runs.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0.0, max_entries: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self.inflight: dict[Hashable, asyncio.Future] = {}
+        self.waiters: dict[asyncio.Future, int] = {}
+        self.generation = 0
+
+    def peek(self, key: Hashable) -> Any | None:
+        entry = self.entries.get(key)
+        if entry is None or monotonic() >= entry[1]:
+            return None
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        self.entries[key] = (value, monotonic() + (self.ttl if ttl is None else ttl))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        # Loads already in flight finish for their waiters but are not stored.
+        self.generation += 1
+        if key is None:
+            self.entries.clear()
+            self.inflight.clear()
+        else:
+            self.entries.pop(key, None)
+            self.inflight.pop(key, None)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], store: bool = True) -> Any:
+        # store=False only shares concurrent loads (single-flight) without caching the result.
+        entry = self.entries.get(key) if store else None
+        now = monotonic()
+        if entry is not None:
+            value, expires_at = entry
+            if now < expires_at:
+                self.entries.move_to_end(key)
+                CACHE_LOOKUPS.labels(self.name, "hit").inc()
+                return value
+            if now < expires_at + self.stale_ttl:
+                CACHE_LOOKUPS.labels(self.name, "stale").inc()
+                self._load(key, loader)
+                return value
+        CACHE_LOOKUPS.labels(self.name, "coalesced" if key in self.inflight else "miss").inc()
+        future = self._load(key, loader, store)
+        self.waiters[future] = self.waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self.waiters[future] -= 1
+            if self.waiters[future] <= 0:
+                del self.waiters[future]
+                if not future.done():
+                    # Every caller has gone away (e.g. disconnected clients): stop the upstream work.
+                    future.cancel()
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], store: bool = True) -> asyncio.Future:
+        future = self.inflight.get(key)
+        if future is not None:
+            return future
+        future = asyncio.ensure_future(loader())
+        self.inflight[key] = future
+        generation = self.generation
+
+        def done(f: asyncio.Future) -> None:
+            if self.inflight.get(key) is f:
+                del self.inflight[key]
+            if store and not f.cancelled() and f.exception() is None and generation == self.generation:
+                self.set(key, f.result())
+
+        future.add_done_callback(done)
+        return future
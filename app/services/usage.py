@@ -0,0 +1,148 @@
+import asyncio
+from collections import deque
+from datetime import datetime
+import structlog
+from prometheus_client import Counter, Histogram
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+from app.db.session import SessionLocal
+from app.domain import models
+from app.services.ollama_pool import model_catalog
+
+logger = structlog.get_logger()
+
+TOKENS = Counter("ollama_tokens_total", "Tokens processed by Ollama", ["model", "kind"])
+TOKENS_PER_SECOND = Histogram(
+    "ollama_generation_tokens_per_second",
+    "Generation speed (eval_count / eval_duration) per model",
+    ["model"],
+    buckets=(1, 5, 10, 20, 40, 60, 100, 200, 400, 1000),
+)
+LOAD_SECONDS = Histogram(
+    "ollama_model_load_seconds",
+    "Model load time reported by Ollama per call",
+    ["model"],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+TOTAL_SECONDS = Histogram(
+    "ollama_generation_total_seconds",
+    "Total generation time reported by Ollama per call",
+    ["model"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+USAGE_DROPPED = Counter("ollama_usage_rows_dropped_total", "Usage rows dropped because the buffer was full or a flush failed")
+
+
+def _ms(nanoseconds) -> int:
+    return int((nanoseconds or 0) / 1_000_000)
+
+
+class UsageWriter:
+    """Records per-call Ollama stats to Prometheus and buffers rows for bulk insertion.
+
+    Rows are flushed every `usage_flush_interval` seconds, or sooner once
+    `usage_flush_max_rows` are buffered; the buffer is bounded and drops the
+    oldest rows if the database cannot keep up.
+    """
+
+    def __init__(self):
+        self.buffer: deque[dict] = deque()
+        self.max_buffer = settings.usage_buffer_max_rows
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    def record(self, user_id: int | None, model: str, kind: str, data: dict) -> None:
+        prompt_tokens = int(data.get("prompt_eval_count") or 0)
+        completion_tokens = int(data.get("eval_count") or 0)
+        eval_ns = data.get("eval_duration") or 0
+        # The stored row keeps the requested name; metrics only label known models.
+        label = model_catalog.label(model)
+        TOKENS.labels(label, "prompt").inc(prompt_tokens)
+        TOKENS.labels(label, "completion").inc(completion_tokens)
+        if completion_tokens and eval_ns:
+            TOKENS_PER_SECOND.labels(label).observe(completion_tokens / (eval_ns / 1e9))
+        if data.get("load_duration") is not None:
+            LOAD_SECONDS.labels(label).observe(data["load_duration"] / 1e9)
+        if data.get("total_duration") is not None:
+            TOTAL_SECONDS.labels(label).observe(data["total_duration"] / 1e9)
+        if len(self.buffer) >= self.max_buffer:
+            self.buffer.popleft()
+            USAGE_DROPPED.inc()
+        self.buffer.append(
+            {
+                "user_id": user_id,
+                "model": model,
+                "kind": kind,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_duration_ms": _ms(data.get("total_duration")),
+                "load_duration_ms": _ms(data.get("load_duration")),
+                "eval_duration_ms": _ms(eval_ns),
+                "occurred_at": datetime.utcnow(),
+            }
+        )
+        if self._wakeup is not None and len(self.buffer) >= settings.usage_flush_max_rows:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        rows = []
+        while self.buffer:
+            rows.append(self.buffer.popleft())
+        if not rows:
+            return 0
+        try:
+            await asyncio.to_thread(self._insert, rows)
+        except Exception as e:
+            logger.warning("usage.flush_failed", rows=len(rows), error=str(e))
+            USAGE_DROPPED.inc(len(rows))
+            return 0
+        return len(rows)
+
+    def _insert(self, rows: list[dict]) -> None:
+        db = SessionLocal()
+        try:
+            try:
+                db.execute(insert(models.OllamaUsage), rows)
+                db.commit()
+            except IntegrityError:
+                # A user was deleted after their call was recorded; keep the rows the
+                # way ON DELETE SET NULL would instead of losing the whole batch.
+                db.rollback()
+                user_ids = {row["user_id"] for row in rows if row["user_id"] is not None}
+                existing = set(db.scalars(select(models.User.id).where(models.User.id.in_(user_ids))))
+                for row in rows:
+                    if row["user_id"] not in existing:
+                        row["user_id"] = None
+                db.execute(insert(models.OllamaUsage), rows)
+                db.commit()
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.usage_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await self.flush()
+
+
+usage_writer = UsageWriter()
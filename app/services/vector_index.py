@@ -0,0 +1,301 @@
+import threading
+from datetime import datetime
+import numpy as np
+import structlog
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal
+from app.domain import models
+
+logger = structlog.get_logger()
+
+METRICS = ("cosine", "dot")
+DTYPES = ("float32", "float16", "int8")
+
+# Quantized rows are widened to float32 this many at a time during search.
+_BLOCK_ROWS = 65536
+_INSERT_CHUNK = 1000
+
+
+class VectorIndex:
+    """Contiguous in-memory matrix of one collection's vectors.
+
+    Rows are stored as float32, float16 or int8 (symmetric, one scale per row);
+    norms are kept in float32 so either metric can be served from the same rows.
+    """
+
+    def __init__(self, dim: int, metric: str = "cosine", dtype: str = "float32", version: int = 0):
+        self.dim = dim
+        self.metric = metric
+        self.dtype = dtype
+        self.version = version
+        self.ids: list[str] = []
+        self.rows: dict[str, int] = {}
+        self.metadata: list[dict | None] = []
+        self.matrix = np.empty((0, dim), dtype=np.dtype(dtype))
+        self.norms = np.empty(0, dtype=np.float32)
+        self.scales = np.empty(0, dtype=np.float32)
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _encode(self, vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            encoded = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+            return encoded, scales.astype(np.float32)
+        return vectors.astype(self.matrix.dtype, copy=False), np.ones(len(vectors), dtype=np.float32)
+
+    def _reserve(self, size: int) -> None:
+        capacity = self.matrix.shape[0]
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 16)
+        count = len(self.ids)
+        matrix = np.empty((capacity, self.dim), dtype=self.matrix.dtype)
+        matrix[:count] = self.matrix[:count]
+        norms = np.empty(capacity, dtype=np.float32)
+        norms[:count] = self.norms[:count]
+        scales = np.empty(capacity, dtype=np.float32)
+        scales[:count] = self.scales[:count]
+        self.matrix, self.norms, self.scales = matrix, norms, scales
+
+    def upsert(self, ids: list[str], vectors, metadata: list[dict | None] | None = None) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        metadata = metadata if metadata is not None else [None] * len(ids)
+        encoded, scales = self._encode(vectors)
+        norms = np.linalg.norm(vectors, axis=1)
+        with self.lock:
+            self._reserve(len(self.ids) + len(ids))
+            positions = np.empty(len(ids), dtype=np.intp)
+            for i, item_id in enumerate(ids):
+                row = self.rows.get(item_id)
+                if row is None:
+                    row = len(self.ids)
+                    self.rows[item_id] = row
+                    self.ids.append(item_id)
+                    self.metadata.append(metadata[i])
+                else:
+                    self.metadata[row] = metadata[i]
+                positions[i] = row
+            self.matrix[positions] = encoded
+            self.norms[positions] = norms
+            self.scales[positions] = scales
+
+    def delete(self, ids: list[str]) -> int:
+        removed = 0
+        with self.lock:
+            for item_id in ids:
+                row = self.rows.pop(item_id, None)
+                if row is None:
+                    continue
+                last = len(self.ids) - 1
+                if row != last:
+                    moved = self.ids[last]
+                    self.ids[row] = moved
+                    self.metadata[row] = self.metadata[last]
+                    self.matrix[row] = self.matrix[last]
+                    self.norms[row] = self.norms[last]
+                    self.scales[row] = self.scales[last]
+                    self.rows[moved] = row
+                self.ids.pop()
+                self.metadata.pop()
+                removed += 1
+        return removed
+
+    def search(self, queries, k: int = 10, metric: str | None = None) -> list[list[tuple[str, float, dict | None]]]:
+        metric = metric or self.metric
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if metric == "cosine":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        with self.lock:
+            count = len(self.ids)
+            if count == 0:
+                return [[] for _ in range(len(queries))]
+            if self.dtype == "float32":
+                scores = queries @ self.matrix[:count].T
+            else:
+                scores = np.empty((len(queries), count), dtype=np.float32)
+                for start in range(0, count, _BLOCK_ROWS):
+                    end = min(start + _BLOCK_ROWS, count)
+                    block = self.matrix[start:end].astype(np.float32)
+                    if self.dtype == "int8":
+                        block *= self.scales[start:end, None]
+                    scores[:, start:end] = queries @ block.T
+            if metric == "cosine":
+                scores /= np.maximum(self.norms[:count], 1e-12)
+            k = max(1, min(k, count))
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            return [
+                [(self.ids[row], float(score), self.metadata[row]) for row, score in zip(rows, row_scores)]
+                for rows, row_scores in zip(top.tolist(), top_scores.tolist())
+            ]
+
+
+class VectorStore:
+    """Per-process registry of collection indexes backed by the vector_* tables.
+
+    Each collection row carries a version bumped on every write. An index whose
+    version lags the database (for example after a write on another worker) is
+    rebuilt from Postgres on a background thread while requests keep using the
+    previous version; only a collection's first use waits for its load, and
+    concurrent first uses share one load.
+    """
+
+    def __init__(self):
+        self.indexes: dict[str, VectorIndex] = {}
+        self.lock = threading.Lock()
+        self.sources: dict[str, int] = {}
+        self.loading: dict[str, threading.Lock] = {}
+        self.reloading: set[str] = set()
+
+    def warm(self) -> None:
+        threading.Thread(target=self._warm, name="vector-warm", daemon=True).start()
+
+    def _warm(self) -> None:
+        try:
+            self.load_all()
+        except Exception as e:
+            # Collections are also loaded on first use, so a cold start can proceed.
+            logger.warning("vectors.preload_failed", error=str(e))
+
+    def load_all(self) -> None:
+        db = SessionLocal()
+        try:
+            for collection in db.query(models.VectorCollection).all():
+                self._load_once(db, collection)
+        finally:
+            db.close()
+
+    def _load(self, db: Session, collection: models.VectorCollection) -> VectorIndex:
+        index = VectorIndex(collection.dim, collection.metric, collection.dtype, collection.version)
+        rows = db.execute(
+            select(models.VectorItem.item_id, models.VectorItem.vector, models.VectorItem.meta).where(
+                models.VectorItem.collection_id == collection.id
+            )
+        ).all()
+        if rows:
+            vectors = np.frombuffer(b"".join(row.vector for row in rows), dtype="<f4").reshape(-1, collection.dim)
+            index.upsert([row.item_id for row in rows], vectors, [row.meta for row in rows])
+        with self.lock:
+            # A write applied in place while this load ran may already be newer.
+            current = self._cached(collection.name, collection.id, index.version)
+            if current is not None:
+                return current
+            self.indexes[collection.name] = index
+            self.sources[collection.name] = collection.id
+        return index
+
+    def _cached(self, name: str, collection_id: int, version: int) -> VectorIndex | None:
+        # An index left over from a dropped collection of the same name never counts.
+        index = self.indexes.get(name)
+        if index is None or self.sources.get(name) != collection_id or index.version < version:
+            return None
+        return index
+
+    def _load_once(self, db: Session, collection: models.VectorCollection) -> VectorIndex:
+        with self.lock:
+            loading = self.loading.setdefault(collection.name, threading.Lock())
+        with loading:
+            index = self._cached(collection.name, collection.id, collection.version)
+            if index is not None:
+                return index
+            return self._load(db, collection)
+
+    def _reload_in_background(self, name: str) -> None:
+        with self.lock:
+            if name in self.reloading:
+                return
+            self.reloading.add(name)
+        try:
+            threading.Thread(target=self._reload, args=(name,), name=f"vector-reload-{name}", daemon=True).start()
+        except BaseException:
+            with self.lock:
+                self.reloading.discard(name)
+            raise
+
+    def _reload(self, name: str) -> None:
+        db = SessionLocal()
+        try:
+            collection = db.query(models.VectorCollection).filter(models.VectorCollection.name == name).one_or_none()
+            if collection is None:
+                self.forget(name)
+            else:
+                self._load_once(db, collection)
+        except Exception as e:
+            logger.warning("vectors.reload_failed", collection=name, error=str(e))
+        finally:
+            db.close()
+            with self.lock:
+                self.reloading.discard(name)
+
+    def index_for(self, db: Session, collection: models.VectorCollection) -> VectorIndex:
+        index = self.indexes.get(collection.name)
+        if index is None or self.sources.get(collection.name) != collection.id:
+            return self._load_once(db, collection)
+        if index.version < collection.version:
+            self._reload_in_background(collection.name)
+        return index
+
+    def forget(self, name: str) -> None:
+        with self.lock:
+            self.indexes.pop(name, None)
+            self.sources.pop(name, None)
+            self.loading.pop(name, None)
+
+    def upsert(self, db: Session, collection: models.VectorCollection, ids: list[str], vectors: np.ndarray, metadata: list[dict | None]) -> None:
+        now = datetime.utcnow()
+        rows = [
+            {"collection_id": collection.id, "item_id": item_id, "vector": vector.astype("<f4").tobytes(), "metadata": meta, "updated_at": now}
+            for item_id, vector, meta in zip(ids, vectors, metadata)
+        ]
+        table = models.VectorItem.__table__
+        for start in range(0, len(rows), _INSERT_CHUNK):
+            stmt = insert(table).values(rows[start : start + _INSERT_CHUNK])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.collection_id, table.c.item_id],
+                set_={"vector": stmt.excluded.vector, "metadata": stmt.excluded.metadata, "updated_at": stmt.excluded.updated_at},
+            )
+            db.execute(stmt)
+        version = self._bump(db, collection)
+        db.commit()
+        index = self._cached(collection.name, collection.id, version - 1)
+        if index is not None and index.version == version - 1:
+            index.upsert(ids, vectors, metadata)
+            index.version = version
+        elif collection.name in self.indexes:
+            self._reload_in_background(collection.name)
+
+    def delete(self, db: Session, collection: models.VectorCollection, ids: list[str]) -> int:
+        removed = (
+            db.query(models.VectorItem)
+            .filter(models.VectorItem.collection_id == collection.id, models.VectorItem.item_id.in_(ids))
+            .delete(synchronize_session=False)
+        )
+        version = self._bump(db, collection)
+        db.commit()
+        index = self._cached(collection.name, collection.id, version - 1)
+        if index is not None and index.version == version - 1:
+            index.delete(ids)
+            index.version = version
+        elif collection.name in self.indexes:
+            self._reload_in_background(collection.name)
+        return removed
+
+    def _bump(self, db: Session, collection: models.VectorCollection) -> int:
+        return db.execute(
+            update(models.VectorCollection)
+            .where(models.VectorCollection.id == collection.id)
+            .values(version=models.VectorCollection.version + 1)
+            .returning(models.VectorCollection.version)
+        ).scalar_one()
+
+
+vector_store = VectorStore()
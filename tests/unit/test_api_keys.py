@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+from argon2 import PasswordHasher
+from app.services import api_keys as module
+from app.services.api_keys import ApiKeyCache, authenticate_api_key
+from app.services.credential_service import format_api_key, parse_api_key
+from app.services.principal_cache import Principal
+
+
+def test_key_format_round_trips_secrets_containing_separators():
+    key = format_api_key(42, "a_b-c_d")
+    assert key == "ks_42_a_b-c_d"
+    assert parse_api_key(key) == (42, "a_b-c_d")
+    assert parse_api_key("ks_x_secret") is None
+    assert parse_api_key("ks_42_") is None
+    assert parse_api_key("eyJhbGciOi.payload.sig") is None
+
+
+def test_cache_expires_and_invalidates(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(module, "monotonic", lambda: now[0])
+    cache = ApiKeyCache(ttl=60, max_entries=10)
+    cache.put(1, cache.digest("s1"), Principal(10, True, []), 3600)
+    cache.put(2, cache.digest("s2"), Principal(10, True, []), 5)
+    cache.put(3, cache.digest("s3"), Principal(20, True, []), 3600)
+    now[0] = 10
+    assert cache.get(2) is None
+    assert cache.get(1)[0] == cache.digest("s1")
+    cache.invalidate_credential(1)
+    assert cache.get(1) is None
+    cache.invalidate_user(20)
+    assert cache.get(3) is None
+
+
+def test_argon2_runs_only_on_first_verification(monkeypatch):
+    hasher = PasswordHasher()
+    user = SimpleNamespace(id=7, is_active=True, roles=[SimpleNamespace(name="admin")])
+    cred = SimpleNamespace(hash=hasher.hash("secret"), expires_at=None, user=user)
+    loads, verifies = [], []
+    monkeypatch.setattr(module, "_load_credential", lambda db, credential_id: loads.append(credential_id) or cred)
+    monkeypatch.setattr(module, "api_key_cache", ApiKeyCache(ttl=60, max_entries=10))
+
+    class CountingPool:
+        def verify(self, hashed, secret):
+            verifies.append(secret)
+            return secret == "secret" and hasher.verify(hashed, secret)
+
+    monkeypatch.setattr(module, "hashing_pool", CountingPool())
+    principal = authenticate_api_key(None, "ks_5_secret")
+    assert principal.id == 7 and principal.roles == ["admin"]
+    assert authenticate_api_key(None, "ks_5_secret").id == 7
+    assert authenticate_api_key(None, "ks_5_wrong") is None
+    assert loads == [5] and verifies == ["secret"]
+    assert authenticate_api_key(None, "ks_6_wrong") is None
+    assert verifies == ["secret", "wrong"]
@@ -0,0 +1,55 @@
+import asyncio
+from app.services import chat_cache as module
+from app.services.chat_cache import chat_cache_key, is_cacheable, is_deterministic
+from app.services.ttl_cache import AsyncTTLCache
+
+
+def test_key_ignores_implicit_tag_and_option_order():
+    assert chat_cache_key("llama3.2", "hi", {"seed": 1, "temperature": 0}) == chat_cache_key("llama3.2:latest", "hi", {"temperature": 0, "seed": 1})
+    assert chat_cache_key("llama3.2", "hi") != chat_cache_key("llama3.2", "hi ")
+
+
+def test_only_deterministic_requests_are_cacheable(monkeypatch):
+    assert is_deterministic({"temperature": 0}) and is_deterministic({"seed": 7})
+    assert not is_deterministic(None) and not is_deterministic({"temperature": 0.7})
+    monkeypatch.setattr(module.settings, "ollama_chat_cache_enabled", False)
+    assert not is_cacheable({"temperature": 0})
+    monkeypatch.setattr(module.settings, "ollama_chat_cache_enabled", True)
+    assert is_cacheable({"temperature": 0}) and not is_cacheable({"temperature": 1})
+
+
+def test_identical_requests_share_a_generation_but_only_cacheable_ones_are_kept():
+    cache = AsyncTTLCache("chat_test", ttl=60)
+    generations = []
+
+    async def generate():
+        generations.append(1)
+        await asyncio.sleep(0.01)
+        return f"reply {len(generations)}"
+
+    async def run(store):
+        return await asyncio.gather(*(cache.get_or_load("k", generate, store=store) for _ in range(5)))
+
+    assert asyncio.run(run(False)) == ["reply 1"] * 5
+    assert cache.peek("k") is None
+    assert asyncio.run(run(False)) == ["reply 2"] * 5
+    assert asyncio.run(run(True)) == ["reply 3"] * 5
+    assert cache.peek("k") == "reply 3"
+    assert asyncio.run(run(True)) == ["reply 3"] * 5 and len(generations) == 3
+
+
+def test_failed_generation_is_shared_but_not_cached():
+    cache = AsyncTTLCache("chat_test", ttl=60)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model crashed")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("k", generate) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1 and all(isinstance(r, RuntimeError) for r in results)
+    assert cache.peek("k") is None and not cache.inflight
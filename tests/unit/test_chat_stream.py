@@ -0,0 +1,75 @@
+import json
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.deps import get_current_principal
+from app.api.routes import ollama as routes
+from app.db.session import get_db
+from app.services.principal_cache import Principal
+from app.services.scheduler import AdmissionRejected
+
+
+def _client(monkeypatch, chunks, fail_at=None, error=None):
+    class FakeOllama:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def chat_stream(self, model, prompt, options=None):
+            for i, chunk in enumerate(chunks):
+                if i == fail_at:
+                    raise error
+                yield chunk
+            if fail_at == len(chunks):
+                raise error
+
+    monkeypatch.setattr(routes, "OllamaClient", FakeOllama)
+    monkeypatch.setattr(routes.usage_writer, "record", lambda *args: None)
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/ollama")
+    app.dependency_overrides[get_current_principal] = lambda: (Principal(1, True, []), None)
+    app.dependency_overrides[get_db] = lambda: None
+    return TestClient(app)
+
+
+CHUNKS = [{"response": "Hel", "done": False}, {"response": "lo", "done": False}, {"response": "", "done": True, "eval_count": 2}]
+
+
+def test_chunks_are_framed_as_sse_or_ndjson(monkeypatch):
+    client = _client(monkeypatch, CHUNKS)
+    r = client.post("/ollama/chat", json={"model": "m", "prompt": "hi"}, headers={"Accept": "text/event-stream"})
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/event-stream")
+    events = r.text.split("\n\n")[:-1]
+    assert events[0] == 'data: {"response":"Hel","done":false}'
+    assert events[2].startswith("event: done\ndata: ") and json.loads(events[2].split("data: ", 1)[1])["eval_count"] == 2
+
+    r = client.post("/ollama/chat", json={"model": "m", "prompt": "hi"}, headers={"Accept": "application/x-ndjson"})
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in r.text.splitlines()] == CHUNKS
+    assert routes.scheduler.lanes == {}
+
+
+@pytest.mark.parametrize(
+    "error, status",
+    [
+        (httpx.ConnectError("refused", request=httpx.Request("POST", "http://a")), 502),
+        (RuntimeError("model 'm' not found"), 502),
+        (AdmissionRejected("busy", 3), 503),
+    ],
+)
+def test_error_before_the_first_chunk_is_an_http_error(monkeypatch, error, status):
+    client = _client(monkeypatch, CHUNKS, fail_at=0, error=error)
+    r = client.post("/ollama/chat", json={"model": "m", "prompt": "hi"}, headers={"Accept": "application/x-ndjson"})
+    assert r.status_code == status
+    if status == 503:
+        assert r.headers["Retry-After"] == "3"
+
+
+def test_error_after_the_first_chunk_is_reported_in_band(monkeypatch):
+    client = _client(monkeypatch, CHUNKS[:1], fail_at=1, error=RuntimeError("backend went away"))
+    r = client.post("/ollama/chat", json={"model": "m", "prompt": "hi"}, headers={"Accept": "text/event-stream"})
+    assert r.status_code == 200
+    events = r.text.split("\n\n")[:-1]
+    assert len(events) == 2 and events[1].startswith("event: error\n")
+    assert json.loads(events[1].split("data: ", 1)[1]) == {"error": "Ollama error: backend went away", "done": True}
+    assert routes.scheduler.lanes == {}
@@ -0,0 +1,69 @@
+import asyncio
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.base import Base
+from app.domain import models
+from app.services import conversations
+from app.services.conversations import ConversationService, plan_context, turn_lock
+
+
+def test_plan_context_keeps_everything_within_budget():
+    assert plan_context([10, 10, 10], 30) == 0
+
+
+def test_plan_context_drops_oldest_to_low_watermark_on_overflow():
+    # 50 tokens over a 40 budget: trim to <= 30, which drops the first two messages.
+    assert plan_context([10, 10, 10, 10, 10], 40) == 2
+
+
+def test_plan_context_prefix_is_stable_after_trim():
+    start = plan_context([10, 10, 10, 10, 10], 40)
+    # The next turn still fits, so the same prefix (and the backend's KV cache) is reused.
+    assert start + plan_context([10, 10, 10, 10, 10][start:] + [5], 40) == start
+
+
+def test_plan_context_always_keeps_the_last_message():
+    assert plan_context([10, 100], 50) == 1
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[models.Conversation.__table__, models.ConversationMessage.__table__])
+    return sessionmaker(bind=engine)()
+
+
+def test_turns_append_and_trim_the_context_window(monkeypatch):
+    monkeypatch.setattr(conversations.settings, "conversation_context_tokens", 60)
+    monkeypatch.setattr(conversations.settings, "conversation_reply_reserve_tokens", 20)
+    db = _session()
+    svc = ConversationService(db)
+    conversation = svc.create(1, "llama3.2", system=None)
+    for turn in range(3):
+        messages, start_id, user_tokens = svc.prepare_turn(conversation, "q" * 40)
+        svc.record_turn(conversation, "q" * 40, user_tokens, f"reply {turn}", 10, start_id, "http://a")
+    # Turn 2 already trimmed turn 0. Turns 1 and 2 (40 tokens) plus the new question overflow the
+    # 40-token budget, so the window is cut to <= 30 tokens, starting at turn 2.
+    messages, start_id, _ = svc.prepare_turn(conversation, "next question")
+    history = db.query(models.ConversationMessage).order_by(models.ConversationMessage.id).all()
+    assert len(history) == 6
+    assert start_id == history[4].id
+    assert messages == [{"role": "user", "content": "q" * 40}, {"role": "assistant", "content": "reply 2"}, {"role": "user", "content": "next question"}]
+    assert conversation.context_start_id <= start_id and conversation.backend_url == "http://a"
+    assert svc.get(2, conversation.id) is None
+
+
+def test_turn_lock_serializes_one_conversation_only():
+    order = []
+
+    async def turn(conversation_id, name):
+        async with turn_lock(conversation_id):
+            order.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} end")
+
+    async def run():
+        await asyncio.gather(turn(1, "a"), turn(1, "b"), turn(2, "c"))
+
+    asyncio.run(run())
+    assert order.index("a end") < order.index("b start")
+    assert order.index("c start") < order.index("a end")
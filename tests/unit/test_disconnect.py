@@ -0,0 +1,72 @@
+import asyncio
+import json
+from prometheus_client import REGISTRY
+from app.api.deps import get_current_principal
+from app.api.routes import ollama as routes
+from app.db.session import get_db
+from app.main import app
+from app.services.principal_cache import Principal
+
+
+def _cancelled(endpoint: str) -> float:
+    return REGISTRY.get_sample_value("ollama_requests_cancelled_total", {"endpoint": endpoint}) or 0.0
+
+
+def test_client_disconnect_cancels_generation_through_the_full_app(monkeypatch):
+    monkeypatch.setattr(routes.settings, "semantic_cache_enabled", False)
+    monkeypatch.setattr(routes.settings, "ollama_disconnect_poll_interval", 0.01)
+    monkeypatch.setitem(app.dependency_overrides, get_current_principal, lambda: (Principal(1, True, []), None))
+    monkeypatch.setitem(app.dependency_overrides, get_db, lambda: None)
+    generation = {}
+
+    async def slow_generate(user_id, payload):
+        generation["started"] = True
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            generation["cancelled"] = True
+            raise
+        return "never"
+
+    monkeypatch.setattr(routes, "_generate", slow_generate)
+    body = json.dumps({"model": "m", "prompt": "hi"}).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/ollama/chat",
+        "raw_path": b"/ollama/chat",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    sent = []
+
+    async def run():
+        # Like a server, messages are queued and receive() returns as soon as one is available.
+        messages = asyncio.Queue()
+        messages.put_nowait({"type": "http.request", "body": body, "more_body": False})
+
+        async def disconnect():
+            while not generation.get("started"):
+                await asyncio.sleep(0.005)
+            messages.put_nowait({"type": "http.disconnect"})
+
+        async def send(message):
+            sent.append(message)
+
+        client = asyncio.ensure_future(disconnect())
+        await asyncio.wait_for(app(scope, messages.get, send), 3)
+        await client
+
+    before = _cancelled("chat")
+    asyncio.run(run())
+    assert generation.get("cancelled")
+    assert _cancelled("chat") - before == 1
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    assert start["status"] == 499
+    assert (b"x-content-type-options", b"nosniff") in start["headers"]
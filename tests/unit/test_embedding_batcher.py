@@ -0,0 +1,55 @@
+import asyncio
+import numpy as np
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+class RecordingClient:
+    calls: list[list[str]] = []
+
+    async def embed_arrays(self, model: str, inputs: list[str]) -> list[np.ndarray]:
+        RecordingClient.calls.append(list(inputs))
+        return [np.array([len(text)], dtype=np.float32) for text in inputs]
+
+
+def test_concurrent_requests_share_one_upstream_call():
+    RecordingClient.calls = []
+    batcher = EmbeddingBatcher(window_ms=5, max_items=10, client_factory=RecordingClient)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed("m", "x" * n) for n in range(1, 5)))
+
+    vectors = asyncio.run(run())
+    assert vectors == [[1.0], [2.0], [3.0], [4.0]]
+    assert RecordingClient.calls == [["x", "xx", "xxx", "xxxx"]]
+
+
+def test_batch_flushes_at_max_items():
+    RecordingClient.calls = []
+    batcher = EmbeddingBatcher(window_ms=1000, max_items=2, client_factory=RecordingClient)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed("m", t) for t in ["a", "b", "c", "d"]))
+
+    asyncio.run(asyncio.wait_for(run(), timeout=0.5))
+    assert RecordingClient.calls == [["a", "b"], ["c", "d"]]
+
+
+def test_batch_takes_one_admission_slot_for_all_callers(monkeypatch):
+    from app.services import embedding_batcher as module
+
+    admitted, real = [], module.scheduler
+
+    class CountingScheduler:
+        def admit(self, user_id, model):
+            admitted.append((user_id, model))
+            return real.admit(user_id, model)
+
+    monkeypatch.setattr(module, "scheduler", CountingScheduler())
+    RecordingClient.calls = []
+    batcher = EmbeddingBatcher(window_ms=5, max_items=10, client_factory=RecordingClient)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed("m", t) for t in ["a", "b", "c"]))
+
+    asyncio.run(run())
+    assert admitted == [(None, "m")]
@@ -0,0 +1,24 @@
+import asyncio
+import numpy as np
+from app.services.embedding_cache import EmbeddingCache
+
+
+def test_lru_evicts_least_recently_used_within_byte_budget():
+    vector = np.ones(64, dtype=np.float32)
+    cache = EmbeddingCache(max_bytes=3 * (vector.nbytes + 200), persistent=False)
+    for text in ["a", "b", "c"]:
+        cache.put_memory(cache.key("m", text), vector)
+    assert cache.get_memory("m", "a") is not None
+    cache.put_memory(cache.key("m", "d"), vector)
+    assert cache.get_memory("m", "b") is None
+    assert cache.get_memory("m", "a") is not None
+    assert cache.size <= cache.max_bytes
+
+
+def test_keys_are_scoped_by_model():
+    cache = EmbeddingCache(max_bytes=1 << 20, persistent=False)
+    cache.put_many("m1", ["text"], [np.array([1.0, 2.0], dtype=np.float32)])
+    found = asyncio.run(cache.get_many("m2", ["text"]))
+    assert found == [None]
+    found = asyncio.run(cache.get_many("m1", ["text"]))
+    assert found[0].dtype == np.float32 and found[0].tolist() == [1.0, 2.0]
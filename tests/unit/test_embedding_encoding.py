@@ -0,0 +1,34 @@
+import base64
+import numpy as np
+import pytest
+from pydantic import ValidationError
+from app.api.routes.ollama import EmbeddingsRequest, _encode_embedding, _pack_embeddings, _raw_embeddings_response
+
+
+def test_pack_embeddings_is_little_endian_in_requested_dtype():
+    vectors = np.array([[1.0, -2.5], [0.5, 3.0]], dtype=np.float32)
+    assert np.frombuffer(_pack_embeddings(vectors, "float32"), dtype="<f4").tolist() == [1.0, -2.5, 0.5, 3.0]
+    assert np.frombuffer(_pack_embeddings(vectors, "float16"), dtype="<f2").tolist() == [1.0, -2.5, 0.5, 3.0]
+
+
+def test_base64_encoding_round_trips():
+    vector = np.array([0.25, -1.0, 2.0], dtype=np.float32)
+    payload = EmbeddingsRequest(model="m", input="x", encoding_format="base64", dtype="float16")
+    encoded = _encode_embedding(vector, payload)
+    assert np.frombuffer(base64.b64decode(encoded), dtype="<f2").tolist() == [0.25, -1.0, 2.0]
+    assert _encode_embedding(vector, EmbeddingsRequest(model="m", input="x")) == [0.25, -1.0, 2.0]
+
+
+def test_raw_response_describes_the_matrix():
+    response = _raw_embeddings_response([np.zeros(4, dtype=np.float32)] * 3, "float32")
+    assert response.media_type == "application/octet-stream"
+    assert response.headers["X-Embedding-Count"] == "3" and response.headers["X-Embedding-Dim"] == "4"
+    assert len(response.body) == 3 * 4 * 4
+
+
+def test_empty_input_is_rejected_before_reaching_ollama():
+    with pytest.raises(ValidationError):
+        EmbeddingsRequest(model="m", input=[])
+    with pytest.raises(ValidationError):
+        EmbeddingsRequest(model="m", input="")
+    assert EmbeddingsRequest(model="m", input=["x"]).input == ["x"]
@@ -0,0 +1,63 @@
+import threading
+import time
+import pytest
+from argon2 import PasswordHasher
+from app.services import hashing as module
+from app.services.hashing import HashingBusy, HashingPool
+
+
+def test_verify_and_hash_run_on_the_pool():
+    pool = HashingPool(workers=2, max_queue=2, timeout=5)
+    hashed = pool.hash("s3cret")
+    assert pool.verify(hashed, "s3cret")
+    assert not pool.verify(hashed, "wrong")
+    assert not pool.verify("not-a-hash", "s3cret")
+
+
+def test_full_queue_rejects_without_running():
+    pool = HashingPool(workers=1, max_queue=1, timeout=5)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocked():
+        started.set()
+        release.wait()
+        return "done"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.run("verify", blocked))) for _ in range(2)]
+    for t in threads:
+        t.start()
+    started.wait()
+    while pool.slots._value:
+        time.sleep(0.001)
+    with pytest.raises(HashingBusy):
+        pool.run("verify", lambda: "never")
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == ["done", "done"]
+    assert pool.run("verify", lambda: "again") == "again"
+
+
+def test_slow_operation_times_out_and_frees_its_slot_later():
+    pool = HashingPool(workers=1, max_queue=0, timeout=0.05)
+    release = threading.Event()
+    with pytest.raises(HashingBusy):
+        pool.run("hash", release.wait)
+    release.set()
+    pool.executor.submit(lambda: None).result()
+    assert pool.run("hash", lambda: 1) == 1
+
+
+def test_needs_rehash_follows_configured_parameters(monkeypatch):
+    weak = PasswordHasher(time_cost=1, memory_cost=8, parallelism=1).hash("pw")
+    monkeypatch.setattr(module, "ph", PasswordHasher(time_cost=2, memory_cost=16, parallelism=1))
+    assert HashingPool.needs_rehash(weak)
+    assert not HashingPool.needs_rehash(module.ph.hash("pw"))
+    assert not HashingPool.needs_rehash("not-a-hash")
+
+
+def test_pending_operations_leave_request_threads_free():
+    pool = HashingPool(workers=8, max_queue=1000, timeout=5)
+    assert pool.slots._value == module.REQUEST_THREADS // 2
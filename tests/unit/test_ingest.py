@@ -0,0 +1,103 @@
+import asyncio
+import contextlib
+import json
+from datetime import datetime
+import httpx
+import numpy as np
+from app.domain import models
+from app.services import ingest
+from app.services.ingest import IngestRunner, read_batches
+
+
+def _write(tmp_path, lines):
+    path = tmp_path / "upload.jsonl"
+    path.write_bytes(b"".join((json.dumps(line) if isinstance(line, dict) else line).encode() + b"\n" for line in lines))
+    return str(path)
+
+
+def test_read_batches_parses_dedupes_and_tracks_offsets(tmp_path):
+    path = _write(tmp_path, [{"id": "a", "text": "one"}, "not json", {"id": "a", "text": "uno"}, {"text": "two"}, {"id": "c", "text": "three"}])
+    batches = list(read_batches(path, 0, batch_size=2))
+    assert [b.ids for b in batches] == [["a", batches[0].ids[1]], ["c"]]
+    assert batches[0].texts == ["uno", "two"]
+    assert batches[0].invalid == 1 and batches[0].deduped == 1
+    assert batches[1].start_offset == batches[0].end_offset
+    # Resuming from a checkpoint yields exactly the remaining batches, with the same ids.
+    resumed = list(read_batches(path, batches[0].end_offset, batch_size=2))
+    assert [b.ids for b in resumed] == [["c"]]
+
+
+def test_run_persists_batches_in_order_with_checkpoints(tmp_path, monkeypatch):
+    path = _write(tmp_path, [{"id": str(i), "text": f"text {i}"} for i in range(7)])
+    monkeypatch.setattr(ingest.settings, "ollama_embed_batch_size", 2)
+    monkeypatch.setattr(ingest.settings, "ingest_concurrency", 2)
+    runner = IngestRunner()
+    persisted = []
+
+    async def embed(job, dim, batch):
+        # Later batches finish first; persistence must still follow input order.
+        await asyncio.sleep(0.01 * (10 - len(persisted) - int(batch.ids[0])))
+        return np.zeros((len(batch.ids), dim), dtype=np.float32)
+
+    monkeypatch.setattr(runner, "_embed", embed)
+    monkeypatch.setattr(runner, "_collection_dim", lambda collection_id: 3)
+    monkeypatch.setattr(runner, "_persist", lambda job, batch, vectors: persisted.append((batch.ids, batch.end_offset)))
+    job = models.IngestJob(id="j", collection_id=1, model="nomic-embed-text", spool_path=path, bytes_done=0, created_at=datetime.utcnow())
+    asyncio.run(runner.run(job))
+    assert [ids for ids, _ in persisted] == [["0", "1"], ["2", "3"], ["4", "5"], ["6"]]
+    offsets = [offset for _, offset in persisted]
+    assert offsets == sorted(offsets)
+
+
+def test_heartbeat_is_refreshed_while_a_batch_waits(monkeypatch):
+    monkeypatch.setattr(ingest.settings, "ingest_stale_seconds", 0.03)
+    runner = IngestRunner()
+    beats, finished = [], []
+
+    async def slow_run(job):
+        await asyncio.sleep(0.1)
+
+    monkeypatch.setattr(runner, "run", slow_run)
+    monkeypatch.setattr(runner, "_heartbeat", beats.append)
+    monkeypatch.setattr(runner, "_finish", lambda job_id, status, error=None: finished.append(status))
+    job = models.IngestJob(id="j", collection_id=1, model="m", spool_path="/nonexistent/spool.jsonl")
+    asyncio.run(runner._execute(job))
+    assert len(beats) >= 3 and set(beats) == {"j"}
+    assert finished == ["succeeded"]
+
+
+def test_embed_retries_transient_failures_and_fails_only_rejected_batches(monkeypatch):
+    monkeypatch.setattr(ingest.settings, "ingest_retry_max_delay", 0.01)
+    request = httpx.Request("POST", "http://ollama/api/embed")
+    outcomes = [
+        httpx.ConnectError("refused", request=request),
+        httpx.HTTPStatusError("busy", request=request, response=httpx.Response(503, request=request)),
+        None,
+        httpx.HTTPStatusError("bad", request=request, response=httpx.Response(400, request=request)),
+    ]
+    calls = []
+
+    class FakeScheduler:
+        @contextlib.asynccontextmanager
+        async def admit(self, user_id, model):
+            yield
+
+    async def embed_arrays(self, model, texts):
+        calls.append(texts)
+        outcome = outcomes.pop(0)
+        if outcome is not None:
+            raise outcome
+        return [np.ones(3, dtype=np.float32) for _ in texts]
+
+    monkeypatch.setattr(ingest, "scheduler", FakeScheduler())
+    monkeypatch.setattr(ingest.OllamaClient, "embed_arrays", embed_arrays)
+    runner = IngestRunner()
+    job = models.IngestJob(id="j", collection_id=1, model="m", spool_path="/nonexistent/spool.jsonl")
+    batch = ingest.Batch(0)
+    batch.ids, batch.texts, batch.metadata = ["a", "b"], ["one", "two"], [None, None]
+    # The connection error and the 503 are retried; the batch is not given up on.
+    vectors = asyncio.run(runner._embed(job, 3, batch))
+    assert vectors.shape == (2, 3) and len(calls) == 3
+    # A 4xx means Ollama rejected the input itself: the items are counted as failed.
+    assert asyncio.run(runner._embed(job, 3, batch)) is None
+    assert len(calls) == 4
@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+from sqlalchemy.orm import Session
+from app.services.invalidation import InvalidationBus
+
+
+class RecordingSession(Session):
+    def __init__(self):
+        super().__init__()
+        self.statements = []
+
+    def execute(self, statement, params=None, **kwargs):
+        self.statements.append((str(statement), params))
+
+
+class FakeConnection:
+    def __init__(self, payloads):
+        self.notifies = [SimpleNamespace(payload=p) for p in payloads]
+
+    def poll(self):
+        pass
+
+
+def test_publish_evicts_locally_before_and_after_commit_and_notifies():
+    bus = InvalidationBus("test_channel")
+    evicted = []
+    bus.subscribe("user", evicted.append)
+    db = RecordingSession()
+    bus.publish(db, "user", 7)
+    assert evicted == ["7"]
+    assert db.statements == [("SELECT pg_notify(:channel, :payload)", {"channel": "test_channel", "payload": "user:7"})]
+    db.commit()
+    db.commit()
+    assert evicted == ["7", "7"]
+
+
+def test_received_messages_are_dispatched_by_kind():
+    bus = InvalidationBus("test_channel")
+    users, credentials = [], []
+    bus.subscribe("user", users.append)
+    bus.subscribe("credential", credentials.append)
+    bus._drain(FakeConnection(["user:1", "credential:9", "unknown:3", "user:2"]), asyncio.Event())
+    assert users == ["1", "2"]
+    assert credentials == ["9"]
+
+
+def test_failing_handler_does_not_block_others_and_flush_clears_all():
+    bus = InvalidationBus("test_channel")
+    seen, flushed = [], []
+
+    def broken(key):
+        raise RuntimeError("boom")
+
+    bus.subscribe("user", broken, lambda: flushed.append("a"))
+    bus.subscribe("user", seen.append, lambda: flushed.append("b"))
+    bus.dispatch("user", "5")
+    bus.flush()
+    assert seen == ["5"]
+    assert flushed == ["a", "b"]
+
+
+def test_lost_connection_signals_listener():
+    class BrokenConnection(FakeConnection):
+        def poll(self):
+            raise OSError("server closed the connection")
+
+    bus = InvalidationBus("test_channel")
+    lost = asyncio.Event()
+    bus._drain(BrokenConnection([]), lost)
+    assert lost.is_set()
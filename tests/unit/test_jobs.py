@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime
+from app.domain import models
+from app.services import jobs
+from app.services.jobs import JobRunner
+from app.services.scheduler import AdmissionRejected
+
+
+def _job():
+    now = datetime.utcnow()
+    return models.GenerationJob(id="j1", user_id=1, model="llama3.2", prompt="hi", options=None, status="running", created_at=now, started_at=now)
+
+
+def _runner(monkeypatch, generate):
+    runner = JobRunner(workers=1)
+    calls = []
+    monkeypatch.setattr(runner, "_finish", lambda *args: calls.append(("finish", *args)))
+    monkeypatch.setattr(runner, "_requeue", lambda ids, refund=False: calls.append(("requeue", ids, refund)))
+    monkeypatch.setattr(jobs.settings, "jobs_poll_interval", 0)
+
+    class FakeClient:
+        async def generate(self, *args, **kwargs):
+            return await generate()
+
+    monkeypatch.setattr(jobs, "OllamaClient", FakeClient)
+    return runner, calls
+
+
+def test_successful_job_stores_the_response(monkeypatch):
+    async def generate():
+        return {"response": "hello", "eval_count": 1}
+
+    runner, calls = _runner(monkeypatch, generate)
+    asyncio.run(runner._run(_job()))
+    assert calls == [("finish", "j1", "succeeded", "hello", None)]
+
+
+def test_admission_rejection_requeues_instead_of_failing(monkeypatch):
+    async def generate():
+        raise AdmissionRejected("busy", 1)
+
+    runner, calls = _runner(monkeypatch, generate)
+    asyncio.run(runner._run(_job()))
+    assert calls == [("requeue", ["j1"], True)]
+
+
+def test_upstream_error_fails_the_job(monkeypatch):
+    async def generate():
+        raise RuntimeError("model not found")
+
+    runner, calls = _runner(monkeypatch, generate)
+    asyncio.run(runner._run(_job()))
+    assert calls == [("finish", "j1", "failed", None, "Ollama error: model not found")]
@@ -0,0 +1,75 @@
+from app.services import login_shedder as module
+from app.services.login_shedder import CountMinSketch, LoginShedder, NegativeCache
+
+
+def test_sketch_never_undercounts_and_memory_is_fixed():
+    sketch = CountMinSketch(width=64, depth=4, window=60)
+    for i in range(500):
+        sketch.add(f"ip:10.0.{i}.1")
+    for _ in range(7):
+        sketch.add("user:victim@example.com")
+    assert sketch.estimate("user:victim@example.com") >= 7
+    assert sketch.current.nbytes == 64 * 4 * 4
+
+
+def test_sketch_counts_fade_out_after_the_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(module, "monotonic", lambda: now[0])
+    sketch = CountMinSketch(width=1024, depth=4, window=60)
+    for _ in range(10):
+        sketch.add("ip:1.2.3.4")
+    now[0] += 90
+    assert 4 <= sketch.estimate("ip:1.2.3.4") <= 6
+    now[0] += 60
+    assert sketch.estimate("ip:1.2.3.4") == 0
+
+
+def test_negative_cache_expires_and_forgets(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(module, "monotonic", lambda: now[0])
+    cache = NegativeCache(slots=1, ttl=30)
+    cache.add("ghost@example.com")
+    assert "ghost@example.com" in cache
+    assert "other@example.com" not in cache
+    cache.discard("ghost@example.com")
+    assert "ghost@example.com" not in cache
+    cache.add("ghost@example.com")
+    now[0] = 31
+    assert "ghost@example.com" not in cache
+
+
+def test_shedder_limits_by_username_ip_and_subnet(monkeypatch):
+    monkeypatch.setattr(module.settings, "login_shed_user_failures", 3)
+    monkeypatch.setattr(module.settings, "login_shed_ip_failures", 5)
+    monkeypatch.setattr(module.settings, "login_shed_subnet_failures", 8)
+    shedder = LoginShedder()
+    for i in range(3):
+        assert shedder.check(f"198.51.100.{i}", "Victim@example.com") is None
+        shedder.record_failure(f"198.51.100.{i}", "Victim@example.com")
+    assert shedder.check("198.51.100.7", "victim@example.com") == "user"
+    for i in range(5):
+        shedder.record_failure("192.0.2.1", f"user{i}@example.com")
+    assert shedder.check("192.0.2.1", "fresh@example.com") == "ip"
+    for i in range(3):
+        shedder.record_failure(f"192.0.2.{10 + i}", f"other{i}@example.com")
+    assert shedder.check("192.0.2.200", "fresh@example.com") == "subnet"
+    assert shedder.check("2001:db8::1", "fresh@example.com") is None
+
+
+def test_username_limit_does_not_lock_out_a_clean_ip(monkeypatch):
+    monkeypatch.setattr(module.settings, "login_shed_user_failures", 3)
+    shedder = LoginShedder()
+    for i in range(10):
+        shedder.record_failure(f"198.51.100.{i}", "victim@example.com")
+    # The owner logging in from an address with no failures is still let through.
+    assert shedder.check("203.0.113.9", "victim@example.com") is None
+    shedder.record_failure("203.0.113.9", "victim@example.com")
+    assert shedder.check("203.0.113.9", "victim@example.com") == "user"
+
+
+def test_unknown_emails_are_answered_from_the_negative_cache():
+    shedder = LoginShedder()
+    shedder.record_failure("192.0.2.1", "ghost@example.com", unknown_email=True)
+    assert shedder.check("192.0.2.2", "ghost@example.com") == "unknown_email"
+    shedder.forget_email("ghost@example.com")
+    assert shedder.check("192.0.2.2", "ghost@example.com") is None
@@ -0,0 +1,39 @@
+import asyncio
+from app.services import ollama_client
+from app.services.model_keeper import ModelKeeper
+from app.services.ollama_pool import ollama_pool
+
+
+def test_keeper_becomes_ready_after_first_round_even_if_a_load_fails():
+    loaded = []
+
+    async def load(url, model):
+        if model == "broken":
+            raise RuntimeError("model not found")
+        loaded.append((url, model))
+
+    async def scenario():
+        keeper = ModelKeeper(["llama3.2", "broken"], interval=60, load=load)
+        assert keeper.ready is False
+        keeper.start()
+        for _ in range(50):
+            if keeper.ready:
+                break
+            await asyncio.sleep(0.01)
+        await keeper.stop()
+        return keeper
+
+    keeper = asyncio.run(scenario())
+    assert keeper.ready is True
+    assert loaded == [(b.url, "llama3.2") for b in ollama_pool.backends]
+
+
+def test_keeper_without_models_is_ready_immediately():
+    assert ModelKeeper([], interval=60).ready is True
+
+
+def test_keep_alive_for_prefers_per_model_policy(monkeypatch):
+    monkeypatch.setattr(ollama_client, "_MODEL_KEEP_ALIVE", {"llama3.2:latest": -1})
+    monkeypatch.setattr(ollama_client.settings, "ollama_keep_alive", "10m")
+    assert ollama_client.keep_alive_for("llama3.2") == -1
+    assert ollama_client.keep_alive_for("nomic-embed-text") == "10m"
@@ -0,0 +1,53 @@
+import asyncio
+import numpy as np
+from app.services import ollama_client
+from app.services.ollama_client import OllamaClient, close_http_client, get_http_client
+
+
+def test_clients_share_one_pooled_http_client(monkeypatch):
+    monkeypatch.setattr(ollama_client, "_http_client", None)
+    monkeypatch.setattr(ollama_client.settings, "ollama_max_connections", 7)
+    shared = get_http_client()
+    assert get_http_client() is shared
+    assert OllamaClient().client is shared and OllamaClient("http://a/").client is shared
+    assert shared._transport._pool._max_connections == 7
+    asyncio.run(close_http_client())
+
+
+def test_closed_client_is_replaced_on_next_use(monkeypatch):
+    monkeypatch.setattr(ollama_client, "_http_client", None)
+    first = get_http_client()
+    asyncio.run(close_http_client())
+    assert first.is_closed and ollama_client._http_client is None
+    second = get_http_client()
+    assert second is not first and not second.is_closed
+    asyncio.run(second.aclose())
+    # A client closed behind the module's back is rebuilt as well.
+    assert get_http_client() is not second
+    asyncio.run(close_http_client())
+    asyncio.run(close_http_client())
+
+
+def test_results_keep_input_order_and_failed_chunks_fail_per_item(monkeypatch):
+    monkeypatch.setattr(ollama_client.settings, "ollama_embed_concurrency", 2)
+    calls, active, peak = [], [0], [0]
+
+    class Client(OllamaClient):
+        async def embed_arrays(self, model, inputs):
+            calls.append(list(inputs))
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            try:
+                # Earlier chunks finish last, so ordering cannot come from completion order.
+                await asyncio.sleep(0.01 * (5 - len(calls)))
+                if "c" in inputs:
+                    raise RuntimeError("model crashed")
+                return [np.full(2, ord(text), dtype=np.float32) for text in inputs]
+            finally:
+                active[0] -= 1
+
+    results = asyncio.run(Client(client=object()).embed_batched("m", ["a", "b", "c", "d", "e"], batch_size=2))
+    assert sorted(map(tuple, calls)) == [("a", "b"), ("c", "d"), ("e",)]
+    assert peak[0] == 2
+    assert [r[0] for r in (results[0], results[1], results[4])] == [ord("a"), ord("b"), ord("e")]
+    assert isinstance(results[2], RuntimeError) and results[2] is results[3]
@@ -0,0 +1,62 @@
+import asyncio
+import httpx
+import pytest
+from app.services.ollama_pool import CircuitBreaker, ModelCatalog, NoBackendAvailable, OllamaPool
+
+
+def test_breaker_opens_after_threshold_and_recovers_gradually():
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=0, half_open_requests=2)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.can_admit() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.on_admit() and breaker.on_admit()
+    assert not breaker.can_admit()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_pool_prefers_least_outstanding_and_ejects_failing_backend():
+    pool = OllamaPool(["http://a", "http://b"])
+    a, b = pool.backends
+    a.outstanding = 3
+    assert pool.pick() is b
+    b.breaker.failure_threshold = 1
+    b.breaker.open_seconds = 60
+
+    async def fail():
+        async with pool.use(b):
+            raise httpx.ConnectError("down")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(fail())
+    assert b.outstanding == 0
+    assert pool.pick() is a
+    a.healthy = False
+    with pytest.raises(NoBackendAvailable):
+        pool.pick()
+
+
+def test_pool_prefers_backend_with_model_resident():
+    pool = OllamaPool(["http://a", "http://b"])
+    a, b = pool.backends
+
+    async def running(url):
+        return ["llama3.2:latest"] if url == "http://b" else ["nomic-embed-text:latest"]
+
+    asyncio.run(pool.refresh_residency(running))
+    b.outstanding = 2
+    assert pool.pick(model="llama3.2") is b
+    assert pool.pick(model="mistral") is a
+    assert "mistral:latest" in a.resident
+
+
+def test_catalog_labels_only_known_models():
+    catalog = ModelCatalog({"nomic-embed-text:latest"})
+    assert catalog.label("nomic-embed-text") == "nomic-embed-text:latest"
+    assert catalog.label("anything-a-client-sends") == "other"
+    catalog.remember(["llama3.2:3b"])
+    assert catalog.label("llama3.2:3b") == "llama3.2:3b"
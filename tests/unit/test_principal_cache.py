@@ -0,0 +1,48 @@
+import time
+from app.services import principal_cache as module
+from app.services.principal_cache import Principal, PrincipalCache
+
+
+def test_hit_returns_cached_principal_and_miss_for_unknown_token():
+    cache = PrincipalCache(ttl=60, max_entries=10)
+    cache.put("token-a", Principal(1, True, ["admin"]), time.time() + 3600)
+    assert cache.get("token-a").roles == ["admin"]
+    assert cache.get("token-b") is None
+    assert all(isinstance(key, bytes) and key != b"token-a" for key in cache.entries)
+
+
+def test_entries_expire_at_token_exp_or_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(module, "monotonic", lambda: now[0])
+    cache = PrincipalCache(ttl=60, max_entries=10)
+    cache.put("short", Principal(1, True, []), time.time() + 5)
+    cache.put("long", Principal(2, True, []), time.time() + 3600)
+    cache.put("expired", Principal(3, True, []), time.time() - 1)
+    assert cache.get("expired") is None
+    now[0] += 10
+    assert cache.get("short") is None
+    assert cache.get("long") is not None
+    now[0] += 60
+    assert cache.get("long") is None
+    assert not cache.by_user
+
+
+def test_invalidate_user_drops_all_of_their_tokens():
+    cache = PrincipalCache(ttl=60, max_entries=10)
+    cache.put("a1", Principal(1, True, []), None)
+    cache.put("a2", Principal(1, True, []), None)
+    cache.put("b1", Principal(2, True, []), None)
+    cache.invalidate_user(1)
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.get("b1") is not None
+
+
+def test_capacity_evicts_least_recently_used():
+    cache = PrincipalCache(ttl=60, max_entries=2)
+    cache.put("a", Principal(1, True, []), None)
+    cache.put("b", Principal(2, True, []), None)
+    cache.get("a")
+    cache.put("c", Principal(3, True, []), None)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert set(cache.by_user) == {1, 3}
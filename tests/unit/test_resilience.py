@@ -0,0 +1,152 @@
+import asyncio
+import httpx
+from app.services import ollama_client
+from app.services.ollama_client import OllamaClient
+from app.services.ollama_pool import OllamaPool
+from app.services.resilience import LatencyTracker, RetryBudget
+
+
+def _server_error(url: str) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", url)
+    return httpx.HTTPStatusError("boom", request=request, response=httpx.Response(503, request=request))
+
+
+def test_adaptive_timeout_follows_percentile_within_bounds(monkeypatch):
+    monkeypatch.setattr(ollama_client.settings, "ollama_timeout", 15.0)
+    monkeypatch.setattr(ollama_client.settings, "ollama_timeout_min", 2.0)
+    tracker = LatencyTracker(min_samples=5)
+    assert tracker.timeout("embed", "m") == 15.0
+    for _ in range(10):
+        tracker.observe("embed", "m", 0.1)
+    assert tracker.timeout("embed", "m") == 2.0
+    for _ in range(10):
+        tracker.observe("embed", "m", 3.0)
+    assert tracker.timeout("embed", "m") == 6.0
+
+
+def test_retry_budget_drains_and_refills():
+    budget = RetryBudget(ratio=0.5, burst=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_backend_failure_is_retried_on_another_backend(monkeypatch):
+    pool = OllamaPool(["http://a", "http://b"])
+    monkeypatch.setattr(ollama_client, "ollama_pool", pool)
+    monkeypatch.setattr(ollama_client, "retry_budget", RetryBudget(ratio=0.1, burst=5))
+    calls = []
+
+    async def send(base_url):
+        calls.append(base_url)
+        if len(calls) == 1:
+            raise _server_error(base_url)
+        return base_url
+
+    result = asyncio.run(OllamaClient(client=object())._call("embed", "m", send))
+    assert len(calls) == 2 and calls[0] != calls[1] and result == calls[1]
+
+
+def test_no_retry_when_budget_is_empty(monkeypatch):
+    monkeypatch.setattr(ollama_client, "ollama_pool", OllamaPool(["http://a", "http://b"]))
+    monkeypatch.setattr(ollama_client, "retry_budget", RetryBudget(ratio=0.1, burst=0))
+    calls = []
+
+    async def send(base_url):
+        calls.append(base_url)
+        raise _server_error(base_url)
+
+    try:
+        asyncio.run(OllamaClient(client=object())._call("embed", "m", send))
+    except httpx.HTTPStatusError:
+        pass
+    assert len(calls) == 1
+
+
+def test_slow_call_is_hedged_to_another_backend(monkeypatch):
+    monkeypatch.setattr(ollama_client, "ollama_pool", OllamaPool(["http://a", "http://b"]))
+    monkeypatch.setattr(ollama_client, "retry_budget", RetryBudget(ratio=0.1, burst=5))
+    tracker = LatencyTracker(min_samples=1)
+    tracker.observe("list_models", "-", 0.01)
+    monkeypatch.setattr(ollama_client, "latency_tracker", tracker)
+    monkeypatch.setattr(ollama_client.settings, "ollama_hedge_enabled", True)
+    calls = []
+
+    async def send(base_url):
+        calls.append(base_url)
+        await asyncio.sleep(1 if len(calls) == 1 else 0)
+        return base_url
+
+    result = asyncio.run(asyncio.wait_for(OllamaClient(client=object())._call("list_models", None, send, hedge=True), 0.5))
+    assert len(calls) == 2 and result == calls[1]
+
+
+def test_adaptive_timeout_is_retried_without_tripping_the_breaker(monkeypatch):
+    pool = OllamaPool(["http://a", "http://b"])
+    monkeypatch.setattr(ollama_client, "ollama_pool", pool)
+    monkeypatch.setattr(ollama_client, "retry_budget", RetryBudget(ratio=0.1, burst=5))
+    tracker = LatencyTracker(min_samples=1)
+    monkeypatch.setattr(tracker, "timeout", lambda operation, model: 0.05)
+    monkeypatch.setattr(ollama_client, "latency_tracker", tracker)
+    calls = []
+
+    async def send(base_url):
+        calls.append(base_url)
+        await asyncio.sleep(1 if len(calls) == 1 else 0)
+        return base_url
+
+    result = asyncio.run(OllamaClient(client=object())._call("embed", "m", send))
+    assert result == calls[1] and calls[0] != calls[1]
+    assert all(backend.breaker.failures == 0 for backend in pool.backends)
+    assert max(max(samples) for samples in tracker.samples.values()) >= 0.05
+
+
+def test_generation_is_not_retried_after_reaching_a_backend(monkeypatch):
+    monkeypatch.setattr(ollama_client, "ollama_pool", OllamaPool(["http://a", "http://b"]))
+    monkeypatch.setattr(ollama_client, "retry_budget", RetryBudget(ratio=0.1, burst=5))
+    calls = []
+
+    async def send(base_url):
+        calls.append(base_url)
+        raise _server_error(base_url)
+
+    try:
+        asyncio.run(OllamaClient(client=object())._call("generate", "m", send, adaptive=False))
+    except httpx.HTTPStatusError:
+        pass
+    assert len(calls) == 1
+
+    async def refuse_first(base_url):
+        calls.append(base_url)
+        if len(calls) == 2:
+            raise httpx.ConnectError("refused", request=httpx.Request("POST", base_url))
+        return base_url
+
+    assert asyncio.run(OllamaClient(client=object())._call("generate", "m", refuse_first, adaptive=False)) == calls[2]
+
+
+def test_large_embed_batches_do_not_inherit_the_single_input_timeout(monkeypatch):
+    monkeypatch.setattr(ollama_client, "ollama_pool", OllamaPool(["http://a"]))
+    monkeypatch.setattr(ollama_client, "retry_budget", RetryBudget(ratio=0.1, burst=5))
+    monkeypatch.setattr(ollama_client.settings, "ollama_timeout_min", 0.01)
+    monkeypatch.setattr(ollama_client.settings, "ollama_hedge_enabled", False)
+    tracker = LatencyTracker(min_samples=5)
+    monkeypatch.setattr(ollama_client, "latency_tracker", tracker)
+
+    class FakeHttp:
+        async def post(self, url, json):
+            # Cost grows with the number of inputs: 2 ms per input.
+            await asyncio.sleep(0.002 * len(json["input"]))
+            request = httpx.Request("POST", url)
+            return httpx.Response(200, json={"embeddings": [[0.0]] * len(json["input"])}, request=request)
+
+    client = OllamaClient(client=FakeHttp())
+    for i in range(10):
+        asyncio.run(client._embed_upstream("m", [f"single {i}"]))
+    # Ten cheap calls teach a limit far below what a 50-input batch needs.
+    assert max(tracker.timeout(operation, "other") for operation, _ in tracker.samples) < 0.05
+    vectors = asyncio.run(client._embed_upstream("m", [f"batch {i}" for i in range(50)]))
+    assert len(vectors) == 50
+    assert ollama_client.embed_operation(50) == "embed_64" and ollama_client.embed_operation(1000) == "embed_256"
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from app.services import scheduler as module
+from app.services.ollama_pool import ModelCatalog
+from app.services.scheduler import AdmissionRejected, AdmissionScheduler
+
+
+def _scheduler(limit=1, user_limit=1, timeout=1.0):
+    s = AdmissionScheduler()
+    s.default_limit = limit
+    s.user_limit = user_limit
+    s.queue_timeout = timeout
+    return s
+
+
+def test_waiting_users_are_admitted_fairly():
+    s = _scheduler(limit=1, user_limit=5)
+    order = []
+
+    async def job(user):
+        async with s.admit(user, "m"):
+            order.append(user)
+            await asyncio.sleep(0.001)
+
+    async def run():
+        blocker = await s.acquire(99, "m")
+        tasks = [asyncio.create_task(job(1)) for _ in range(3)] + [asyncio.create_task(job(2)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        s.release(blocker)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == [1, 2, 1, 2, 1, 2]
+
+
+def test_per_user_inflight_limit_and_timeout():
+    s = _scheduler(limit=4, user_limit=1, timeout=0.02)
+
+    async def run():
+        ticket = await s.acquire(1, "m")
+        with pytest.raises(AdmissionRejected):
+            await s.acquire(1, "m")
+        other = await s.acquire(2, "m")
+        s.release(ticket)
+        s.release(other)
+        assert s.user_inflight == {}
+        assert s.lanes == {}
+
+    asyncio.run(run())
+
+
+def test_shared_work_skips_user_caps_and_idle_lanes_are_dropped():
+    s = _scheduler(limit=2, user_limit=1, timeout=0.02)
+
+    async def run():
+        first = await s.acquire(None, "m")
+        second = await s.acquire(None, "m")
+        with pytest.raises(AdmissionRejected):
+            await s.acquire(None, "m")
+        s.release(first)
+        s.release(second)
+        for user in range(100):
+            async with s.admit(user, f"model-{user % 3}"):
+                pass
+
+    asyncio.run(run())
+    assert s.lanes == {} and s.user_inflight == {}
+
+
+def test_unknown_models_share_one_lane(monkeypatch):
+    monkeypatch.setattr(module, "model_catalog", ModelCatalog({"llama3.2:latest"}))
+    s = _scheduler(limit=4, user_limit=4)
+
+    async def run():
+        tickets = [await s.acquire(1, "llama3.2"), await s.acquire(1, "made-up-1"), await s.acquire(1, "made-up-2:7b")]
+        assert sorted(s.lanes) == ["llama3.2:latest", "other"]
+        assert s.lanes["other"].inflight == 2
+        for ticket in tickets:
+            s.release(ticket)
+
+    asyncio.run(run())
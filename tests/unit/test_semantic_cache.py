@@ -0,0 +1,74 @@
+import numpy as np
+from app.services import semantic_cache as module
+from app.services.semantic_cache import SemanticCache
+
+
+def test_similar_prompt_hits_and_dissimilar_misses():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=4)
+    ns = cache.namespace(1, "llama3.2", None)
+    cache.store(ns, np.array([1.0, 0.0, 0.0]), "answer")
+    assert cache.lookup(ns, np.array([0.95, 0.1, 0.0])) == "answer"
+    assert cache.lookup(ns, np.array([0.0, 1.0, 0.0])) is None
+
+
+def test_partitions_by_model_and_options():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=4)
+    cache.store(cache.namespace(1, "llama3.2", None), np.array([1.0, 0.0]), "answer")
+    assert cache.lookup(cache.namespace(1, "llama3.2:latest", None), np.array([1.0, 0.0])) == "answer"
+    assert cache.lookup(cache.namespace(1, "mistral", None), np.array([1.0, 0.0])) is None
+    assert cache.lookup(cache.namespace(1, "llama3.2", {"temperature": 0}), np.array([1.0, 0.0])) is None
+
+
+def test_capacity_overwrites_oldest_and_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(module, "monotonic", lambda: now[0])
+    cache = SemanticCache(threshold=0.99, ttl=10, max_entries=2)
+    ns = cache.namespace(1, "m", None)
+    cache.store(ns, np.array([1.0, 0.0, 0.0]), "a")
+    cache.store(ns, np.array([0.0, 1.0, 0.0]), "b")
+    cache.store(ns, np.array([0.0, 0.0, 1.0]), "c")
+    assert cache.lookup(ns, np.array([1.0, 0.0, 0.0])) is None
+    assert cache.lookup(ns, np.array([0.0, 0.0, 1.0])) == "c"
+    now[0] += 11
+    assert cache.lookup(ns, np.array([0.0, 0.0, 1.0])) is None
+
+
+def test_partitions_by_user():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=4)
+    cache.store(cache.namespace(1, "llama3.2", None), np.array([1.0, 0.0]), "private answer")
+    assert cache.lookup(cache.namespace(2, "llama3.2", None), np.array([1.0, 0.0])) is None
+    assert cache.lookup(cache.namespace(1, "llama3.2", None), np.array([1.0, 0.0])) == "private answer"
+
+
+def test_partition_storage_grows_up_to_capacity():
+    cache = SemanticCache(threshold=0.99, ttl=60, max_entries=40)
+    ns = cache.namespace(1, "m", None)
+    for i in range(41):
+        vector = np.zeros(64)
+        vector[i] = 1.0
+        cache.store(ns, vector, str(i))
+    shard = cache.shards[ns]
+    assert len(shard.responses) == 40
+    first = np.zeros(64)
+    first[0] = 1.0
+    assert cache.lookup(ns, first) is None
+    last = np.zeros(64)
+    last[40] = 1.0
+    assert cache.lookup(ns, last) == "40"
+
+
+def test_total_entries_are_bounded_across_partitions():
+    cache = SemanticCache(threshold=0.99, ttl=60, max_entries=40, max_partitions=100, max_total_entries=64)
+    for user in range(10):
+        ns = cache.namespace(user, "m", None)
+        for i in range(20):
+            vector = np.zeros(64)
+            vector[i] = 1.0
+            cache.store(ns, vector, f"{user}:{i}")
+    # Each full partition holds 32 rows; only two fit in the budget, not ten.
+    assert cache.rows == sum(len(s.responses) for s in cache.shards.values()) <= 64
+    assert [key[2] for key in cache.shards] == [8, 9]
+    probe = np.zeros(64)
+    probe[3] = 1.0
+    assert cache.lookup(cache.namespace(9, "m", None), probe) == "9:3"
+    assert cache.lookup(cache.namespace(0, "m", None), probe) is None
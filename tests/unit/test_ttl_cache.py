@@ -0,0 +1,65 @@
+import asyncio
+from app.services.ttl_cache import AsyncTTLCache
+
+
+def test_concurrent_misses_share_one_load():
+    cache = AsyncTTLCache("test", ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["llama3"]
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(20)))
+
+    assert asyncio.run(run()) == [["llama3"]] * 20
+    assert len(calls) == 1
+
+
+def test_stale_value_served_while_refreshing():
+    cache = AsyncTTLCache("test", ttl=0, stale_ttl=60)
+    values = iter(["old", "new"])
+
+    async def loader():
+        return next(values)
+
+    async def run():
+        first = await cache.get_or_load("k", loader)
+        stale = await cache.get_or_load("k", loader)
+        await asyncio.sleep(0.01)
+        return first, stale, cache.entries["k"][0]
+
+    assert asyncio.run(run()) == ("old", "old", "new")
+
+
+def test_invalidate_drops_entries():
+    cache = AsyncTTLCache("test", ttl=60)
+    cache.set("k", 1)
+    cache.invalidate()
+    assert cache.peek("k") is None
+
+
+def test_load_is_cancelled_only_when_every_caller_is():
+    cache = AsyncTTLCache("test", ttl=60)
+    started = []
+
+    async def loader():
+        started.append(1)
+        await asyncio.sleep(10)
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_or_load("k", loader))
+        second = asyncio.ensure_future(cache.get_or_load("k", loader))
+        await asyncio.sleep(0.01)
+        load = cache.inflight["k"]
+        first.cancel()
+        await asyncio.sleep(0.01)
+        still_running = not load.done()
+        second.cancel()
+        await asyncio.sleep(0.01)
+        return still_running, load.cancelled()
+
+    assert asyncio.run(run()) == (True, True)
+    assert started == [1]
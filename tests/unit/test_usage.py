@@ -0,0 +1,77 @@
+import asyncio
+from prometheus_client import REGISTRY
+from sqlalchemy.exc import IntegrityError
+from app.services import usage
+from app.services.usage import UsageWriter
+
+
+def _stats(tokens=1):
+    return {"prompt_eval_count": 2, "eval_count": tokens, "eval_duration": 1_000_000_000, "total_duration": 2_000_000_000}
+
+
+def _dropped() -> float:
+    return REGISTRY.get_sample_value("ollama_usage_rows_dropped_total") or 0.0
+
+
+def test_rows_are_buffered_until_flushed(monkeypatch):
+    writer = UsageWriter()
+    inserted = []
+    monkeypatch.setattr(writer, "_insert", inserted.append)
+    writer.record(1, "llama3.2:latest", "chat", _stats(5))
+    writer.record(None, "llama3.2:latest", "generate", _stats(7))
+    assert len(writer.buffer) == 2 and inserted == []
+    assert asyncio.run(writer.flush()) == 2
+    assert [(r["user_id"], r["completion_tokens"], r["total_duration_ms"]) for r in inserted[0]] == [(1, 5, 2000), (None, 7, 2000)]
+    assert not writer.buffer and asyncio.run(writer.flush()) == 0
+
+
+def test_full_buffer_drops_the_oldest_rows():
+    writer = UsageWriter()
+    writer.max_buffer = 3
+    before = _dropped()
+    for tokens in range(5):
+        writer.record(1, "m:latest", "chat", _stats(tokens))
+    assert [r["completion_tokens"] for r in writer.buffer] == [2, 3, 4]
+    assert _dropped() - before == 2
+
+
+def test_failed_flush_counts_rows_as_dropped(monkeypatch):
+    writer = UsageWriter()
+
+    def fail(rows):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(writer, "_insert", fail)
+    writer.record(1, "m:latest", "chat", _stats())
+    before = _dropped()
+    assert asyncio.run(writer.flush()) == 0
+    assert _dropped() - before == 1 and not writer.buffer
+
+
+def test_rows_of_deleted_users_are_kept_without_a_user(monkeypatch):
+    inserted = []
+
+    class FakeSession:
+        def execute(self, statement, rows):
+            if any(row["user_id"] == 2 for row in rows):
+                raise IntegrityError("insert", None, Exception("violates foreign key constraint"))
+            inserted.extend(rows)
+
+        def scalars(self, statement):
+            return [1]
+
+        def commit(self):
+            pass
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(usage, "SessionLocal", FakeSession)
+    writer = UsageWriter()
+    writer.record(1, "m:latest", "chat", _stats())
+    writer.record(2, "m:latest", "chat", _stats())
+    assert asyncio.run(writer.flush()) == 2
+    assert [row["user_id"] for row in inserted] == [1, None]
@@ -0,0 +1,85 @@
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+from app.services.vector_index import VectorIndex, VectorStore
+
+
+def _corpus(n=200, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return [f"v{i}" for i in range(n)], rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def test_cosine_search_matches_bruteforce():
+    ids, vectors = _corpus()
+    index = VectorIndex(16, "cosine")
+    index.upsert(ids, vectors)
+    query = vectors[:3] + 0.01
+    results = index.search(query, k=5)
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = query / np.linalg.norm(query, axis=1, keepdims=True)
+    expected = np.argsort(-(q @ normed.T), axis=1)[:, :5]
+    assert [[item for item, _, _ in row] for row in results] == [[ids[i] for i in row] for row in expected]
+
+
+def test_upsert_overwrites_and_delete_compacts():
+    ids, vectors = _corpus(n=4, dim=4)
+    index = VectorIndex(4, "dot")
+    index.upsert(ids, vectors, [{"n": i} for i in range(4)])
+    index.upsert(["v1"], np.full((1, 4), 10.0), [{"n": "new"}])
+    assert len(index) == 4
+    assert index.search(np.ones((1, 4)), k=1)[0][0][0] == "v1"
+    assert index.delete(["v0", "missing"]) == 1
+    assert len(index) == 3 and "v0" not in index.rows
+    assert {item for item, _, _ in index.search(np.ones((1, 4)), k=10)[0]} == {"v1", "v2", "v3"}
+
+
+def test_int8_quantized_search_keeps_top_hit():
+    ids, vectors = _corpus()
+    index = VectorIndex(16, "cosine", "int8")
+    index.upsert(ids, vectors)
+    assert index.matrix.dtype == np.int8
+    results = index.search(vectors[:10], k=1)
+    assert [row[0][0] for row in results] == ids[:10]
+
+
+def test_stale_index_is_served_while_it_reloads_in_the_background(monkeypatch):
+    store = VectorStore()
+    loads, reloads = [], []
+
+    def load(db, collection):
+        loads.append(collection.version)
+        index = store.indexes[collection.name] = VectorIndex(collection.dim, version=collection.version)
+        store.sources[collection.name] = collection.id
+        return index
+
+    monkeypatch.setattr(store, "_load", load)
+    monkeypatch.setattr(store, "_reload_in_background", reloads.append)
+    first = store.index_for(None, SimpleNamespace(id=1, name="docs", dim=4, version=3))
+    assert store.index_for(None, SimpleNamespace(id=1, name="docs", dim=4, version=5)) is first
+    assert loads == [3] and reloads == ["docs"]
+    # A collection dropped and recreated under the same name is never served from the old index.
+    store.index_for(None, SimpleNamespace(id=2, name="docs", dim=4, version=0))
+    assert loads == [3, 0]
+
+
+def test_concurrent_first_uses_share_one_load(monkeypatch):
+    store = VectorStore()
+    loads = []
+
+    def load(db, collection):
+        loads.append(collection.name)
+        time.sleep(0.05)
+        index = store.indexes[collection.name] = VectorIndex(collection.dim, version=collection.version)
+        store.sources[collection.name] = collection.id
+        return index
+
+    monkeypatch.setattr(store, "_load", load)
+    collection = SimpleNamespace(id=1, name="docs", dim=4, version=0)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.index_for(None, collection))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert loads == ["docs"] and all(r is results[0] for r in results)